@@ -4,6 +4,13 @@
 
 __version__ = "2.0.8"
 
+import sys
+
+if '--profile-startup' in sys.argv:
+    # Started before any other import to measure them (see pibooth.booth)
+    from pibooth.profiler import PROFILER
+    PROFILER.start()
+
 try:
 
     import pluggy
@@ -5,6 +5,7 @@
 """
 
 import os
+import time
 import os.path as osp
 import tempfile
 import shutil
@@ -21,23 +22,43 @@ import pibooth
 from pibooth import fonts
 from pibooth import language
 from pibooth.counters import Counters
-from pibooth.utils import (LOGGER, PoolingTimer, configure_logging, get_crash_message,
+from pibooth.catalog import SessionCatalog
+from pibooth.writer import FileWriter
+from pibooth.storage import StorageManager
+from pibooth.memory import MemoryBudget
+from pibooth.telemetry import FrameTelemetry
+from pibooth.tracing import TRACER
+from pibooth.profiler import PROFILER
+from pibooth.utils import (LOGGER, MEGABYTE, PoolingTimer, configure_logging, get_crash_message,
                            set_logging_level, get_event_pos)
 from pibooth.states import StateMachine
 from pibooth.plugins import create_plugin_manager
 from pibooth.view import PiWindow
-from pibooth.config import PiConfigParser, PiConfigMenu
+from pibooth.config import PiConfigParser
 from pibooth.printer import PRINTER_TASKS_UPDATED, Printer
 
 
-# Set the default pin factory to a mock factory if pibooth is not started a Raspberry Pi
-try:
-    filterwarnings("ignore", category=PinFactoryFallback)
-    GPIO_INFO = "on Raspberry pi {0}".format(pi_info().model)
-except BadPinFactory:
-    from gpiozero.pins.mock import MockFactory # type: ignore
-    Device.pin_factory = MockFactory()
-    GPIO_INFO = "without physical GPIO, fallback to GPIO mock"
+GPIO_INFO = None
+
+
+def init_gpio():
+    """Set the default pin factory to a mock factory if pibooth is not started
+    a Raspberry Pi. The board is probed at first call only (not at import, the
+    pin factories are slow to load).
+
+    :return: description of the GPIO used
+    :rtype: str
+    """
+    global GPIO_INFO
+    if GPIO_INFO is None:
+        try:
+            filterwarnings("ignore", category=PinFactoryFallback)
+            GPIO_INFO = "on Raspberry pi {0}".format(pi_info().model)
+        except BadPinFactory:
+            from gpiozero.pins.mock import MockFactory # type: ignore
+            Device.pin_factory = MockFactory()
+            GPIO_INFO = "without physical GPIO, fallback to GPIO mock"
+    return GPIO_INFO
 
 
 BUTTONDOWN = pygame.USEREVENT + 1
@@ -66,6 +87,14 @@ class PiApplication(object):
     :type previous_picture_file: str
     :attr count: holder for counter values
     :type count: :py:class:`pibooth.counters.Counters`
+    :attr catalog: index of the sessions (captures, final picture, prints and forgets)
+    :type catalog: :py:class:`pibooth.catalog.SessionCatalog`
+    :attr writer: background writer used for all pictures files
+    :type writer: :py:class:`pibooth.writer.FileWriter`
+    :attr storage: disk usage of the saving directories
+    :type storage: :py:class:`pibooth.storage.StorageManager`
+    :attr memory: memory used by the held images (captures, pictures, buffered surfaces)
+    :type memory: :py:class:`pibooth.memory.MemoryBudget`
     :attr camera: camera used
     :type camera: :py:class:`pibooth.camera.base.BaseCamera`
     :attr buttons: access to hardware buttons ``capture`` and ``printer``
@@ -103,8 +132,14 @@ class PiApplication(object):
         else:
             self._window = PiWindow(title, color=init_color,
                                     text_color=init_text_color, can_forget=self.can_forget, debug=init_debug)
+        PROFILER.mark('window')
 
         self._menu = None
+        self._monitoring_timer = PoolingTimer(config.getfloat('GENERAL', 'monitoring_interval'))
+        self._monitoring_lines = []
+        self._telemetry = FrameTelemetry()
+        self._performance_overlay = False
+        self._performance_timer = PoolingTimer(0.5)
         self._multipress_timer = PoolingTimer(config.getfloat('CONTROLS', 'multi_press_delay'), False)
         self._fingerdown_events = []
 
@@ -136,13 +171,32 @@ class PiApplication(object):
                               taken=0, printed=0, forgotten=0,
                               remaining_duplicates=self._config.getint('PRINTER', 'max_duplicates'))
 
+        self.catalog = SessionCatalog(self._config.join_path("sessions.db"))
+        self.writer = FileWriter(self._config.get('GENERAL', 'write_sync'))
+        self.storage = StorageManager(self._config.gettuple('GENERAL', 'directory', 'path'),
+                                      self._config.getint('GENERAL', 'max_disk_usage') * MEGABYTE,
+                                      self._config.getint('GENERAL', 'min_free_space') * MEGABYTE)
+        self.storage.scan()  # Then updated by the written files
+        self.writer.add_listener(self.storage.add_file)
+
         self.camera = self._pm.hook.pibooth_setup_camera(cfg=self._config)
+        PROFILER.mark('camera')
+
+        # Plugins can register their own images holders at startup
+        self.memory = MemoryBudget(self._config.getint('GENERAL', 'memory_budget') * MEGABYTE,
+                                   self._window.get_rect().size)
+        self.memory.register('renditions', self._window.get_renditions,
+                             lambda size: self._window.drop_renditions())
+        self.memory.register('camera', self.camera.get_buffered_captures, lambda size: self.camera.drop_captures())
+        self.memory.register('window', self._window.get_buffered_images,
+                             lambda size: self._window.drop_unused_images())
 
         # self.buttons = ButtonBoard(capture="BOARD" + config.get('CONTROLS', 'picture_btn_pin'),
         #                            printer="BOARD" + config.get('CONTROLS', 'print_btn_pin'),
         #                            hold_time=config.getfloat('CONTROLS', 'debounce_delay'),
         #                            pull_up=True)
         
+        init_gpio()
         self.buttons = ButtonBoard(capture="BOARD" + config.get('CONTROLS', 'picture_btn_pin'),
                                    hold_time=config.getfloat('CONTROLS', 'debounce_delay'),
                                    pull_up=True)
@@ -156,6 +210,7 @@ class PiApplication(object):
                                config.getint('PRINTER', 'max_pages'),
                                config.gettyped('PRINTER', 'printer_options'),
                                self.count)
+        PROFILER.mark('devices')
         # ---------------------------------------------------------------------
 
     def _initialize(self):
@@ -203,8 +258,39 @@ class PiApplication(object):
             set_logging_level(logging.DEBUG)
             self._machine.remove_state('failsafe')
 
+        # Handle hooks monitoring
+        self._pm.enable_monitoring(self._config.getboolean('GENERAL', 'monitoring'))
+        self._monitoring_timer.timeout = self._config.getfloat('GENERAL', 'monitoring_interval')
+        self._monitoring_timer.start()
+        if not self._pm.monitor.enabled:
+            self._monitoring_lines = []
+
+        # Handle rendering performance overlay
+        self._performance_overlay = self._config.getboolean('WINDOW', 'performance_overlay')
+        self._update_debug_overlay()
+
         # Reset the print counter (in case of max_pages is reached)
         self.printer.max_pages = self._config.getint('PRINTER', 'max_pages')
+        self.printer.ganging_delay = self._config.getfloat('PRINTER', 'ganging_delay')
+
+        # Handle files writing durability
+        self.writer.sync = self._config.get('GENERAL', 'write_sync')
+
+        # Handle saving directories quota
+        self.storage.max_usage = self._config.getint('GENERAL', 'max_disk_usage') * MEGABYTE
+        self.storage.min_free = self._config.getint('GENERAL', 'min_free_space') * MEGABYTE
+        self.storage.rotate()
+
+        # Handle sessions tracing
+        if self._config.get('GENERAL', 'sessions_trace'):
+            if self._config.getpath('GENERAL', 'sessions_trace') != TRACER.filename or not TRACER.enabled:
+                TRACER.open(self._config.getpath('GENERAL', 'sessions_trace'))
+        else:
+            TRACER.close()
+
+        # Handle held images memory
+        self.memory.budget = self._config.getint('GENERAL', 'memory_budget') * MEGABYTE
+        self.memory.screen_size = self._window.get_rect().size
 
     # def _on_button_capture_held(self):
     #     """Called when the capture button is pressed.
@@ -293,6 +379,15 @@ class PiApplication(object):
                 return event
         return None
 
+    def find_performance_event(self, events):
+        """Return the first found event if found in the list.
+        """
+        for event in events:
+            if event.type == pygame.KEYDOWN and \
+                    event.key == pygame.K_d and pygame.key.get_mods() & pygame.KMOD_CTRL:
+                return event
+        return None
+
     def find_resize_event(self, events):
         """Return the first found event if found in the list.
         """
@@ -417,6 +512,20 @@ class PiApplication(object):
                     return 'CAPTURE'
         return None    
 
+    def _update_debug_overlay(self):
+        """Update the lines displayed on top of the window (rendering
+        performance and slowest hooks).
+        """
+        lines = []
+        if self._performance_overlay:
+            pending = {'writer': self.writer.get_queue_depth(),
+                       'renditions': self._window.get_pending_renditions(),
+                       'printer': self.printer.get_queue_depth(),
+                       'print_jobs': self.printer.get_tasks_number()}
+            lines.extend(self._telemetry.get_summary(sum(self.memory.get_usage().values()), pending))
+        lines.extend(self._monitoring_lines)
+        self._window.set_debug_overlay(lines)
+
     def main_loop(self):
         try:
             fps = 40
@@ -424,8 +533,11 @@ class PiApplication(object):
             self._initialize()
             self._pm.hook.pibooth_startup(cfg=self._config, app=self)
             self._machine.set_state('wait')
+            PROFILER.mark('startup')
 
             while True:
+                start = time.time()
+                process_time = 0
                 events = list(pygame.event.get())
 
                 if self.find_quit_event(events):
@@ -434,6 +546,10 @@ class PiApplication(object):
                 if self.find_fullscreen_event(events):
                     self._window.toggle_fullscreen()
 
+                if self.find_performance_event(events):
+                    self._performance_overlay = not self._performance_overlay
+                    self._update_debug_overlay()
+
                 event = self.find_resize_event(events)
                 if event:
                     self._window.resize(event.size)
@@ -441,6 +557,7 @@ class PiApplication(object):
                 if not self._menu and self.find_settings_event(events):
                     self.camera.stop_preview()
                     self.leds.off()
+                    from pibooth.config.menu import PiConfigMenu  # Loaded at first use
                     self._menu = PiConfigMenu(self._pm, self._config, self, self._window)
                     self._menu.show()
                     self.leds.blink(on_time=0.1, off_time=1)
@@ -452,16 +569,53 @@ class PiApplication(object):
                     self._machine.set_state('wait')
                     self._menu = None
                 else:
+                    state = self._machine.active_state
+                    process_start = time.time()
                     self._machine.process(events)
-
+                    process_time = time.time() - process_start
+                    if state != self._machine.active_state:
+                        self.count.flush_soon()  # Don't wait the write-behind delay
+                        if self._machine.active_state == 'wait':
+                            self.memory.check()
+
+                if self._pm.monitor.enabled and self._monitoring_timer.is_timeout():
+                    self._pm.monitor.dump(self._config.join_path("hooks_statistics.json"))
+                    if self._config.getboolean('GENERAL', 'debug'):
+                        self._monitoring_lines = self._pm.monitor.get_summary()
+                        self._update_debug_overlay()
+                    self._monitoring_timer.start()
+
+                if self._performance_overlay and self._performance_timer.is_timeout():
+                    self._update_debug_overlay()
+                    self._performance_timer.start()
+
+                self._window.update_renditions()
+                self._window.draw_debug_overlay()
+                display_start = time.time()
                 pygame.display.update()
+                if PROFILER.enabled:
+                    PROFILER.mark('first_frame')
+                    PROFILER.report()
+                self._telemetry.add(start, self._machine.active_state, time.time() - start,
+                                    process_time, time.time() - display_start)
                 clock.tick(fps)  # Ensure the program will never run at more than <fps> frames per second
 
         except Exception as ex:
             LOGGER.error(str(ex), exc_info=True)
             LOGGER.error(get_crash_message())
         finally:
+            # Pending files are written (and queued to the printer) before the cleanup
+            self.writer.quit()
+            LOGGER.debug("Files writing statistics: %s", self.writer.get_statistics())
             self._pm.hook.pibooth_cleanup(app=self)
+            self.count.flush()
+            self.catalog.close()
+            if self._pm.monitor.enabled:
+                self._pm.monitor.dump(self._config.join_path("hooks_statistics.json"))
+            if self._config.get('GENERAL', 'frames_telemetry'):
+                self._telemetry.export(self._config.getpath('GENERAL', 'frames_telemetry'))
+            TRACER.close()
+            LOGGER.debug("Configuration values parsing avoided %s times", self._config.parsing_avoided)
             pygame.quit()
 
 
@@ -492,6 +646,9 @@ def main():
     parser.add_argument("--nolog", action='store_true', default=False,
                         help=u"don't save console output in a file (avoid filling the /tmp directory)")
 
+    parser.add_argument("--profile-startup", action='store_true', default=False,
+                        help=u"report the time spent in each import and initialization phase until the first frame")
+
     group = parser.add_mutually_exclusive_group()
     group.add_argument("-v", "--verbose", dest='logging', action='store_const', const=logging.DEBUG,
                        help=u"report more information about operations", default=logging.INFO)
@@ -505,6 +662,7 @@ def main():
     else:
         filename = None
     configure_logging(options.logging, '[ %(levelname)-8s] %(name)-18s: %(message)s', filename=filename)
+    PROFILER.mark('imports')
 
     plugin_manager = create_plugin_manager()
 
@@ -519,6 +677,7 @@ def main():
 
     # Load the languages
     language.init(config.join_path("translations.cfg"), options.reset)
+    PROFILER.mark('configuration')
 
     # Update configuration with plugins ones
     plugin_manager.hook.pibooth_configure(cfg=config)
@@ -539,7 +698,8 @@ def main():
         config.save(default=True)
         plugin_manager.hook.pibooth_reset(cfg=config, hard=True)
     else:
-        LOGGER.info("Starting the photo booth application %s", GPIO_INFO)
+        LOGGER.info("Starting the photo booth application %s", init_gpio())
+        PROFILER.mark('gpio')
         app = PiApplication(config, plugin_manager)
         app.main_loop()
 
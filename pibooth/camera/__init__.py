@@ -1,52 +1,238 @@
 # -*- coding: utf-8 -*-
 
+import io
+import os
+import sys
+import json
+import time
+import tempfile
+import importlib
+import os.path as osp
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 from pibooth.utils import LOGGER
-from pibooth.camera.rpi import RpiCamera, get_rpi_camera_proxy
-from pibooth.camera.gphoto import GpCamera, get_gp_camera_proxy
-from pibooth.camera.opencv import CvCamera, get_cv_camera_proxy
-from pibooth.camera.hybrid import HybridRpiCamera, HybridCvCamera
+
+# The backends modules are imported only when used (picamera, gphoto2, cv2
+# and numpy are slow to load, even when the camera is not connected)
+BACKENDS = {'RpiCamera': 'pibooth.camera.rpi',
+            'get_rpi_camera_proxy': 'pibooth.camera.rpi',
+            'GpCamera': 'pibooth.camera.gphoto',
+            'get_gp_camera_proxy': 'pibooth.camera.gphoto',
+            'CvCamera': 'pibooth.camera.opencv',
+            'get_cv_camera_proxy': 'pibooth.camera.opencv',
+            'HybridRpiCamera': 'pibooth.camera.hybrid',
+            'HybridCvCamera': 'pibooth.camera.hybrid'}
+
+
+# Functions returning the camera proxy of each backend
+PROBES = {'rpi': 'get_rpi_camera_proxy',
+          'gphoto': 'get_gp_camera_proxy',
+          'opencv': 'get_cv_camera_proxy'}
+
+# Cameras in priority order: (backends used, camera class name, description)
+CONFIGURATIONS = ((('rpi', 'gphoto'), 'HybridRpiCamera', "hybrid camera (Picamera + gPhoto2)"),
+                  (('opencv', 'gphoto'), 'HybridCvCamera', "hybrid camera (OpenCV + gPhoto2)"),
+                  (('gphoto',), 'GpCamera', "gPhoto2 camera"),
+                  (('rpi',), 'RpiCamera', "Picamera camera"),
+                  (('opencv',), 'CvCamera', "OpenCV camera"))
+
+PROBE_TIMEOUT = 10  # Maximum time in seconds to detect a camera
+
+
+def _get_backend(name):
+    """Import the backend module defining the given name and return it.
+    """
+    return getattr(importlib.import_module(BACKENDS[name]), name)
+
+
+if sys.version_info >= (3, 7):
+
+    def __getattr__(name):
+        if name in BACKENDS:
+            return _get_backend(name)
+        raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+
+else:
+    from pibooth.camera.rpi import RpiCamera, get_rpi_camera_proxy
+    from pibooth.camera.gphoto import GpCamera, get_gp_camera_proxy
+    from pibooth.camera.opencv import CvCamera, get_cv_camera_proxy
+    from pibooth.camera.hybrid import HybridRpiCamera, HybridCvCamera
 
 
 def close_proxy(rpi_cam_proxy, gp_cam_proxy, cv_cam_proxy):
     """Close proxy drivers.
     """
     if rpi_cam_proxy:
-        RpiCamera(rpi_cam_proxy).quit()
+        _get_backend('RpiCamera')(rpi_cam_proxy).quit()
     if gp_cam_proxy:
-        GpCamera(gp_cam_proxy).quit()
+        _get_backend('GpCamera')(gp_cam_proxy).quit()
     if cv_cam_proxy:
-        CvCamera(cv_cam_proxy).quit()
+        _get_backend('CvCamera')(cv_cam_proxy).quit()
+
+
+def _close_proxies(proxies):
+    """Close the proxy drivers of the given dictionary {backend: proxy}.
+    """
+    close_proxy(proxies.get('rpi'), proxies.get('gphoto'), proxies.get('opencv'))
+
 
+def _probe(backend, port=None):
+    """Return the tuple (proxy, port) of the given backend, proxy is None if
+    no camera is found.
+    """
+    try:
+        if backend == 'opencv' and port is None:
+            for index in range(3):  # Test 3 first ports
+                proxy = _get_backend(PROBES[backend])(index)
+                if proxy:
+                    return proxy, index
+            return None, None
+
+        proxy = _get_backend(PROBES[backend])(port)
+        if proxy and backend == 'gphoto' and port is None:
+            try:
+                port = proxy.get_port_info().get_path()
+            except Exception:
+                pass  # Port not cached, always autodetected
+        return proxy, port
+    except Exception as ex:
+        LOGGER.debug("Camera probe '%s' on port '%s' failed: %s", backend, port, ex)
+        return None, None
+
+
+def _run_probes(ports, timeout=PROBE_TIMEOUT):
+    """Search the cameras of the given backends concurrently. A probe which
+    does not end before the timeout is ignored (the late found camera is
+    closed).
+
+    The gPhoto2 camera is probed before the OpenCV one to avoid connection
+    concurence in case of DSLR compatible with OpenCV.
 
-def find_camera():
+    :param ports: dictionary {backend: port} (port is None to search all)
+    :type ports: dict
+    :param timeout: maximum time in seconds of each probe
+    :type timeout: float
+
+    :return: dictionary {backend: (proxy, port)} of the found cameras
+    :rtype: dict
+    """
+    executor = ThreadPoolExecutor(len(ports), thread_name_prefix='CameraProbe')
+    futures = {}
+    found = {}
+
+    def submit(backend):
+        if backend in ports:
+            futures[backend] = (time.time() + timeout, executor.submit(_probe, backend, ports[backend]))
+
+    def collect(backend):
+        if backend not in futures:
+            return
+        deadline, future = futures[backend]
+        try:
+            proxy, port = future.result(max(0, deadline - time.time()))
+        except TimeoutError:
+            LOGGER.warning("Camera probe '%s' timed out after %ss", backend, timeout)
+            future.add_done_callback(lambda future, backend=backend: _close_proxies({backend: future.result()[0]}))
+            return
+        if proxy:
+            found[backend] = (proxy, port)
+
+    submit('rpi')
+    submit('gphoto')
+    collect('gphoto')
+    submit('opencv')
+    collect('rpi')
+    collect('opencv')
+    executor.shutdown(wait=False)
+    return found
+
+
+def _load_cache(filename):
+    """Return the dictionary {backend: port} of the last camera found, or
+    None if unknown.
+    """
+    if not filename or not osp.isfile(filename):
+        return None
+    try:
+        with io.open(filename, 'r', encoding='utf-8') as fp:
+            ports = json.load(fp)
+        if ports and isinstance(ports, dict) and all(backend in PROBES for backend in ports):
+            return ports
+    except (OSError, ValueError) as ex:
+        LOGGER.debug("Can not read last camera configuration from '%s': %s", filename, ex)
+    return None
+
+
+def _save_cache(filename, ports):
+    """Save the dictionary {backend: port} of the camera found in a temporary
+    file, then atomically replace the cache file by it (an interrupted write
+    never leaves a truncated file).
+    """
+    if not filename:
+        return
+    tmp_filename = None
+    try:
+        fd, tmp_filename = tempfile.mkstemp(prefix='.', suffix='.tmp', dir=osp.dirname(filename))
+        with io.open(fd, 'w', encoding='utf-8') as fp:
+            json.dump(ports, fp)
+        os.replace(tmp_filename, filename)
+    except (OSError, TypeError) as ex:
+        LOGGER.debug("Can not save camera configuration in '%s': %s", filename, ex)
+        if tmp_filename and osp.exists(tmp_filename):
+            os.remove(tmp_filename)
+
+
+def _get_better_backends(ports):
+    """Return the backends used by the configurations having a higher priority
+    than the one of the given cached ports (not including the cached backends).
+    """
+    backends = set()
+    for config_backends, _, _ in CONFIGURATIONS:
+        if set(config_backends) == set(ports):
+            break
+        backends.update(config_backends)
+    return backends.difference(ports)
+
+
+def find_camera(cache_filename=None, timeout=PROBE_TIMEOUT):
     """Initialize the camera depending of the connected one. The priority order
     is chosen in order to have best rendering during preview and to take captures.
-    The gPhoto2 camera is first (drivers most restrictive) to avoid connection
-    concurence in case of DSLR compatible with OpenCV.
+
+    All backends are probed concurrently. If a cache file is given, the ports
+    of the last found camera are reused and the backends of the configurations
+    with a higher priority are searched too (a better camera may have been
+    connected since). The full search is done if the last found camera is not
+    available anymore.
+
+    :param cache_filename: path to the file where the last found camera is saved
+    :type cache_filename: str
+    :param timeout: maximum time in seconds to detect a camera
+    :type timeout: float
     """
-    rpi_cam_proxy = get_rpi_camera_proxy()
-    gp_cam_proxy = get_gp_camera_proxy()
-    cv_cam_proxy = get_cv_camera_proxy()
-
-    if rpi_cam_proxy and gp_cam_proxy:
-        LOGGER.info("Configuring hybrid camera (Picamera + gPhoto2) ...")
-        close_proxy(None, None, cv_cam_proxy)
-        return HybridRpiCamera(rpi_cam_proxy, gp_cam_proxy)
-    elif cv_cam_proxy and gp_cam_proxy:
-        LOGGER.info("Configuring hybrid camera (OpenCV + gPhoto2) ...")
-        close_proxy(rpi_cam_proxy, None, None)
-        return HybridCvCamera(cv_cam_proxy, gp_cam_proxy)
-    elif gp_cam_proxy:
-        LOGGER.info("Configuring gPhoto2 camera ...")
-        close_proxy(rpi_cam_proxy, None, cv_cam_proxy)
-        return GpCamera(gp_cam_proxy)
-    elif rpi_cam_proxy:
-        LOGGER.info("Configuring Picamera camera ...")
-        close_proxy(None, gp_cam_proxy, cv_cam_proxy)
-        return RpiCamera(rpi_cam_proxy)
-    elif cv_cam_proxy:
-        LOGGER.info("Configuring OpenCV camera ...")
-        close_proxy(rpi_cam_proxy, gp_cam_proxy, None)
-        return CvCamera(cv_cam_proxy)
+    ports = _load_cache(cache_filename)
+    found = None
+    if ports:
+        better = _get_better_backends(ports)
+        if better:
+            LOGGER.info("Search last camera found %s and better cameras (%s) ...", ports, ', '.join(sorted(better)))
+        else:
+            LOGGER.info("Search only last camera found %s (delete '%s' to search all cameras) ...",
+                        ports, cache_filename)
+        search = dict(ports, **dict((backend, None) for backend in better))
+        found = _run_probes(search, timeout)
+        if any(backend not in found for backend in ports):
+            LOGGER.info("Last camera found not available anymore, search all cameras ...")
+            _close_proxies(dict((backend, proxy) for backend, (proxy, _) in found.items()))
+            found = None
+
+    if found is None:
+        found = _run_probes(dict((backend, None) for backend in PROBES), timeout)
+
+    for backends, class_name, description in CONFIGURATIONS:
+        if all(backend in found for backend in backends):
+            LOGGER.info("Configuring %s ...", description)
+            _close_proxies(dict((backend, proxy) for backend, (proxy, _) in found.items()
+                                if backend not in backends))
+            _save_cache(cache_filename, dict((backend, found[backend][1]) for backend in backends))
+            return _get_backend(class_name)(*[found[backend][0] for backend in backends])
 
     raise EnvironmentError("Neither Raspberry Pi nor GPhoto2 nor OpenCV camera detected")
@@ -1,11 +1,11 @@
 # -*- coding: utf-8 -*-
 
-from webbrowser import get
 import pygame
 from PIL import Image, ImageDraw
 
 from pibooth import fonts
 from pibooth.pictures import sizing
+from pibooth.tracing import TRACER
 
 
 class BaseCamera(object):
@@ -109,11 +109,18 @@ class BaseCamera(object):
         """Return all buffered captures as PIL images (buffer dropped after call).
         """
         images = []
-        for data in self._captures:
-            images.append(self._post_process_capture(data))
+        for index, data in enumerate(self._captures):
+            with TRACER.span('post_process', index=index):
+                images.append(self._post_process_capture(data))
         self.drop_captures()
         return images
     
+    def get_buffered_captures(self):
+        """Return the list of buffered captures data, as returned by the
+        camera (not post processed, buffer kept).
+        """
+        return list(self._captures)
+
     def get_last_capture(self):
         if len(self._captures) > 0:
             return self._post_process_capture(self._captures[-1])
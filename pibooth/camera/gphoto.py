@@ -12,6 +12,7 @@ from pibooth.pictures import sizing
 from pibooth.utils import LOGGER, PoolingTimer, pkill
 from pibooth.language import get_translated_text
 from pibooth.camera.base import BaseCamera
+from pibooth.tracing import TRACER
 
 
 def get_gp_camera_proxy(port=None):
@@ -143,11 +144,14 @@ class GpCamera(BaseCamera):
         :type capture_data: tuple
         """
         gp_path, effect = capture_data
-        camera_file = self._cam.file_get(gp_path.folder, gp_path.name, gp.GP_FILE_TYPE_NORMAL)
+        with TRACER.span('download', file=gp_path.name):
+            camera_file = self._cam.file_get(gp_path.folder, gp_path.name, gp.GP_FILE_TYPE_NORMAL)
         if self.delete_internal_memory:
             LOGGER.debug("Delete capture '%s' from internal memory", gp_path.name)
             self._cam.file_delete(gp_path.folder, gp_path.name)
-        image = Image.open(io.BytesIO(camera_file.get_data_and_size()))
+        with TRACER.span('decode', file=gp_path.name):
+            image = Image.open(io.BytesIO(camera_file.get_data_and_size()))
+            image.load()
         image = self._rotate_image(image, self.capture_rotation)
 
         # Crop to keep aspect ratio of the resolution
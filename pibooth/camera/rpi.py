@@ -1,7 +1,6 @@
 # -*- coding: utf-8 -*-
 
 import time
-from tkinter import NO
 import pygame
 import subprocess
 import numpy as np  # type: ignore
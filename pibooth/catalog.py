@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+
+"""Pibooth sessions catalog.
+"""
+
+import os
+import time
+import queue
+import sqlite3
+import threading
+import os.path as osp
+from pibooth.utils import LOGGER
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,       -- Date of the first capture: %Y-%m-%d-%H-%M-%S
+    start_time REAL NOT NULL,          -- Timestamp of the first capture
+    end_time REAL,                     -- Timestamp of the final picture saving
+    processing_time REAL,              -- Time to save the captures and build the final picture
+    layout INTEGER,                    -- Index of the captures number in the possible choices
+    captures INTEGER NOT NULL DEFAULT 0,
+    final_file TEXT,
+    printed INTEGER NOT NULL DEFAULT 0,
+    forgotten INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS sessions_start_time ON sessions (start_time);
+CREATE INDEX IF NOT EXISTS sessions_status ON sessions (forgotten, printed);
+CREATE INDEX IF NOT EXISTS sessions_final_file ON sessions (final_file);
+
+CREATE TABLE IF NOT EXISTS files (
+    session_id TEXT NOT NULL REFERENCES sessions (session_id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,                -- 'capture' or 'final'
+    path TEXT NOT NULL,
+    PRIMARY KEY (session_id, path)
+);
+"""
+
+DATE_FORMAT = "%Y-%m-%d-%H-%M-%S"
+FINAL_SUFFIX = "_pibooth.jpg"
+
+
+def get_session_time(session_id):
+    """Return the timestamp of the given session ID (or None if the ID
+    is not a date).
+    """
+    try:
+        return time.mktime(time.strptime(session_id, DATE_FORMAT))
+    except ValueError:
+        return None
+
+
+class SessionCatalog(object):
+
+    """Index of the sessions (captures, final picture, prints and forgets)
+    saved in a SQLite database.
+
+    The modifications are committed from a worker thread (with its own
+    connection) to not block the caller on the disk synchronization. The
+    read methods wait for the queued modifications to be committed.
+
+    All methods shall be called from the same thread.
+
+    :param filename: path to the database file
+    :type filename: str
+    :param threaded: commit the modifications from a worker thread
+    :type threaded: bool
+    """
+
+    def __init__(self, filename, threaded=True):
+        self.filename = osp.abspath(osp.expanduser(filename))
+        dirname = osp.dirname(self.filename)
+        if not osp.isdir(dirname):
+            os.makedirs(dirname)
+        self._conn = self._connect()
+        self._conn.executescript(SCHEMA)
+        self._queue = queue.Queue()
+        self._worker = None
+        if threaded:
+            self._worker = threading.Thread(target=self._run, name='SessionCatalog', daemon=True)
+            self._worker.start()
+
+    def _connect(self):
+        """Return a new connection to the database.
+        """
+        conn = sqlite3.connect(self.filename)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")  # Readers don't block the booth
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def _run(self):
+        """Worker thread committing the queued modifications.
+        """
+        conn = self._connect()
+        try:
+            while True:
+                modify = self._queue.get()
+                try:
+                    if modify is None:
+                        break  # Quit requested
+                    self._apply(conn, modify)
+                finally:
+                    self._queue.task_done()
+        finally:
+            conn.close()
+
+    def _apply(self, conn, modify):
+        """Execute the given modification function in a transaction. Errors
+        are logged, they shall not break the booth.
+        """
+        try:
+            with conn:
+                modify(conn)
+        except sqlite3.Error as ex:
+            LOGGER.error("Can not update sessions catalog '%s': %s", self.filename, ex)
+
+    def _submit(self, modify):
+        """Queue a function executing modification queries on the connection
+        given as argument.
+        """
+        if self._worker:
+            self._queue.put(modify)
+        else:
+            self._apply(self._conn, modify)
+
+    def _execute(self, query, *args):
+        """Queue a modification query.
+        """
+        self._submit(lambda conn: conn.execute(query, args))
+
+    def flush(self):
+        """Block until all queued modifications are committed.
+        """
+        if self._worker:
+            self._queue.join()
+
+    def add_session(self, session_id, layout=None, captures=(), final_files=(), processing_time=None):
+        """Register a new session (or update it if already registered).
+
+        :param session_id: session ID (date of the first capture)
+        :type session_id: str
+        :param layout: index of the captures number in the possible choices
+        :type layout: int
+        :param captures: paths to the raw captures
+        :type captures: list
+        :param final_files: paths to the final picture (one per saving directory)
+        :type final_files: list
+        :param processing_time: time to save the captures and build the final picture
+        :type processing_time: float
+        """
+        final_files = list(final_files)
+        captures = list(captures)
+        values = (session_id, get_session_time(session_id) or time.time(), time.time(),
+                  processing_time, layout, len(set(osp.basename(path) for path in captures)),
+                  final_files[-1] if final_files else None)
+
+        def modify(conn):
+            conn.execute("""
+                INSERT INTO sessions (session_id, start_time, end_time, processing_time, layout,
+                                      captures, final_file)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (session_id) DO UPDATE SET
+                    end_time=excluded.end_time, processing_time=excluded.processing_time,
+                    layout=excluded.layout, captures=excluded.captures, final_file=excluded.final_file
+                """, values)
+            conn.executemany("INSERT OR REPLACE INTO files (session_id, kind, path) VALUES (?, ?, ?)",
+                             [(session_id, 'capture', path) for path in captures] +
+                             [(session_id, 'final', path) for path in final_files])
+        self._submit(modify)
+
+    def add_print(self, final_file):
+        """Increment the print counter of the session of the given final picture.
+        """
+        self._execute("UPDATE sessions SET printed=printed + 1 WHERE final_file=?", final_file)
+
+    def set_forgotten(self, session_id, final_files=()):
+        """Mark a session as forgotten, ``final_files`` are the new paths to the
+        final picture (after moving it in the forget folder).
+        """
+        final_files = list(final_files)
+
+        def modify(conn):
+            conn.execute("DELETE FROM files WHERE session_id=? AND kind='final'", (session_id,))
+            conn.executemany("INSERT OR REPLACE INTO files (session_id, kind, path) VALUES (?, ?, ?)",
+                             [(session_id, 'final', path) for path in final_files])
+            conn.execute("UPDATE sessions SET forgotten=1, final_file=? WHERE session_id=?",
+                         (final_files[-1] if final_files else None, session_id))
+        self._submit(modify)
+
+    def remove_captures(self, session_id):
+        """Forget the raw captures files of the given session (they have been
+        removed from the disk).
+        """
+        self._execute("DELETE FROM files WHERE session_id=? AND kind='capture'", session_id)
+
+    def get_session(self, session_id):
+        """Return a dict representing the given session (None if unknown),
+        with the lists of ``captures_files`` and ``final_files``.
+        """
+        self.flush()
+        row = self._conn.execute("SELECT * FROM sessions WHERE session_id=?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        session = dict(row)
+        files = self._conn.execute("SELECT kind, path FROM files WHERE session_id=? ORDER BY path",
+                                   (session_id,)).fetchall()
+        session['captures_files'] = [path for kind, path in files if kind == 'capture']
+        session['final_files'] = [path for kind, path in files if kind == 'final']
+        return session
+
+    def get_sessions(self, start=None, end=None, printed=None, forgotten=None):
+        """Return the list of sessions (dicts sorted by start time) matching
+        the given criteria.
+
+        :param start: minimum start timestamp
+        :type start: float
+        :param end: maximum start timestamp (excluded)
+        :type end: float
+        :param printed: True to get printed sessions only, False for not printed ones
+        :type printed: bool
+        :param forgotten: True to get forgotten sessions only, False for kept ones
+        :type forgotten: bool
+        """
+        self.flush()
+        clauses, args = [], []
+        if forgotten is not None:
+            clauses.append("forgotten=?")
+            args.append(int(forgotten))
+        if printed is not None:
+            clauses.append("printed > 0" if printed else "printed=0")
+        if start is not None:
+            clauses.append("start_time >= ?")
+            args.append(start)
+        if end is not None:
+            clauses.append("start_time < ?")
+            args.append(end)
+        query = "SELECT * FROM sessions"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY start_time"
+        return [dict(row) for row in self._conn.execute(query, args)]
+
+    def get_statistics(self):
+        """Return a dict with the number of sessions, prints and forgets.
+        """
+        self.flush()
+        row = self._conn.execute("""
+            SELECT COUNT(*), COALESCE(SUM(printed), 0), COALESCE(SUM(forgotten), 0), AVG(processing_time)
+            FROM sessions""").fetchone()
+        return {'sessions': row[0], 'printed': row[1], 'forgotten': row[2], 'processing_time': row[3]}
+
+    def rebuild(self, directories, capture_choices=(4, 1)):
+        """Rebuild the catalog from the files found in the given saving
+        directories. The print counters of the known sessions are kept.
+
+        :param directories: list of saving directories
+        :type directories: list
+        :param capture_choices: possible captures numbers (to find the layout)
+        :type capture_choices: tuple
+
+        :return: number of sessions found
+        :rtype: int
+        """
+        self.flush()
+        sessions = {}
+        for savedir in directories:
+            rawdir = osp.join(savedir, 'raw')
+            if osp.isdir(rawdir):
+                for session_id in sorted(os.listdir(rawdir)):
+                    if osp.isdir(osp.join(rawdir, session_id)):
+                        session = sessions.setdefault(session_id, {'captures': [], 'finals': [], 'forgotten': 0})
+                        session['captures'].extend(osp.join(rawdir, session_id, name)
+                                                   for name in sorted(os.listdir(osp.join(rawdir, session_id))))
+            for dirname, forgotten in ((savedir, 0), (osp.join(savedir, 'forget'), 1)):
+                if not osp.isdir(dirname):
+                    continue
+                for name in sorted(os.listdir(dirname)):
+                    if name.endswith(FINAL_SUFFIX):
+                        session = sessions.setdefault(name[:-len(FINAL_SUFFIX)],
+                                                      {'captures': [], 'finals': [], 'forgotten': 0})
+                        session['finals'].append(osp.join(dirname, name))
+                        session['forgotten'] = max(session['forgotten'], forgotten)
+
+        printed = dict((row[0], row[1]) for row in self._conn.execute("SELECT session_id, printed FROM sessions"))
+        with self._conn:
+            self._conn.execute("DELETE FROM files")
+            self._conn.execute("DELETE FROM sessions")
+            for session_id, session in sorted(sessions.items()):
+                nbr = len(set(osp.basename(path) for path in session['captures']))
+                final_file = session['finals'][-1] if session['finals'] else None
+                end_time = osp.getmtime(final_file) if final_file else None
+                self._conn.execute("""
+                    INSERT INTO sessions (session_id, start_time, end_time, layout, captures, final_file,
+                                          printed, forgotten)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                                   (session_id, get_session_time(session_id) or end_time or 0, end_time,
+                                    capture_choices.index(nbr) if nbr in capture_choices else None, nbr,
+                                    final_file, printed.get(session_id, 0), session['forgotten']))
+                self._conn.executemany("INSERT OR REPLACE INTO files (session_id, kind, path) VALUES (?, ?, ?)",
+                                       [(session_id, 'capture', path) for path in session['captures']] +
+                                       [(session_id, 'final', path) for path in session['finals']])
+        LOGGER.info("Sessions catalog rebuilt with %s sessions", len(sessions))
+        return len(sessions)
+
+    def close(self):
+        """Commit the queued modifications and close the database.
+        """
+        if self._worker:
+            self._queue.put(None)
+            self._worker.join()
+            self._worker = None
+        self._conn.close()
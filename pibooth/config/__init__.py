@@ -1,4 +1,17 @@
 # -*- coding: utf-8 -*-
 
+import sys
 from pibooth.config.parser import PiConfigParser
-from pibooth.config.menu import PiConfigMenu
+
+if sys.version_info >= (3, 7):
+
+    def __getattr__(name):
+        """Import the menu only when used (pygame-menu is slow to load).
+        """
+        if name == 'PiConfigMenu':
+            from pibooth.config.menu import PiConfigMenu
+            return PiConfigMenu
+        raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+
+else:
+    from pibooth.config.menu import PiConfigMenu
@@ -6,6 +6,7 @@
 import io
 import ast
 import os
+import copy
 import os.path as osp
 import itertools
 import inspect
@@ -56,6 +57,38 @@ DEFAULT = odict((
                 (False,
                  "Enable a virtual keyboard in the settings interface",
                  "Virtual keyboard", ['True', 'False'])),
+            ("monitoring",
+                (False,
+                 "Measure the execution time of each hook and plugin (statistics are dumped periodically in the logs and in 'hooks_statistics.json')",
+                 None, None)),
+            ("monitoring_interval",
+                (60,
+                 "How often in seconds the hooks statistics are dumped",
+                 None, None)),
+            ("max_disk_usage",
+                (0,
+                 "Maximum size in MB of each saving directory, the oldest raw captures are removed when reached (0 for no limit)",
+                 None, None)),
+            ("min_free_space",
+                (50,
+                 "Free disk space in MB required to start a new session, else the session is refused (0 for no check)",
+                 None, None)),
+            ("write_sync",
+                ("idle",
+                 "Synchronize written files on disk: 'always' (safest), 'idle' (when no more file to write) or 'never'",
+                 None, None)),
+            ("memory_budget",
+                (0,
+                 "Maximum memory in MB used by the held images, reduced to the screen size when exceeded (0 for no limit)",
+                 None, None)),
+            ("frames_telemetry",
+                ("",
+                 "Path to a CSV or JSON file where the timings of the last frames are saved on exit (empty to disable)",
+                 None, None)),
+            ("sessions_trace",
+                ("",
+                 "Path to a file where the duration of each step of the sessions is written: Chrome trace format if the extension is '.json', else JSON lines (empty to disable)",
+                 None, None)),
         ))
      ),
     ("WINDOW",
@@ -116,6 +149,10 @@ DEFAULT = odict((
                 (False,
                  "Stop the preview before taking the capture",
                  None, None)),
+            ("performance_overlay",
+                (False,
+                 "Display the rendering performance (fps, frame time, memory, pending jobs) on top of the window (toggled by Ctrl+D)",
+                 None, None)),
         ))
      ),
     ("PICTURE",
@@ -172,6 +209,10 @@ DEFAULT = odict((
                 (True,
                  "Allow the user to forget the last taken capture on the printer page step",
                  "Can forget",  ['True', 'False'])),
+            ("thumbnails_sizes",
+                ((256, 1024),
+                 "Maximum width/height (in pixels) of the thumbnails generated for each final picture (empty to disable)",
+                 None, None)),
         ))
      ),
     ("CAMERA",
@@ -202,7 +243,7 @@ DEFAULT = odict((
         odict((
             ("printer_name",
                 ("default",
-                 "Name of the printer defined in CUPS (or use the 'default' one)",
+                 "Name of the printer defined in CUPS (or use the 'default' one, or 'simulator' to print nothing)",
                  None, None)),
             ("printer_options",
                 ({},
@@ -228,6 +269,10 @@ DEFAULT = odict((
                 (1,
                  "Print 1, 2, 3 or 4 picture copies per page",
                  'Number of copies per page', [str(i) for i in range(1, 5)])),
+            ("ganging_delay",
+                (0,
+                 "How long in seconds a picture is held to be printed on the same page than the next one (0 to disable)",
+                 'Page sharing delay', [str(i) for i in range(0, 121, 10)])),
         ))
      ),
     ("CONTROLS",
@@ -268,9 +313,15 @@ class PiConfigParser(RawConfigParser):
 
     :attr filename: absolute path to the laoded config file
     :type filename: str
+    :attr parsing_avoided: number of values returned from the typed snapshot
+                           without being parsed again
+    :type parsing_avoided: int
     """
 
     def __init__(self, filename, plugin_manager, load=True):
+        # Typed values, built once and dropped each time the configuration changes
+        self._snapshot = {}
+        self.parsing_avoided = 0
         super(PiConfigParser, self).__init__()
         self._pm = plugin_manager
         self.filename = osp.abspath(osp.expanduser(filename))
@@ -310,9 +361,23 @@ class PiConfigParser(RawConfigParser):
 
         self.handle_autostart()
 
+    def _get_from_snapshot(self, key, parse):
+        """Return the typed value from the snapshot, call ``parse`` to build
+        it if not already done.
+        """
+        try:
+            value = self._snapshot[key]
+            self.parsing_avoided += 1
+        except KeyError:
+            value = self._snapshot[key] = parse()
+        if isinstance(value, (list, dict)):
+            return copy.deepcopy(value)  # Protect the snapshot from modifications
+        return value
+
     def load(self):
         """Load configuration from file.
         """
+        self._snapshot.clear()
         self.read(self.filename, encoding="utf-8")
         self.handle_autostart()
 
@@ -401,6 +466,7 @@ class PiConfigParser(RawConfigParser):
         # Add the option to the default dictionary
         description = "{}\n# Required by '{}' plugin".format(description, plugin_name)
         DEFAULT.setdefault(section, odict())[option] = (default, description, menu_name, menu_choices)
+        self._snapshot.clear()
 
     def get(self, section, option, **kwargs):
         """Get a value from config. Return the default value if the section
@@ -431,6 +497,31 @@ class PiConfigParser(RawConfigParser):
         if not self.has_section(section):
             self.add_section(section)
         super(PiConfigParser, self).set(section, option, value)
+        self._snapshot.clear()
+
+    def getint(self, section, option, **kwargs):
+        """Get a value from config and convert it to an integer.
+        """
+        if kwargs:
+            return super(PiConfigParser, self).getint(section, option, **kwargs)
+        return self._get_from_snapshot(('int', section, option),
+                                       lambda: super(PiConfigParser, self).getint(section, option))
+
+    def getfloat(self, section, option, **kwargs):
+        """Get a value from config and convert it to a float.
+        """
+        if kwargs:
+            return super(PiConfigParser, self).getfloat(section, option, **kwargs)
+        return self._get_from_snapshot(('float', section, option),
+                                       lambda: super(PiConfigParser, self).getfloat(section, option))
+
+    def getboolean(self, section, option, **kwargs):
+        """Get a value from config and convert it to a boolean.
+        """
+        if kwargs:
+            return super(PiConfigParser, self).getboolean(section, option, **kwargs)
+        return self._get_from_snapshot(('boolean', section, option),
+                                       lambda: super(PiConfigParser, self).getboolean(section, option))
 
     def gettyped(self, section, option):
         """Get a value from config and try to convert it in a native Python
@@ -441,6 +532,12 @@ class PiConfigParser(RawConfigParser):
         :param option: option name
         :type option: str
         """
+        return self._get_from_snapshot(('typed', section, option),
+                                       lambda: self._parse_typed(section, option))
+
+    def _parse_typed(self, section, option):
+        """Evaluate the value of the option (see :py:meth:`gettyped`).
+        """
         value = self.get(section, option)
         try:
             return ast.literal_eval(value)
@@ -456,7 +553,8 @@ class PiConfigParser(RawConfigParser):
         :param option: option name
         :type option: str
         """
-        return self._get_abs_path(self.get(section, option))
+        return self._get_from_snapshot(('path', section, option),
+                                       lambda: self._get_abs_path(self.get(section, option)))
 
     @staticmethod
     def _get_authorized_types(types):
@@ -501,7 +599,16 @@ class PiConfigParser(RawConfigParser):
         :param extend: extend the tuple with the last value until length is reached
         :type extend: int
         """
-        values = self.gettyped(section, option)
+        if isinstance(types, list):
+            key = ('tuple', section, option, tuple(types), extend)
+        else:
+            key = ('tuple', section, option, types, extend)
+        return self._get_from_snapshot(key, lambda: self._parse_tuple(section, option, types, extend))
+
+    def _parse_tuple(self, section, option, types, extend):
+        """Build the tuple of values of the option (see :py:meth:`gettuple`).
+        """
+        values = self._parse_typed(section, option)
         types, color, path = self._get_authorized_types(types)
 
         if not isinstance(values, (tuple, list)):
@@ -1,15 +1,34 @@
 # -*- coding: utf-8 -*-
 
+import os
 import pickle
+import tempfile
+import threading
 import os.path as osp
+from pibooth.utils import LOGGER
 
 
 class Counters(object):
 
+    """Holder for counter values saved in a file.
+
+    Modifications are kept in memory and written asynchronously after
+    ``flush_delay`` seconds (several modifications are batched in one write).
+    The file is replaced atomically, thus a power cut loses at most the
+    modifications done since the last flush.
+    """
+
+    flush_delay = 1.0
+
     def __init__(self, filename='', **kwargs):
         self.data = kwargs.copy()
         self.default = kwargs
         self.filename = osp.abspath(osp.expanduser(filename))
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._timer = None
+        self._pending = {}  # Modifications not saved yet
+        self._saved = self.data.copy()  # Content of the file
         if osp.isfile(self.filename):
             self.load()
 
@@ -37,30 +56,119 @@ class Counters(object):
         """Called each time an attribute is set.
         """
         if name != 'data' and name in self.data:
-            self.data[name] = value
-            self.save()
+            with self._lock:
+                self.data[name] = value
+                self._pending[name] = value
+                self._schedule_flush()
         else:
             super(Counters, self).__setattr__(name, value)
 
+    def _schedule_flush(self, delay=None):
+        """Start the flush timer if not already running.
+        """
+        if not self._timer:
+            self._timer = threading.Timer(self.flush_delay if delay is None else delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _write(self, data):
+        """Write the given data in a temporary file, then atomically replace
+        the counters file by it.
+        """
+        dirname = osp.dirname(self.filename)
+        fd, tmp_filename = tempfile.mkstemp(prefix='.', suffix='.tmp', dir=dirname)
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                pickle.dump(data, fp, pickle.HIGHEST_PROTOCOL)
+                fp.flush()
+                os.fsync(fp.fileno())
+            os.replace(tmp_filename, self.filename)
+        except BaseException:
+            if osp.exists(tmp_filename):
+                os.remove(tmp_filename)
+            raise
+
+        # Ensure the rename itself is persisted
+        try:
+            dir_fd = os.open(dirname, os.O_RDONLY)
+        except OSError:
+            return  # Directory can not be opened on this platform
+        try:
+            os.fsync(dir_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(dir_fd)
+
     def names(self):
         """Return the list of counters.
         """
         return [key for key in self.data]
 
     def load(self):
-        """Load the saved counters.
+        """Load the saved counters (pending modifications are saved before).
         """
-        with open(self.filename, 'rb') as fp:
-            self.data.update(pickle.load(fp))
+        self.flush()
+        with self._lock:
+            with open(self.filename, 'rb') as fp:
+                self.data.update(pickle.load(fp))
+            self._saved = self.data.copy()
 
     def reset(self):
         """Reset all counters.
         """
-        self.data = self.default.copy()
+        with self._lock:
+            self.data = self.default.copy()
         self.save()
 
+    def flush(self):
+        """Save the counters in the file if they have been modified since
+        the last save.
+        """
+        with self._write_lock:  # Writes are done in the order of the snapshots
+            with self._lock:
+                if self._timer:
+                    self._timer.cancel()
+                    self._timer = None
+                if not self._pending:
+                    return
+                pending = self._pending
+                self._pending = {}
+                data = self._saved.copy()
+                data.update(pending)
+
+            try:
+                self._write(data)
+            except (OSError, pickle.PickleError) as ex:
+                LOGGER.error("Can not save counters in '%s': %s", self.filename, ex)
+                with self._lock:
+                    pending.update(self._pending)
+                    self._pending = pending
+                    self._schedule_flush()  # Retry later
+            else:
+                self._saved = data
+
+    def flush_soon(self):
+        """Save the pending modifications without waiting the flush delay,
+        from the timer thread (the caller is not blocked by the write).
+        """
+        with self._lock:
+            if not self._pending:
+                return
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            self._schedule_flush(0)
+
     def save(self):
-        """Save the current counters in a file.
+        """Save the current counters in a file (synchronously).
         """
-        with open(self.filename, 'wb') as fp:
-            pickle.dump(self.data, fp, pickle.HIGHEST_PROTOCOL)
+        with self._write_lock:
+            with self._lock:
+                if self._timer:
+                    self._timer.cancel()
+                    self._timer = None
+                data = self.data.copy()
+                self._pending = {}
+            self._write(data)
+            self._saved = data
@@ -3,6 +3,7 @@
 import os
 import os.path as osp
 import fnmatch
+import functools
 from difflib import SequenceMatcher
 import pygame
 from PIL import ImageFont
@@ -53,6 +54,46 @@ def get_filename(name):
     raise ValueError('System font "{0}" unknown, maybe you mean "{1}"'.format(name, most_similar))
 
 
+@functools.lru_cache(maxsize=32)
+def get_font(filename, size):
+    """Return the pygame font object of the given size. Font objects are
+    shared (the font file is parsed only once per size).
+
+    :param filename: path to font definition file
+    :type filename: str
+    :param size: height of the font in pixels
+    :type size: int
+
+    :return: pygame.Font instance
+    :rtype: object
+    """
+    return pygame.font.Font(filename, size)
+
+
+@functools.lru_cache(maxsize=128)
+def _render_text(text, filename, size, color):
+    return get_font(filename, size).render(text, True, color)
+
+
+def render_text(text, filename, size, color):
+    """Return the surface of the text rendered with the given font. Surfaces
+    are shared, so they shall not be modified.
+
+    :param text: text to draw
+    :type text: str
+    :param filename: path to font definition file
+    :type filename: str
+    :param size: height of the font in pixels
+    :type size: int
+    :param color: RGB color of the text
+    :type color: tuple
+
+    :return: pygame.Surface with the text
+    :rtype: object
+    """
+    return _render_text(text, filename, size, tuple(color))
+
+
 def get_pil_font(text, font_name, max_width, max_height):
     """Create the PIL font object which fit the text to the given rectangle.
 
@@ -105,7 +146,7 @@ def get_pygame_font(text, font_name, max_width, max_height):
         else:
             start = k + 1
         del font  # Run garbage collector, to avoid opening too many files
-    return pygame.font.Font(get_filename(font_name), start)
+    return get_font(get_filename(font_name), start)
 
 
 CURRENT = get_filename('BebasNeue-Regular')  # Dynamically set at startup
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+"""Pibooth memory accounting of the held images.
+"""
+
+import io
+from collections import OrderedDict
+
+import pygame
+from PIL import Image
+from pibooth.utils import LOGGER, MEGABYTE
+
+
+def get_memory_size(obj):
+    """Return an estimation of the memory used by the pixels of the given
+    object (PIL image, pygame surface, buffer or collection of them).
+    """
+    if obj is None:
+        return 0
+    if isinstance(obj, Image.Image):
+        return obj.size[0] * obj.size[1] * len(obj.getbands())
+    if isinstance(obj, pygame.Surface):
+        return obj.get_width() * obj.get_height() * obj.get_bytesize()
+    if isinstance(obj, (bytes, bytearray)):
+        return len(obj)
+    if isinstance(obj, io.BytesIO):
+        return obj.getbuffer().nbytes
+    if hasattr(obj, 'nbytes'):  # Numpy array
+        return obj.nbytes
+    if isinstance(obj, dict):
+        return sum(get_memory_size(value) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(get_memory_size(value) for value in obj)
+    return 0
+
+
+def reduce_image(image, size):
+    """Return a copy of the PIL image fitting in the given size (the image
+    itself if already smaller).
+    """
+    if image is None or (image.size[0] <= size[0] and image.size[1] <= size[1]):
+        return image
+    image = image.copy()
+    image.thumbnail(size, Image.LANCZOS)
+    return image
+
+
+class MemoryBudget(object):
+
+    """Account the memory used by the images held by the application and
+    downgrade them when the budget is exceeded.
+
+    Holders are registered with a function returning the held objects and
+    a function downgrading them. Holders are downgraded in the order of
+    their registration until the budget is met.
+
+    :attr budget: maximum memory in bytes (0 for no limit)
+    :type budget: int
+    :attr screen_size: size of the screen, used to downgrade the images
+    :type screen_size: tuple
+    """
+
+    def __init__(self, budget=0, screen_size=(800, 480)):
+        self.budget = budget
+        self.screen_size = screen_size
+        self._holders = OrderedDict()  # {name: (getter, downgrade)}
+
+    def register(self, name, getter, downgrade=None):
+        """Register a holder of images.
+
+        :param name: name of the holder
+        :type name: str
+        :param getter: function without argument returning the held objects
+        :type getter: callable
+        :param downgrade: function called with the screen size to release
+                          memory (None if the holder can not be downgraded)
+        :type downgrade: callable
+        """
+        self._holders[name] = (getter, downgrade)
+
+    def get_usage(self):
+        """Return a dict of the memory in bytes used by each holder.
+        """
+        return OrderedDict((name, get_memory_size(getter())) for name, (getter, _) in self._holders.items())
+
+    def check(self):
+        """Log the memory used and downgrade the holders if the budget is
+        exceeded. Shall be called when the held images are not used for
+        a new picture (waiting for a new session).
+
+        :return: memory in bytes used after downgrade
+        :rtype: int
+        """
+        usage = self.get_usage()
+        total = sum(usage.values())
+        LOGGER.debug("Held images memory: %.1f MB (%s)", total / MEGABYTE,
+                     ", ".join("{}={:.1f}MB".format(name, size / MEGABYTE) for name, size in usage.items()))
+        if not self.budget or total <= self.budget:
+            return total
+
+        for name, (getter, downgrade) in self._holders.items():
+            if downgrade and usage[name]:
+                downgrade(self.screen_size)
+                size = get_memory_size(getter())
+                total -= usage[name] - size
+                LOGGER.info("Held images '%s' downgraded from %.1f MB to %.1f MB", name,
+                            usage[name] / MEGABYTE, size / MEGABYTE)
+                if total <= self.budget:
+                    break
+        if total > self.budget:
+            LOGGER.warning("Held images memory %.1f MB exceeds the budget of %.1f MB",
+                           total / MEGABYTE, self.budget / MEGABYTE)
+        return total
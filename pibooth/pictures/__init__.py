@@ -7,6 +7,7 @@ from pibooth import language
 from pibooth import fonts
 from pibooth.pictures import factory
 from pibooth.pictures import sizing
+from pibooth.pictures.thumbnails import get_thumbnail, load_thumbnail, save_thumbnails, move_thumbnails
 
 
 AUTO = 'auto'
@@ -186,7 +187,7 @@ def get_picture_factory(captures, orientation=AUTO, paper_format=(4, 6), force_p
     if orientation == LANDSCAPE:
         size = (size[1], size[0])
 
-    if not factory.cv2 or force_pil:
+    if force_pil or not factory.import_opencv():
         return factory.PilPictureFactory(size[0], size[1], *captures)
 
     return factory.OpenCvPictureFactory(size[0], size[1], *captures)
@@ -7,11 +7,26 @@ from pibooth.utils import LOGGER
 from pibooth.pictures import sizing
 from PIL import Image, ImageDraw
 
-try:
-    import cv2
-    import numpy as np
-except ImportError:
-    cv2 = None
+# OpenCV and numpy are slow to load, they are imported by import_opencv()
+# when the first OpenCV factory is needed
+cv2 = None
+np = None
+
+
+def import_opencv():
+    """Import the OpenCV and numpy modules (only once). Return False if they
+    are not installed.
+    """
+    global cv2, np  # pylint: disable=global-statement,invalid-name
+    if cv2 is None:
+        try:
+            import cv2 as cv2_module
+            import numpy as np_module
+        except ImportError:
+            cv2 = False
+        else:
+            cv2, np = cv2_module, np_module
+    return bool(cv2)
 
 
 class PictureFactory(object):
@@ -436,6 +451,11 @@ class PilPictureFactory(PictureFactory):
 
 class OpenCvPictureFactory(PictureFactory):
 
+    def __init__(self, width, height, *images):
+        if not import_opencv():
+            raise ImportError("OpenCV is required by {}".format(self.__class__.__name__))
+        super(OpenCvPictureFactory, self).__init__(width, height, *images)
+
     def _image_resize_keep_ratio(self, image, max_w, max_h, crop=False):
         """See upper class description.
         """
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+"""Small renditions of the final pictures, stored in a ``.thumbnails``
+folder next to them. Each picture has a JSON manifest describing its
+thumbnails and the version of the picture they were built from.
+"""
+
+import io
+import os
+import json
+import os.path as osp
+from PIL import Image
+from pibooth.utils import LOGGER
+from pibooth.pictures import sizing
+
+
+THUMBNAILS_DIR = '.thumbnails'
+
+
+def get_manifest_filename(filename):
+    """Return the path to the manifest of the thumbnails of the given picture.
+    """
+    dirname, name = osp.split(osp.abspath(filename))
+    return osp.join(dirname, THUMBNAILS_DIR, osp.splitext(name)[0] + '.json')
+
+
+def get_manifest(filename):
+    """Return the manifest of the thumbnails of the given picture, or None
+    if there is no thumbnail or if they are outdated.
+    """
+    manifest_filename = get_manifest_filename(filename)
+    try:
+        with io.open(manifest_filename, encoding='utf-8') as fp:
+            manifest = json.load(fp)
+        stat = os.stat(filename)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('mtime') != stat.st_mtime_ns or manifest.get('bytes') != stat.st_size:
+        return None  # Picture modified since thumbnails generation
+    return manifest
+
+
+def save_thumbnails(image, filename, sizes):
+    """Generate the thumbnails of a picture already saved in the given file.
+
+    :param image: picture to reduce
+    :type image: :py:class:`PIL.Image`
+    :param filename: path to the saved picture
+    :type filename: str
+    :param sizes: maximum width/height in pixels of each thumbnail
+    :type sizes: list
+
+    :return: paths to the written files (thumbnails and manifest)
+    :rtype: list
+    """
+    dirname, name = osp.split(osp.abspath(filename))
+    thumbdir = osp.join(dirname, THUMBNAILS_DIR)
+    if not osp.isdir(thumbdir):
+        os.makedirs(thumbdir)
+
+    thumbnails = []
+    thumbnail = image
+    for size in sorted(set(sizes), reverse=True):
+        if size >= max(image.size):
+            continue  # The picture itself is smaller
+        thumbnail = thumbnail.copy()
+        thumbnail.thumbnail((size, size), Image.LANCZOS)  # Built from the previous (bigger) one
+        if thumbnail.mode != 'RGB':
+            thumbnail = thumbnail.convert('RGB')
+        thumbname = "{}_{}.jpg".format(osp.splitext(name)[0], size)
+        thumbnail.save(osp.join(thumbdir, thumbname), quality=85)
+        thumbnails.append({'file': thumbname, 'size': list(thumbnail.size)})
+
+    stat = os.stat(filename)
+    manifest = {'picture': name, 'size': list(image.size), 'mtime': stat.st_mtime_ns, 'bytes': stat.st_size,
+                'thumbnails': sorted(thumbnails, key=lambda thumb: thumb['size'][0])}
+    manifest_filename = get_manifest_filename(filename)
+    with io.open(manifest_filename + '.tmp', 'w', encoding='utf-8') as fp:
+        json.dump(manifest, fp, indent=2)
+    os.replace(manifest_filename + '.tmp', manifest_filename)
+    LOGGER.debug("Generated %s thumbnails for '%s'", len(thumbnails), filename)
+    return [osp.join(thumbdir, thumbnail['file']) for thumbnail in thumbnails] + [manifest_filename]
+
+
+def move_thumbnails(src, dst):
+    """Move the thumbnails of a picture moved from ``src`` to ``dst`` (the
+    picture shall already be moved).
+
+    :param src: previous path to the picture
+    :type src: str
+    :param dst: new path to the picture
+    :type dst: str
+
+    :return: empty list (no new file written)
+    :rtype: list
+    """
+    manifest_filename = get_manifest_filename(src)
+    try:
+        with io.open(manifest_filename, encoding='utf-8') as fp:
+            manifest = json.load(fp)
+    except (OSError, ValueError):
+        return []  # No thumbnails
+
+    srcdir = osp.dirname(manifest_filename)
+    dstdir = osp.join(osp.dirname(osp.abspath(dst)), THUMBNAILS_DIR)
+    if not osp.isdir(dstdir):
+        os.makedirs(dstdir)
+    for thumbnail in manifest['thumbnails']:
+        if osp.isfile(osp.join(srcdir, thumbnail['file'])):
+            os.replace(osp.join(srcdir, thumbnail['file']), osp.join(dstdir, thumbnail['file']))
+    manifest['picture'] = osp.basename(dst)
+    with io.open(get_manifest_filename(dst) + '.tmp', 'w', encoding='utf-8') as fp:
+        json.dump(manifest, fp, indent=2)
+    os.replace(get_manifest_filename(dst) + '.tmp', get_manifest_filename(dst))
+    os.remove(manifest_filename)
+    return []
+
+
+def get_thumbnail(filename, size):
+    """Return the path to the smallest rendition of the given picture which
+    can be displayed in the given size without upscaling. The picture itself
+    is returned if no thumbnail fits.
+
+    :param filename: path to the picture
+    :type filename: str
+    :param size: (width, height) of the area where the picture is displayed
+    :type size: tuple
+
+    :return: path to the thumbnail or to the picture
+    :rtype: str
+    """
+    manifest = get_manifest(filename)
+    if not manifest:
+        return filename
+    target = sizing.new_size_keep_aspect_ratio(manifest['size'], size)
+    for thumbnail in manifest['thumbnails']:
+        if thumbnail['size'][0] >= target[0] and thumbnail['size'][1] >= target[1]:
+            return osp.join(osp.dirname(osp.abspath(filename)), THUMBNAILS_DIR, thumbnail['file'])
+    return filename
+
+
+def load_thumbnail(filename, size):
+    """Return the given picture decoded for a display in the given size: the
+    best-fit thumbnail, or the picture itself decoded at a reduced scale if
+    no thumbnail fits.
+
+    :param filename: path to the picture
+    :type filename: str
+    :param size: (width, height) of the area where the picture is displayed
+    :type size: tuple
+
+    :return: image not bigger than the given size
+    :rtype: :py:class:`PIL.Image`
+    """
+    size = (int(size[0]), int(size[1]))
+    image = Image.open(get_thumbnail(filename, size))
+    image.thumbnail(size)  # JPEG decoded at the closest scale (draft mode)
+    image.load()  # Read data and close the file
+    return image
@@ -5,11 +5,7 @@ import pluggy
 
 from pibooth.utils import LOGGER, load_module
 from pibooth.plugins import hookspecs
-from pibooth.plugins.camera_plugin import CameraPlugin
-from pibooth.plugins.lights_plugin import LightsPlugin
-from pibooth.plugins.picture_plugin import PicturePlugin
-from pibooth.plugins.printer_plugin import PrinterPlugin
-from pibooth.plugins.view_plugin import ViewPlugin
+from pibooth.plugins.monitor import HooksMonitor
 
 
 def create_plugin_manager():
@@ -24,6 +20,7 @@ class PiPluginManager(pluggy.PluginManager):
     def __init__(self, *args, **kwargs):
         super(PiPluginManager, self).__init__(*args, **kwargs)
         self._plugin2calls = {}
+        self.monitor = HooksMonitor()
 
         def before(hook_name, methods, kwargs):
             """Keep the list of already called hook per plugin to know if a
@@ -31,9 +28,12 @@ class PiPluginManager(pluggy.PluginManager):
             """
             for hookimpl in methods:
                 self._plugin2calls[hookimpl.plugin].add(hook_name)
+            self.monitor.start()
 
         def after(outcome, hook_name, methods, kwargs):
-            pass
+            """Measure the hook execution time (if monitoring is enabled).
+            """
+            self.monitor.stop(hook_name)
 
         self.add_hookcall_monitoring(before, after)
 
@@ -44,8 +44,41 @@ class PiPluginManager(pluggy.PluginManager):
         plugin_name = super(PiPluginManager, self).register(plugin, name)
         if plugin not in self._plugin2calls:
             self._plugin2calls[plugin] = set()
+        if self.monitor.enabled:
+            for hook_name, hookimpl in self._iter_hookimpls(plugin):
+                self.monitor.wrap(hookimpl, hook_name)
         return plugin_name
 
+    def _iter_hookimpls(self, plugin=None):
+        """Yield tuples (hook name, hook implementation) for the given plugin
+        or for all registered plugins if None.
+        """
+        plugins = [plugin] if plugin is not None else self.get_plugins()
+        for plg in plugins:
+            for caller in self.get_hookcallers(plg) or []:
+                for hookimpl in caller.get_hookimpls():
+                    if hookimpl.plugin is plg:
+                        yield caller.name, hookimpl
+
+    def enable_monitoring(self, enable=True):
+        """Enable/disable the measure of the execution time of each hook
+        and each plugin implementation. Measures are accessible via the
+        :py:attr:`monitor` attribute.
+
+        :param enable: enable or disable the monitoring
+        :type enable: bool
+        """
+        if enable == self.monitor.enabled:
+            return
+        self.monitor.enabled = enable
+        for hook_name, hookimpl in self._iter_hookimpls():
+            if enable:
+                self.monitor.wrap(hookimpl, hook_name)
+            else:
+                self.monitor.unwrap(hookimpl)
+        if not enable:
+            self.monitor.reset()
+
     def load_all_plugins(self, paths, disabled=None):
         """Register the core plugins, load plugins from setuptools entry points
         and the load given module/package paths.
@@ -68,6 +101,13 @@ class PiPluginManager(pluggy.PluginManager):
                 LOGGER.debug("Plugin found at '%s'", path)
                 plugins.append(plugin)
 
+        # Imported here, not needed (and slow to load) to only read the configuration
+        from pibooth.plugins.camera_plugin import CameraPlugin
+        from pibooth.plugins.lights_plugin import LightsPlugin
+        from pibooth.plugins.picture_plugin import PicturePlugin
+        from pibooth.plugins.printer_plugin import PrinterPlugin
+        from pibooth.plugins.view_plugin import ViewPlugin
+
         plugins += [LightsPlugin(self),  # Last called
                     ViewPlugin(self),
                     PrinterPlugin(self),
@@ -5,6 +5,7 @@ import pygame # type: ignore
 import pibooth
 from pibooth import camera
 from pibooth.utils import LOGGER
+from pibooth.tracing import TRACER
 
 
 class CameraPlugin(object):
@@ -27,7 +28,7 @@ class CameraPlugin(object):
 
         if not cam:
             LOGGER.debug("Fallback to pibooth default camera management system")
-            cam = camera.find_camera()
+            cam = camera.find_camera(cfg.join_path('camera.json'))
 
         cam.initialize(cfg.getint('CAMERA', 'iso'),
                        cfg.gettyped('CAMERA', 'resolution'),
@@ -47,10 +48,12 @@ class CameraPlugin(object):
         app.capture_date = None
         app.capture_nbr = None
         app.camera.drop_captures()  # Flush previous captures
+        TRACER.start_trace(None)
 
     @pibooth.hookimpl
     def state_wait_enter(self, app):
         app.capture_date = None
+        TRACER.start_trace(None)  # Session finished
         if len(app.capture_choices) > 1:
             app.capture_nbr = None
         else:
@@ -61,6 +64,7 @@ class CameraPlugin(object):
         LOGGER.info("Show preview before next capture")
         if not app.capture_date:
             app.capture_date = time.strftime("%Y-%m-%d-%H-%M-%S")
+            TRACER.start_trace(app.capture_date)  # Same ID than the session in the catalog
 
     @pibooth.hookimpl
     def state_preview_do(self, app, events):
@@ -105,7 +109,8 @@ class CameraPlugin(object):
                 app.capture_nbr, effects))
 
         LOGGER.info("Take a capture")
-        app.camera.capture(effect)
+        with TRACER.span('capture', index=self.count, effect=effect):
+            app.camera.capture(effect)
         self.count += 1
 
     # @pibooth.hookimpl
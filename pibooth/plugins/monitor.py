@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+"""Pibooth hooks execution time monitoring.
+"""
+
+import io
+import json
+import time
+import os.path as osp
+import functools
+from pibooth.utils import LOGGER, LatencyHistogram
+
+
+def _timed_generator(generator, record):
+    """Delegate to the given hookwrapper generator, measuring only the time
+    spent inside it (the time spent in the other hook implementations while
+    the generator is suspended is excluded).
+    """
+    elapsed = 0.0
+    start = time.perf_counter()
+    try:
+        try:
+            value = next(generator)
+        except StopIteration as ex:
+            return ex.value
+        finally:
+            elapsed += time.perf_counter() - start
+
+        while True:
+            try:
+                sent = yield value
+            except GeneratorExit:
+                generator.close()
+                raise
+            except BaseException as exc:  # pylint: disable=broad-except
+                start = time.perf_counter()
+                try:
+                    value = generator.throw(exc)
+                except StopIteration as ex:
+                    return ex.value
+                finally:
+                    elapsed += time.perf_counter() - start
+            else:
+                start = time.perf_counter()
+                try:
+                    value = generator.send(sent)
+                except StopIteration as ex:
+                    return ex.value
+                finally:
+                    elapsed += time.perf_counter() - start
+    finally:
+        record(elapsed)
+
+
+class HooksMonitor(object):
+
+    """Measure the wall-clock duration of each hook call and of each plugin
+    implementation of this hook.
+
+    When disabled, nothing is measured and hook implementations are not
+    wrapped (no overhead).
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.hooks = {}  # hook name: LatencyHistogram
+        self.impls = {}  # (hook name, plugin name): LatencyHistogram
+        self._starts = []  # Stack of start times (hooks can be nested)
+
+    def _get_histogram(self, registry, key):
+        histogram = registry.get(key)
+        if histogram is None:
+            histogram = registry[key] = LatencyHistogram()
+        return histogram
+
+    def start(self):
+        """Called before a hook call.
+        """
+        if self.enabled:
+            self._starts.append(time.perf_counter())
+
+    def stop(self, hook_name):
+        """Called after a hook call.
+        """
+        if self.enabled and self._starts:
+            duration = time.perf_counter() - self._starts.pop()
+            self._get_histogram(self.hooks, hook_name).add(duration)
+
+    def wrap(self, hookimpl, hook_name):
+        """Replace the function of the given hook implementation by a proxy
+        measuring its execution time.
+
+        :param hookimpl: hook implementation object from pluggy
+        :type hookimpl: :py:class:`pluggy.HookImpl`
+        :param hook_name: name of the hook implemented
+        :type hook_name: str
+        """
+        if getattr(hookimpl.function, 'monitored', False):
+            return  # Already wrapped
+
+        function = hookimpl.function
+        histogram = self._get_histogram(self.impls, (hook_name, hookimpl.plugin_name))
+
+        if hookimpl.hookwrapper or getattr(hookimpl, 'wrapper', False):
+            @functools.wraps(function)
+            def proxy(*args):
+                return _timed_generator(function(*args), histogram.add)
+        else:
+            @functools.wraps(function)
+            def proxy(*args):
+                start = time.perf_counter()
+                try:
+                    return function(*args)
+                finally:
+                    histogram.add(time.perf_counter() - start)
+
+        proxy.monitored = True
+        hookimpl.function = proxy
+
+    def unwrap(self, hookimpl):
+        """Restore the original function of the given hook implementation.
+
+        :param hookimpl: hook implementation object from pluggy
+        :type hookimpl: :py:class:`pluggy.HookImpl`
+        """
+        if getattr(hookimpl.function, 'monitored', False):
+            hookimpl.function = hookimpl.function.__wrapped__
+
+    def reset(self):
+        """Drop all measures.
+        """
+        self.hooks = {}
+        for histogram in self.impls.values():
+            histogram.reset()  # Keep instances, they are referenced by the proxies
+        self._starts = []
+
+    def get_statistics(self):
+        """Return a dictionary (JSON serializable) with the measures of each
+        hook and of each plugin implementation.
+        """
+        stats = {}
+        for hook_name, histogram in self.hooks.items():
+            stats[hook_name] = histogram.to_dict()
+            stats[hook_name]['plugins'] = {}
+        for (hook_name, plugin_name), histogram in self.impls.items():
+            if histogram.count:
+                stats.setdefault(hook_name, {'plugins': {}})['plugins'][plugin_name] = histogram.to_dict()
+        return stats
+
+    def get_slowest(self, limit=5):
+        """Return the list of the slowest plugin implementations sorted by
+        their maximum execution time.
+
+        :param limit: maximum number of items returned
+        :type limit: int
+
+        :return: list of tuples (hook name, plugin name, histogram)
+        :rtype: list
+        """
+        items = [(hook_name, plugin_name, histogram)
+                 for (hook_name, plugin_name), histogram in self.impls.items() if histogram.count]
+        items.sort(key=lambda item: item[2].max, reverse=True)
+        return items[:limit]
+
+    def get_summary(self, limit=5):
+        """Return a list of human readable lines describing the slowest
+        plugin implementations.
+
+        :param limit: maximum number of lines
+        :type limit: int
+        """
+        lines = []
+        for hook_name, plugin_name, histogram in self.get_slowest(limit):
+            lines.append("{} [{}] n={} mean={:.1f}ms p95={:.1f}ms max={:.1f}ms".format(
+                hook_name, plugin_name, histogram.count, histogram.mean() * 1000,
+                histogram.percentile(95) * 1000, histogram.max * 1000))
+        return lines
+
+    def dump(self, filename=None, limit=5):
+        """Log the slowest plugin implementations and optionally save all
+        measures in a JSON file.
+
+        :param filename: path to the JSON file
+        :type filename: str
+        :param limit: number of plugin implementations logged
+        :type limit: int
+        """
+        lines = self.get_summary(limit)
+        if lines:
+            LOGGER.info("Slowest hooks implementations:\n    %s", "\n    ".join(lines))
+
+        if filename:
+            filename = osp.abspath(osp.expanduser(filename))
+            with io.open(filename, 'w', encoding='utf-8') as fp:
+                json.dump(self.get_statistics(), fp, indent=2, sort_keys=True)
@@ -1,13 +1,16 @@
 # -*- coding: utf-8 -*-
 
-import os
+import time
 import os.path as osp
 import itertools
 from datetime import datetime
 import pibooth
 from pibooth.utils import LOGGER, PoolingTimer
-from pibooth.pictures import get_picture_factory
+from pibooth.pictures import get_picture_factory, get_thumbnail, load_thumbnail, save_thumbnails, move_thumbnails
+from pibooth.pictures.thumbnails import get_manifest_filename
 from pibooth.pictures.pool import PicturesFactoryPool
+from pibooth.memory import reduce_image
+from pibooth.tracing import TRACER
 
 
 class PicturePlugin(object):
@@ -21,13 +24,15 @@ class PicturePlugin(object):
         self._pm = plugin_manager
         self.factory_pool = PicturesFactoryPool()
         self.picture_destroy_timer = PoolingTimer(0)
-        self.second_previous_picture = None
+        self.second_previous_picture_file = None
+        self.animated_frames = []
         self.texts_vars = {}
 
     def _reset_vars(self, app):
         """Destroy final picture (can not be used anymore).
         """
         self.factory_pool.clear()
+        self.animated_frames = []
         app.previous_picture = None
         app.previous_animated = None
         app.previous_picture_file = None
@@ -64,6 +69,25 @@ class PicturePlugin(object):
 
         outcome.force_result(factory)
 
+    @pibooth.hookimpl
+    def pibooth_startup(self, app):
+        def reduce_animation(size):
+            self.animated_frames = [reduce_image(frame, size) for frame in self.animated_frames]
+            if app.previous_animated:
+                app.previous_animated = itertools.cycle(self.animated_frames)
+
+        def reduce_previous(size):
+            filename = app.previous_picture_file
+            if filename and get_thumbnail(filename, size) != filename:
+                # Thumbnail already built, cheaper than resizing the picture
+                app.previous_picture = load_thumbnail(filename, size)
+            else:
+                app.previous_picture = reduce_image(app.previous_picture, size)
+
+        # Released first: the least useful images
+        app.memory.register('animation', lambda: self.animated_frames, reduce_animation)
+        app.memory.register('previous_picture', lambda: app.previous_picture, reduce_previous)
+
     @pibooth.hookimpl
     def pibooth_cleanup(self):
         self.factory_pool.quit()
@@ -73,13 +97,25 @@ class PicturePlugin(object):
         self._reset_vars(app)
 
     @pibooth.hookimpl
-    def state_wait_enter(self, cfg, app):
+    def state_wait_enter(self, cfg, app, win):
+        for session_id in app.storage.pop_evicted():
+            app.catalog.remove_captures(session_id)
+
         animated = self.factory_pool.get()
         if cfg.getfloat('WINDOW', 'wait_picture_delay') == 0:
             # Do it here to avoid a transient display of the picture
             self._reset_vars(app)
         elif animated:
+            self.animated_frames = animated
             app.previous_animated = itertools.cycle(animated)
+            for frame in animated:
+                win.prepare_foreground(frame, win.RIGHT)  # Frames cached at the window size
+
+        if app.previous_picture_file and app.previous_picture:
+            size = win.get_foreground_size(win.RIGHT)
+            if get_thumbnail(app.previous_picture_file, size) != app.previous_picture_file:
+                # Display the thumbnail, the full size picture is not held anymore
+                app.previous_picture = load_thumbnail(app.previous_picture_file, size)
 
         # Reset timeout in case of settings changed
         self.picture_destroy_timer.timeout = max(0, cfg.getfloat('WINDOW', 'wait_picture_delay'))
@@ -93,36 +129,59 @@ class PicturePlugin(object):
 
     @pibooth.hookimpl
     def state_processing_enter(self, app):
-        self.second_previous_picture = app.previous_picture
+        # Only the file is kept, the picture is loaded again if the new one is forgotten
+        if not app.previous_picture:
+            self.second_previous_picture_file = None
+        elif app.previous_picture_file:
+            self.second_previous_picture_file = app.previous_picture_file
+        # else: picture restored after a forget, keep its file
         self._reset_vars(app)
 
     @pibooth.hookimpl
-    def state_processing_do(self, cfg, app):
+    def state_processing_do(self, cfg, app, win):
+        start = time.time()
         idx = app.capture_choices.index(app.capture_nbr)
         self.texts_vars['date'] = datetime.strptime(app.capture_date, "%Y-%m-%d-%H-%M-%S")
         self.texts_vars['count'] = app.count
 
         LOGGER.info("Saving raw captures")
         captures = app.camera.get_captures()
+        captures_files = []
 
         for savedir in cfg.gettuple('GENERAL', 'directory', 'path'):
             rawdir = osp.join(savedir, "raw", app.capture_date)
-            os.makedirs(rawdir)
+            if osp.isdir(rawdir):
+                raise EnvironmentError("Captures directory '{}' already exists".format(rawdir))
 
             for capture in captures:
                 count = captures.index(capture)
-                capture.save(osp.join(rawdir, "pibooth{:03}.jpg".format(count)))
+                captures_files.append(osp.join(rawdir, "pibooth{:03}.jpg".format(count)))
+                app.writer.save_image(capture, captures_files[-1])
 
         LOGGER.info("Creating the final picture")
         default_factory = get_picture_factory(captures, cfg.get('PICTURE', 'orientation'))
         factory = self._pm.hook.pibooth_setup_picture_factory(cfg=cfg,
                                                               opt_index=idx,
                                                               factory=default_factory)
-        app.previous_picture = factory.build()
+        with TRACER.span('compose', captures=len(captures)):
+            app.previous_picture = factory.build()
+
+        # Prepare the renditions for the print and the wait views
+        win.prepare_foreground(app.previous_picture, win.CENTER)
+        win.prepare_foreground(app.previous_picture, win.RIGHT)
 
+        final_files = []
         for savedir in cfg.gettuple('GENERAL', 'directory', 'path'):
             app.previous_picture_file = osp.join(savedir, app.picture_filename)
-            factory.save(app.previous_picture_file)
+            app.writer.save_image(app.previous_picture, app.previous_picture_file)
+            final_files.append(app.previous_picture_file)
+            thumbnails_sizes = cfg.gettuple('PICTURE', 'thumbnails_sizes', int)
+            if thumbnails_sizes:
+                # Keyed by the manifest: waiting for the picture does not wait for its thumbnails
+                app.writer.write(get_manifest_filename(app.previous_picture_file), save_thumbnails,
+                                 app.previous_picture, app.previous_picture_file, thumbnails_sizes)
+
+        app.catalog.add_session(app.capture_date, idx, captures_files, final_files, time.time() - start)
 
         if cfg.getboolean('WINDOW', 'animate') and app.capture_nbr > 1:
             LOGGER.info("Asyncronously generate pictures for animation")
@@ -140,19 +199,27 @@ class PicturePlugin(object):
         app.count.taken += 1  # Do it here because 'print' state can be skipped
 
     @pibooth.hookimpl
-    def state_print_do(self, cfg, app, events):
+    def state_print_do(self, cfg, app, win, events):
         if app.find_capture_event(events) and app.can_forget:
 
             LOGGER.info("Moving the picture in the forget folder")
+            forgotten_files = []
             for savedir in cfg.gettuple('GENERAL', 'directory', 'path'):
                 forgetdir = osp.join(savedir, "forget")
-                if not osp.isdir(forgetdir):
-                    os.makedirs(forgetdir)
-                os.rename(osp.join(savedir, app.picture_filename), osp.join(forgetdir, app.picture_filename))
+                forgotten_files.append(osp.join(forgetdir, app.picture_filename))
+                app.writer.rename(osp.join(savedir, app.picture_filename), forgotten_files[-1])
+                app.writer.write(get_manifest_filename(forgotten_files[-1]), move_thumbnails,
+                                 osp.join(savedir, app.picture_filename), forgotten_files[-1])
+            app.catalog.set_forgotten(app.capture_date, forgotten_files)
 
             self._reset_vars(app)
             app.count.forgotten += 1
-            app.previous_picture = self.second_previous_picture
+            if self.second_previous_picture_file:
+                try:
+                    app.previous_picture = load_thumbnail(self.second_previous_picture_file,
+                                                          win.get_foreground_size(win.RIGHT))
+                except OSError as ex:
+                    LOGGER.warning("Can not load the previous picture '%s': %s", self.second_previous_picture_file, ex)
 
             # Deactivate the print function for the backuped picture
             # as we don't known how many times it has already been printed
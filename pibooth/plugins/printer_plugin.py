@@ -16,9 +16,12 @@ class PrinterPlugin(object):
 
     def print_picture(self, cfg, app):
         LOGGER.info("Send final picture to printer")
-        app.printer.print_file(app.previous_picture_file,
-                               cfg.getint('PRINTER', 'pictures_per_page'))
-        app.count.printed += 1
+        filename = app.previous_picture_file
+        copies = cfg.getint('PRINTER', 'pictures_per_page')
+        # Counted now, but queued to the printer once written (don't block the UI thread)
+        app.printer.reserve_page()
+        app.writer.when_written(filename, lambda: app.printer.print_file(filename, copies, reserved=True))
+        app.catalog.add_print(filename)
         app.count.remaining_duplicates -= 1
 
     @pibooth.hookimpl
@@ -59,9 +62,17 @@ class PrinterPlugin(object):
             if number == 'max':
                 number = cfg.getint('PRINTER', 'max_duplicates')
             for i in range(number):
-                if app.count.remaining_duplicates > 0:
+                if app.count.remaining_duplicates > 0 and app.printer.is_ready():
                     self.print_picture(cfg, app)
 
+    @pibooth.hookimpl
+    def state_print_enter(self, cfg, app):
+        if app.previous_picture_file and app.printer.is_installed():
+            # Build the page while the print view is displayed
+            filename = app.previous_picture_file
+            copies = cfg.getint('PRINTER', 'pictures_per_page')
+            app.writer.when_written(filename, lambda: app.printer.prepare_file(filename, copies))
+
     @pibooth.hookimpl
     def state_print_do(self, cfg, app, events):
         interaction = app.user_interaction(events) == 'TOUCH-MIDDLE-TOP-RIGHT'
@@ -19,11 +19,14 @@ class ViewPlugin(object):
         self.capture_count = 1
         # Seconds to display the failed message
         self.failed_view_timer = PoolingTimer(3)
+        # Seconds to display each animation frame
+        self.animated_timer = PoolingTimer(0)
         self._shutter_speed = None
         self._iso = None
         self._white_balance = None
         self._preview_area = None
-        
+        self._writing_late = False
+
 
     @pibooth.hookimpl
     def state_failsafe_enter(self, win):
@@ -37,24 +40,44 @@ class ViewPlugin(object):
             return 'wait'
 
     @pibooth.hookimpl
-    def state_wait_enter(self, app, win):
+    def state_wait_enter(self, cfg, app, win):
+        self._writing_late = False
+        self.animated_timer.timeout = max(0, cfg.getfloat('WINDOW', 'animate_delay'))
+        self.animated_timer.start()
         win.show_intro(app.previous_picture, app.printer.is_ready())
-        win.set_print_number(len(app.printer.get_all_tasks()), app.count['printed'], app.printer.is_ready())
+        win.set_print_number(app.printer.get_tasks_number(), app.count['printed'], app.printer.is_ready())
         app.camera.stop_preview()
 
     @pibooth.hookimpl
-    def state_wait_do(self, app, win, events):
+    def state_wait_do(self, cfg, app, win, events):
+        if app.writer.is_congested() != self._writing_late:
+            # Files writing is late, show it until the queue is emptied
+            self._writing_late = not self._writing_late
+            if self._writing_late:
+                win.show_work_in_progress()
+            else:
+                win.show_intro(app.previous_picture, app.printer.is_ready())
+
+        if cfg.getboolean('WINDOW', 'animate') and app.previous_animated and not self._writing_late\
+                and self.animated_timer.is_timeout():
+            win.show_animation_frame(next(app.previous_animated))
+            self.animated_timer.start()
+
         if not app.printer.is_installed():
             return None
         
         event = app.find_print_status_event(events)
         if event:
-            win.set_print_number(len(app.printer.get_all_tasks()), app.count['printed'], app.printer.is_ready())
+            win.set_print_number(app.printer.get_tasks_number(), app.count['printed'], app.printer.is_ready())
 
     @pibooth.hookimpl
     def state_wait_validate(self, app, events):
         interaction = app.user_interaction(events)
+        if self._writing_late:
+            return None  # Don't start a new session before files are written
         if interaction == 'TOUCH-CENTER-LEFT' or interaction == 'TOUCH-MIDDLE-TOP-LEFT' or interaction == 'TOUCH-MIDDLE-BOTTOM-LEFT':
+            if not app.storage.has_headroom():
+                return None  # Not enough space to save the captures
             if len(app.capture_choices) > 1:
                 return 'choose'
             else:
@@ -88,6 +111,7 @@ class ViewPlugin(object):
 
     @pibooth.hookimpl
     def state_preview_enter(self, app, win):
+        win.drop_renditions()  # Renditions of the previous session are not shown anymore
         self._preview_area = app.camera.get_preview_area(win)
         win.show_capture(self._preview_area)
         app.camera.preview(self._preview_area)
@@ -156,13 +180,13 @@ class ViewPlugin(object):
     def state_print_enter(self, app, win):
         LOGGER.info("Display the final picture")
         win.show_print(app.previous_picture)
-        # win.set_print_number(len(app.printer.get_all_tasks()), app.count['printed'], app.printer.is_ready())
+        # win.set_print_number(app.printer.get_tasks_number(), app.count['printed'], app.printer.is_ready())
 
     @pibooth.hookimpl
     def state_print_validate(self, app, win, events):
         interaction = app.user_interaction(events)
         if interaction == 'TOUCH-MIDDLE-TOP-RIGHT':
-            win.set_print_number(len(app.printer.get_all_tasks()), app.count['printed'], app.printer.is_ready())
+            win.set_print_number(app.printer.get_tasks_number(), app.count['printed'], app.printer.is_ready())
             return 'wait'
         elif interaction == 'TOUCH-MIDDLE-BOTTOM-RIGHT':
             return 'wait'
\ No newline at end of file
@@ -0,0 +1,583 @@
+# -*- coding: utf-8 -*-
+
+"""Pibooth printer handling.
+"""
+
+import os
+import re
+import time
+import queue
+import hashlib
+import tempfile
+import threading
+import os.path as osp
+
+import pygame
+from PIL import Image
+from pibooth.utils import LOGGER, LatencyHistogram
+from pibooth.tracing import TRACER
+from pibooth.pictures import get_picture_factory
+from pibooth.printer.base import BasePrinterBackend, PrinterEvent
+from pibooth.printer.cupsd import CupsPrinterBackend, get_cups_backend
+from pibooth.printer.simulator import SimulatedPrinterBackend
+
+
+PRINTER_TASKS_UPDATED = pygame.USEREVENT + 2
+
+# Subject of job events: '<printer>-<job id> <job state>'
+JOB_EVENT_SUBJECT = re.compile(r'-(\d+)\s+(\S+)\s*$')
+
+# Words indicating that a job has left the queue
+JOB_TERMINATED_STATES = ('completed', 'canceled', 'cancelled', 'aborted')
+
+PAPER_FORMATS = {
+    '2x6': (2, 6),      # 2x6 pouces - 5x15 cm - 51x152 mm
+    '3,5x5': (3.5, 5),  # 3,5x5 pouces - 9x13 cm - 89x127 mm
+    '4x6': (4, 6),      # 4x6 pouces - 10x15 cm - 101x152 mm
+    '5x7': (5, 7),      # 5x7 pouces - 13x18 cm - 127x178 mm
+    '6x8': (6, 8),      # 6x8 pouces - 15x20 cm - 152x203 mm
+    '6x9': (6, 9),      # 6x9 pouces - 15x23 cm - 152x229 mm
+}
+
+
+def find_backend(name='default'):
+    """Return the printer backend to use for the given printer name: the
+    simulated printer if the name is ``simulator`` else CUPS (None if
+    CUPS is not installed).
+
+    :param name: name of the printer
+    :type name: str
+    """
+    if name and name.lower() == 'simulator':
+        LOGGER.info("Configuring simulated printer ...")
+        return SimulatedPrinterBackend(name)
+    return get_cups_backend()
+
+
+class PrintJob(object):
+
+    """Handle on a file submitted to the printer queue.
+
+    :attr filename: path to the file to print
+    :type filename: str
+    :attr copies: number of copies of the picture on the page
+    :type copies: int
+    :attr status: one of ``PENDING``, ``SENT``, ``FAILED`` or ``CANCELED``
+    :type status: str
+    :attr job_id: CUPS job ID (set when the job is sent)
+    :type job_id: int
+    :attr error: last error raised while sending the job
+    :type error: Exception
+    """
+
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    CANCELED = 'canceled'
+
+    def __init__(self, filename, copies=1):
+        self.filename = filename
+        self.copies = copies
+        self.status = self.PENDING
+        self.job_id = None
+        self.error = None
+        self.attempts = 0
+        self.ganged = False
+        self.submit_time = time.time()
+        self.trace_id = TRACER.trace_id
+        self._done = threading.Event()
+
+    def __str__(self):
+        return "PrintJob({}, copies={}, status={})".format(osp.basename(self.filename), self.copies, self.status)
+
+    def is_done(self):
+        """Return True if the job has been sent, canceled or has definitively
+        failed.
+        """
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the job is sent, canceled or failed. Return False on
+        timeout.
+        """
+        return self._done.wait(timeout)
+
+    def set_done(self, status, job_id=None, error=None):
+        """Called by the printer queue when the job is processed.
+        """
+        self.status = status
+        self.job_id = job_id
+        self.error = error
+        self._done.set()
+
+
+class Printer(object):
+
+    """Submit files to the CUPS server (or any other printer backend). Files
+    are sent from a worker thread (with its own CUPS connection) to not block
+    the UI thread.
+
+    :attr latency: time between file submission and its acceptance by CUPS
+    :type latency: :py:class:`pibooth.utils.LatencyHistogram`
+    :attr paper_format: paper size in inches used for pages with several copies
+    :type paper_format: tuple
+    :attr cache_dir: directory where pages with several copies are cached
+    :type cache_dir: str
+    :attr ganging_delay: how long in seconds a file printed with one copy per
+                         page is held to share its page with the next one
+                         (0 to disable), a page is never shared by two
+                         copies of the same file
+    :type ganging_delay: float
+    """
+
+    max_retries = 3  # Number of retries on failure
+    retry_delay = 1.0  # Delay before first retry (doubled at each retry)
+    max_cached_sheets = 20  # Number of pages with several copies kept on disk
+
+    def __init__(self, name='default', max_pages=-1, options=None, counters=None, backend=None):
+        self._backend = backend or find_backend(name)
+        self._queue = queue.Queue()
+        self._worker = None
+        self._closed = False
+        self._held = None  # Tuple (job, deadline) waiting for a job to share its page
+        self._stats = {'submitted': 0, 'sent': 0, 'failed': 0, 'canceled': 0, 'retries': 0,
+                       'sheets_built': 0, 'sheets_reused': 0, 'ganged': 0}
+        self.ganging_delay = 0
+        self._last_filename = None
+        self.paper_format = PAPER_FORMATS['4x6']
+        self.cache_dir = osp.join(tempfile.gettempdir(), 'pibooth', 'sheets')
+        self._tasks = {}  # Local table of CUPS jobs in queue: {job ID: state}
+        self._traced_jobs = {}  # {job ID: (time sent, [trace IDs])}
+        self._tasks_lock = threading.Lock()
+        self._count_lock = threading.Lock()
+        self._last_event_guid = None
+        self.latency = LatencyHistogram()
+        self.name = None
+        self.max_pages = max_pages
+        self.options = options
+        self.count = counters
+        if not self._backend:
+            LOGGER.warning("No printer found (pycups or pycups-notify not installed)")
+            return  # CUPS is not installed
+
+        printers = self._backend.get_printers()
+        if not name or name.lower() == 'default':
+            self.name = self._backend.get_default()
+            if not self.name and printers:
+                self.name = list(printers.keys())[0]  # Take first one
+        elif name in printers:
+            self.name = name
+
+        if not self.name:
+            if name.lower() == 'default':
+                LOGGER.warning("No printer configured in CUPS (see http://localhost:631)")
+            else:
+                LOGGER.warning("No printer named '%s' in CUPS (see http://localhost:631)", name)
+        else:
+            LOGGER.info("Connected to printer '%s'", self.name)
+            self._subscribe()
+            self._sync_tasks()
+
+        if self.options and not isinstance(self.options, dict):
+            LOGGER.warning("Invalid printer options '%s', dict is expected", self.options)
+            self.options = {}
+        elif not self.options:
+            self.options = {}
+
+    def _subscribe(self):
+        """Subscribe to the printer events (if not already done).
+        """
+        if self._backend and not self._backend.is_subscribed(self._on_event):
+            self._backend.subscribe(self._on_event)
+
+    def _sync_tasks(self):
+        """Rebuild the local table of jobs from the CUPS server (IPP request).
+        """
+        try:
+            jobs = self._backend.get_jobs(["job-id", "job-state"])
+        except Exception as ex:  # pylint: disable=broad-except
+            LOGGER.warning("Can not get the printer jobs: %s", ex)
+            return
+        with self._tasks_lock:
+            self._tasks = dict((job_id, attrs.get('job-state')) for job_id, attrs in jobs.items())
+            for job_id in set(self._traced_jobs) - set(self._tasks):
+                del self._traced_jobs[job_id]  # Completion event missed
+        LOGGER.debug("Printer jobs table synchronized (%s jobs in queue)", len(self._tasks))
+
+    def _request_sync_tasks(self):
+        """Ask the worker thread to synchronize the local table of jobs.
+        """
+        if not self._closed:
+            self._start_worker()
+            self._queue.put(self._sync_tasks)
+
+    def _update_tasks(self, evt):
+        """Update the local table of jobs from a CUPS event. Return False if
+        the event can not be interpreted or if previous events were missed.
+        """
+        consistent = True
+        guid = getattr(evt, 'guid', None)
+        if guid is not None:
+            if self._last_event_guid is not None and guid > self._last_event_guid + 1:
+                consistent = False  # Some events were lost
+            self._last_event_guid = guid
+
+        title = '{} {}'.format(evt.title, getattr(evt, 'description', '')).lower()
+        match = JOB_EVENT_SUBJECT.search(evt.title)
+        if match:
+            job_id = int(match.group(1))
+            with self._tasks_lock:
+                if any(state in title for state in JOB_TERMINATED_STATES):
+                    self._tasks.pop(job_id, None)
+                    start, trace_ids = self._traced_jobs.pop(job_id, (None, []))
+                    for trace_id in trace_ids:
+                        TRACER.add_span('print_complete', start, time.time(), trace_id,
+                                        job_id=job_id, state=match.group(2))
+                else:
+                    self._tasks[job_id] = match.group(2)
+        elif 'job' in title:
+            consistent = False  # Job event without job ID
+        return consistent
+
+    def _on_event(self, evt):
+        """
+        Call for each new printer event.
+        """
+        LOGGER.info(evt.title)
+        if not self._update_tasks(evt):
+            LOGGER.debug("Printer events gap detected, synchronize jobs table")
+            self._request_sync_tasks()
+        if pygame.display.get_init():  # Not initialized when printing headless
+            pygame.event.post(pygame.event.Event(PRINTER_TASKS_UPDATED, evt=evt))
+
+    def is_installed(self):
+        """Return True if the CUPS server is available for printing.
+        """
+        return self._backend is not None and self.name is not None
+
+    def is_ready(self):
+        """Return False if paper/ink counter is reached or printing is disabled.
+        """
+        if not self.is_installed():
+            return False
+        if self.max_pages < 0 or self.count is None:  # No limit
+            return True
+        return self.count.printed < self.max_pages  # Including the pages not yet sent
+
+    def _pop_held(self):
+        """Return the job waiting to share its page (None if no job is held)
+        and release it.
+        """
+        with self._tasks_lock:
+            held, self._held = self._held, None
+        return held[0] if held else None
+
+    def _run(self):
+        """Worker thread sending the queued jobs to the CUPS server.
+        """
+        while True:
+            held = self._held
+            try:
+                if held:
+                    job = self._queue.get(timeout=max(0, held[1] - time.time()))
+                else:
+                    job = self._queue.get()
+            except queue.Empty:
+                held = self._pop_held()
+                if held:  # Not canceled meanwhile
+                    LOGGER.debug("No picture to share the page with '%s', print it alone", held.filename)
+                    self._submit([held])
+                continue
+
+            if job is None:
+                held = self._pop_held()
+                if held:
+                    self._submit([held])
+                break  # Quit requested
+
+            if callable(job):
+                try:
+                    job()
+                except Exception as ex:  # pylint: disable=broad-except
+                    self._backend.reconnect()
+                    LOGGER.warning("Printer task failed: %s", ex)
+            else:
+                held = self._pop_held()
+                if held and job.ganged and job.filename != held.filename:
+                    self._submit([held, job])
+                    continue
+                if held:  # Never share a page with a copy of the same file
+                    self._submit([held])
+                if job.ganged:
+                    with self._tasks_lock:
+                        self._held = (job, time.time() + self.ganging_delay)
+                else:
+                    self._submit([job])
+
+    def _submit(self, jobs):
+        """Send the given jobs (on the same page) to the CUPS server, retry on
+        failure.
+        """
+        attempts = 0
+        names = "', '".join(job.filename for job in jobs)
+        while True:
+            attempts += 1
+            for job in jobs:
+                job.attempts += 1
+            try:
+                job_id = self._send(jobs)
+            except Exception as ex:  # pylint: disable=broad-except
+                self._backend.reconnect()  # Reconnect on next attempt
+                if attempts <= self.max_retries:
+                    delay = self.retry_delay * 2 ** (attempts - 1)
+                    LOGGER.warning("Failed to send '%s' to the printer (%s), retry in %ss", names, ex, delay)
+                    self._stats['retries'] += 1
+                    time.sleep(delay)
+                    continue
+                LOGGER.error("Failed to send '%s' to the printer: %s", names, ex)
+                self._count_pages(-len(jobs))  # Release the reserved pages
+                for job in jobs:
+                    self._stats['failed'] += 1
+                    job.set_done(PrintJob.FAILED, error=ex)
+            else:
+                with self._tasks_lock:
+                    self._tasks.setdefault(job_id, 'pending')
+                    if TRACER.enabled and any(job.trace_id for job in jobs):
+                        self._traced_jobs[job_id] = (time.time(), [job.trace_id for job in jobs if job.trace_id])
+                if len(jobs) > 1:
+                    self._stats['ganged'] += len(jobs)
+                    self._count_pages(1 - len(jobs))  # One page reserved per job
+                for job in jobs:
+                    self.latency.add(time.time() - job.submit_time)
+                    TRACER.add_span('print_submit', job.submit_time, time.time(), job.trace_id,
+                                    job_id=job_id, attempts=job.attempts)
+                    self._stats['sent'] += 1
+                    job.set_done(PrintJob.SENT, job_id)
+                LOGGER.debug("File(s) '%s' sent to the printer with options %s (job %s)",
+                             names, self.options, job_id)
+            return
+
+    def _send(self, jobs):
+        """Send the file(s) of the given jobs to the CUPS server and return the
+        CUPS job ID.
+        """
+        if len(jobs) > 1:
+            title = " + ".join(osp.basename(job.filename) for job in jobs)
+            if not osp.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            with tempfile.NamedTemporaryFile(suffix='.jpg', dir=self.cache_dir) as fp:
+                factory = get_picture_factory([Image.open(job.filename) for job in jobs],
+                                              paper_format=self.paper_format)
+                # Same parameters than for a page with several copies
+                factory.set_margin(2)
+                factory.save(fp.name)
+                return self._backend.print_file(self.name, fp.name, title, self.options)
+
+        job = jobs[0]
+        title = osp.basename(job.filename)
+        if job.copies > 1:
+            return self._backend.print_file(self.name, self._build_sheet(job.filename, job.copies),
+                                            title, self.options)
+        return self._backend.print_file(self.name, job.filename, title, self.options)
+
+    def _get_sheet_filename(self, filename, copies):
+        """Return the path to the cached page with several copies of the given
+        file. The path depends on the file modification time, thus a modified
+        file gives a new path.
+        """
+        stat = os.stat(filename)
+        key = "{}|{}|{}|{}|{}".format(osp.abspath(filename), stat.st_mtime_ns, stat.st_size,
+                                      copies, self.paper_format)
+        return osp.join(self.cache_dir, "{}_{}up_{}.jpg".format(osp.splitext(osp.basename(filename))[0], copies,
+                                                             hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]))
+
+    def _clean_sheets(self, filename, copies):
+        """Remove the outdated pages built from the given file and the oldest
+        pages if the cache is full.
+        """
+        prefix = "{}_{}up_".format(osp.splitext(osp.basename(filename))[0], copies)
+        sheets = []
+        for name in os.listdir(self.cache_dir):
+            path = osp.join(self.cache_dir, name)
+            if name.startswith(prefix):
+                os.remove(path)  # Previous version of the file
+            elif name.endswith('.jpg'):
+                sheets.append(path)
+        sheets.sort(key=osp.getmtime)
+        for path in sheets[:max(0, len(sheets) - self.max_cached_sheets + 1)]:
+            os.remove(path)
+
+    def _build_sheet(self, filename, copies):
+        """Return the path to the page with several copies of the given file,
+        build it if not already in cache.
+        """
+        sheet = self._get_sheet_filename(filename, copies)
+        if osp.isfile(sheet):
+            self._stats['sheets_reused'] += 1
+            return sheet
+
+        if not osp.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        self._clean_sheets(filename, copies)
+
+        picture = Image.open(filename)
+        factory = get_picture_factory((picture,) * copies, paper_format=self.paper_format)
+        # Don't call setup factory hook here, as the selected parameters
+        # are the one necessary to render several pictures on same page.
+        factory.set_margin(2)
+        tmp_sheet = sheet + '.tmp.jpg'
+        factory.save(tmp_sheet)
+        os.replace(tmp_sheet, sheet)  # Never use a partially written page
+        self._stats['sheets_built'] += 1
+        return sheet
+
+    def prepare_file(self, filename, copies=1):
+        """Build in background the page that will be sent to the printer
+        for the given file (does nothing if only one copy per page).
+
+        :param filename: path to the file to print
+        :type filename: str
+        :param copies: number of copies of the picture on the page
+        :type copies: int
+        """
+        if copies > 1 and self.name and not self._closed and osp.isfile(filename):
+            self._start_worker()
+            self._queue.put(lambda: self._build_sheet(filename, copies))
+
+    def _count_pages(self, number):
+        """Add the given number of pages to the printed counter (may be called
+        from several threads).
+        """
+        if self.count is not None and number:
+            with self._count_lock:
+                self.count.printed += number
+
+    def reserve_page(self):
+        """Count a page to be printed before queuing its file, thus the pages
+        limit is checked against the pages not yet sent. The page is released
+        if the file is finally not printed (or shared with another file).
+        """
+        self._count_pages(1)
+
+    def print_file(self, filename, copies=1, reserved=False):
+        """Queue a file to be sent to the CUPS server. The method returns
+        immediately. The page is counted as printed when the file is queued.
+
+        :param filename: path to the file to print
+        :type filename: str
+        :param copies: number of copies of the picture on the page
+        :type copies: int
+        :param reserved: True if the page is already counted by :py:meth:`reserve_page`
+        :type reserved: bool
+
+        :return: handle on the submitted job (canceled if the printer is quit)
+        :rtype: :py:class:`PrintJob`
+        """
+        if self._closed:
+            if reserved:
+                self._count_pages(-1)
+            LOGGER.warning("Printer stopped, file '%s' not printed", filename)
+            job = PrintJob(filename, copies)
+            job.set_done(PrintJob.CANCELED)
+            return job
+        if not self.name or not osp.isfile(filename):
+            if reserved:
+                self._count_pages(-1)
+            if not self.name:
+                raise EnvironmentError("No printer found (check config file or CUPS config)")
+            raise IOError("No such file or directory: {}".format(filename))
+        if not reserved:
+            self.reserve_page()
+        self._subscribe()
+        self._start_worker()
+
+        job = PrintJob(filename, copies)
+        # A copy of the previous file is a requested full page
+        job.ganged = self.ganging_delay > 0 and copies == 1 and filename != self._last_filename
+        self._last_filename = filename
+        self._stats['submitted'] += 1
+        self._queue.put(job)
+        LOGGER.debug("File '%s' queued for printing (%s jobs in queue)", filename, self._queue.qsize())
+        return job
+
+    def _start_worker(self):
+        """Start the worker thread (if not already started).
+        """
+        with self._tasks_lock:  # Jobs can be queued from several threads
+            if not self._worker and not self._closed:
+                self._worker = threading.Thread(target=self._run, name='PrinterQueue', daemon=True)
+                self._worker.start()
+
+    def get_queue_depth(self):
+        """Return the number of jobs waiting to be sent to the CUPS server.
+        """
+        return self._queue.qsize()
+
+    def get_statistics(self):
+        """Return a dictionary (JSON serializable) with the queue metrics.
+        """
+        stats = dict(self._stats, depth=self.get_queue_depth())
+        stats['latency'] = self.latency.to_dict()
+        return stats
+
+    def cancel_all_tasks(self):
+        """Cancel all tasks: the jobs not yet sent are removed from the local
+        queue, then the jobs in the CUPS queue are canceled.
+        """
+        if not self.name:
+            raise EnvironmentError("No printer found (check config file or CUPS config)")
+        canceled = []
+        held = self._pop_held()
+        if held:
+            canceled.append(held)
+        others = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, PrintJob):
+                canceled.append(item)
+            else:
+                others.append(item)  # Keep the other tasks and the quit request
+        for item in others:
+            self._queue.put(item)
+
+        self._count_pages(-len(canceled))  # Release the reserved pages
+        for job in canceled:
+            self._stats['canceled'] += 1
+            job.set_done(PrintJob.CANCELED)
+        if canceled:
+            LOGGER.info("%s print job(s) canceled before being sent to the printer", len(canceled))
+        self._backend.cancel_all_jobs(self.name)
+
+    def get_tasks_number(self):
+        """Return the number of tasks in the CUPS queue. The value comes from
+        a local table updated by the CUPS events (no request to the server).
+        """
+        return len(self._tasks)
+
+    def get_all_tasks(self):
+        """Return a dict (indexed by job ID) of dicts representing all tasks
+        in the queue.
+
+        .. note:: this method requests the CUPS server, prefer
+                  :py:meth:`get_tasks_number` to only get the number of tasks.
+        """
+        if not self.name:
+            return {}  # No printer found
+        return self._backend.get_jobs(["job-id", "job-name", "job-uri", "job-state"])
+
+    def quit(self):
+        """Do cleanup actions. The files given after are not printed.
+        """
+        with self._tasks_lock:
+            self._closed = True
+        if self._worker:
+            self._queue.put(None)
+            self._worker.join(5)
+            if self._worker.is_alive():
+                LOGGER.warning("Printer queue stopped with %s pending jobs", self.get_queue_depth())
+            self._worker = None
+        if self._backend:
+            self._backend.quit()
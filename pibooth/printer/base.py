@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+
+class PrinterEvent(object):
+
+    """Event emitted by a printer backend. The attributes are the same than
+    the ones of the events generated by ``cups_notify``.
+
+    :attr guid: sequence number of the event (increased by one for each event)
+    :type guid: int
+    :attr title: subject of the event: '<printer>-<job id> <job state>'
+    :type title: str
+    :attr description: human readable description
+    :type description: str
+    :attr printer: name of the printer
+    :type printer: str
+    """
+
+    def __init__(self, guid, title, description='', printer=None):
+        self.guid = guid
+        self.title = title
+        self.description = description
+        self.printer = printer
+        self.timestamp = time.time()
+
+    def __str__(self):
+        return "PrinterEvent({}, {})".format(self.guid, self.title)
+
+
+class BasePrinterBackend(object):
+
+    """Interface to the printing system used by :py:class:`pibooth.printer.Printer`.
+
+    Methods may be called from several threads (UI thread and printer queue
+    worker), each backend is responsible for its own thread safety.
+    """
+
+    def get_default(self):
+        """Return the name of the default printer or None.
+        """
+        return None
+
+    def get_printers(self):
+        """Return a dict of available printers indexed by name.
+        """
+        raise NotImplementedError
+
+    def print_file(self, printer, filename, title, options):
+        """Send a file to the printer and return the job ID.
+
+        :param printer: name of the printer
+        :type printer: str
+        :param filename: path to the file to print
+        :type filename: str
+        :param title: job title
+        :type title: str
+        :param options: printer options
+        :type options: dict
+        """
+        raise NotImplementedError
+
+    def get_jobs(self, attributes=None):
+        """Return a dict (indexed by job ID) of dicts representing the jobs
+        not yet completed.
+
+        :param attributes: list of requested job attributes
+        :type attributes: list
+        """
+        raise NotImplementedError
+
+    def cancel_all_jobs(self, printer):
+        """Cancel all the jobs of the given printer.
+        """
+        raise NotImplementedError
+
+    def subscribe(self, callback):
+        """Call the given callback (with a :py:class:`PrinterEvent` like object
+        as parameter) for each job or printer event.
+        """
+        raise NotImplementedError
+
+    def is_subscribed(self, callback):
+        """Return True if the callback is already subscribed.
+        """
+        raise NotImplementedError
+
+    def unsubscribe_all(self):
+        """Stop calling the subscribed callbacks.
+        """
+        raise NotImplementedError
+
+    def reconnect(self):
+        """Called after a failure: the connection of the calling thread
+        shall be renewed on next request.
+        """
+        pass
+
+    def quit(self):
+        """Do cleanup actions.
+        """
+        self.unsubscribe_all()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+try:
+    import cups
+    from cups_notify import Subscriber, event
+except ImportError:
+    cups = None  # CUPS is optional
+
+import threading
+from pibooth.printer.base import BasePrinterBackend
+
+
+def get_cups_backend():
+    """Return the CUPS backend if pycups and pycups-notify are installed
+    else return None.
+    """
+    if not cups:
+        return None  # CUPS is not installed
+    return CupsPrinterBackend()
+
+
+class CupsPrinterBackend(BasePrinterBackend):
+
+    """Printing through a CUPS server. Each thread uses its own connection
+    to the server (a CUPS connection can not be shared between threads).
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._notifier = Subscriber(self._get_connection())
+
+    def _get_connection(self):
+        """Return the CUPS connection of the calling thread.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = cups.Connection()
+        return conn
+
+    def get_default(self):
+        return self._get_connection().getDefault()
+
+    def get_printers(self):
+        return self._get_connection().getPrinters()
+
+    def print_file(self, printer, filename, title, options):
+        return self._get_connection().printFile(printer, filename, title, options)
+
+    def get_jobs(self, attributes=None):
+        return self._get_connection().getJobs(my_jobs=True,
+                                              requested_attributes=attributes or ["job-id", "job-state"])
+
+    def cancel_all_jobs(self, printer):
+        self._get_connection().cancelAllJobs(printer)
+
+    def subscribe(self, callback):
+        self._notifier.subscribe(callback, [event.CUPS_EVT_JOB_COMPLETED,
+                                            event.CUPS_EVT_JOB_CREATED,
+                                            event.CUPS_EVT_JOB_STOPPED,
+                                            event.CUPS_EVT_PRINTER_STATE_CHANGED,
+                                            event.CUPS_EVT_PRINTER_STOPPED])
+
+    def is_subscribed(self, callback):
+        return self._notifier.is_subscribed(callback)
+
+    def unsubscribe_all(self):
+        self._notifier.unsubscribe_all()
+
+    def reconnect(self):
+        self._local.conn = None
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+
+import time
+import random
+import threading
+from collections import OrderedDict
+from pibooth.utils import LOGGER
+from pibooth.printer.base import BasePrinterBackend, PrinterEvent
+
+
+# IPP job states as returned by CUPS
+IPP_JOB_PENDING = 3
+IPP_JOB_PROCESSING = 5
+
+# IPP printer states as returned by CUPS
+IPP_PRINTER_IDLE = 3
+IPP_PRINTER_STOPPED = 5
+
+
+class SimulatedPrinterBackend(BasePrinterBackend):
+
+    """Printer simulated in memory, no CUPS server required. Jobs are printed
+    one after the other by a thread, with the same events than the ones
+    emitted by CUPS.
+
+    When paper or ink is exhausted, the printer is stopped (the current job
+    stays in the queue) until :py:meth:`refill` is called.
+
+    :attr page_time: time in seconds to print one page
+    :type page_time: float
+    :attr paper: number of remaining sheets of paper (-1 for infinite)
+    :type paper: int
+    :attr ink: number of pages which can be printed with the remaining ink (-1 for infinite)
+    :type ink: int
+    :attr failure_rate: probability (between 0 and 1) that a job is aborted
+    :type failure_rate: float
+    :attr submit_failures: number of next submissions which will raise an error
+    :type submit_failures: int
+    """
+
+    def __init__(self, name='simulator', page_time=1.0, paper=-1, ink=-1, failure_rate=0.0, seed=None):
+        self.name = name
+        self.page_time = page_time
+        self.paper = paper
+        self.ink = ink
+        self.failure_rate = failure_rate
+        self.submit_failures = 0
+        self._random = random.Random(seed)
+        self._jobs = OrderedDict()  # {job ID: job attributes}
+        self._callbacks = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self._quit = False
+        self._last_job_id = 0
+        self._last_guid = 0
+        self._stats = {'submitted': 0, 'completed': 0, 'aborted': 0, 'canceled': 0, 'pages': 0}
+        self._start_time = None
+        self._end_time = None
+
+    def _emit(self, job_id, state, description):
+        """Call the subscribed callbacks (outside of the lock).
+        """
+        with self._cond:
+            self._last_guid += 1
+            evt = PrinterEvent(self._last_guid, "{}-{} {}".format(self.name, job_id, state),
+                               description, self.name)
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback(evt)
+            except Exception as ex:  # pylint: disable=broad-except
+                LOGGER.warning("Simulated printer event callback failed: %s", ex)
+
+    def _next_job(self):
+        """Wait for a job to print. Return None if quit is requested.
+        """
+        with self._cond:
+            while not self._quit:
+                if not self._stopped:
+                    for job_id, job in self._jobs.items():
+                        if job['job-state'] == IPP_JOB_PENDING:
+                            job['job-state'] = IPP_JOB_PROCESSING
+                            return job_id, job
+                self._cond.wait()
+        return None
+
+    def _run(self):
+        """Thread printing the jobs.
+        """
+        while True:
+            item = self._next_job()
+            if item is None:
+                break
+            job_id, job = item
+            status = None
+            while job['pages'] > 0:
+                with self._cond:
+                    if job_id not in self._jobs:
+                        break  # Canceled
+                    if self.paper == 0 or self.ink == 0:
+                        job['job-state'] = IPP_JOB_PENDING  # Resumed when refilled
+                        self._stopped = True
+                        status = 'stopped'
+                        reason = "Out of paper" if self.paper == 0 else "Out of ink"
+                        self._cond.notify_all()
+                        break
+                time.sleep(self.page_time)
+                with self._cond:
+                    if self.paper > 0:
+                        self.paper -= 1
+                    if self.ink > 0:
+                        self.ink -= 1
+                    self._stats['pages'] += 1
+                    job['pages'] -= 1
+                if self.failure_rate and self._random.random() < self.failure_rate:
+                    status = 'aborted'
+                    break
+
+            if status == 'stopped':
+                self._emit(job_id, 'stopped', reason)
+                continue
+
+            with self._cond:
+                if self._jobs.pop(job_id, None) is None:
+                    continue  # Canceled
+                if status is None:
+                    status = 'completed'
+                self._stats[status] += 1
+                self._end_time = time.time()
+                self._cond.notify_all()
+            self._emit(job_id, status, "Job {}".format(status))
+
+    def get_default(self):
+        return self.name
+
+    def get_printers(self):
+        return {self.name: {'printer-info': 'Simulated printer',
+                            'printer-state': IPP_PRINTER_STOPPED if self._stopped else IPP_PRINTER_IDLE}}
+
+    def print_file(self, printer, filename, title, options):
+        if printer != self.name:
+            raise IOError("No printer named '{}'".format(printer))
+        with self._cond:
+            if self.submit_failures > 0:
+                self.submit_failures -= 1
+                raise IOError("Simulated submission failure")
+            self._last_job_id += 1
+            job_id = self._last_job_id
+            copies = int((options or {}).get('copies', 1))
+            self._jobs[job_id] = {'job-id': job_id, 'job-name': title, 'job-state': IPP_JOB_PENDING,
+                                  'job-uri': 'ipp://localhost/jobs/{}'.format(job_id),
+                                  'document': filename, 'pages': copies}
+            self._stats['submitted'] += 1
+            if self._start_time is None:
+                self._start_time = time.time()
+            if not self._thread:
+                self._thread = threading.Thread(target=self._run, name='PrinterSimulator', daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+        self._emit(job_id, 'pending', "Job created")
+        return job_id
+
+    def get_jobs(self, attributes=None):
+        with self._cond:
+            if not attributes:
+                return dict((job_id, dict(job)) for job_id, job in self._jobs.items())
+            return dict((job_id, dict((key, job[key]) for key in attributes if key in job))
+                        for job_id, job in self._jobs.items())
+
+    def cancel_all_jobs(self, printer):
+        with self._cond:
+            canceled = list(self._jobs)
+            self._jobs.clear()
+            self._stats['canceled'] += len(canceled)
+            self._cond.notify_all()
+        for job_id in canceled:
+            self._emit(job_id, 'canceled', "Job canceled")
+
+    def subscribe(self, callback):
+        with self._cond:
+            if callback not in self._callbacks:
+                self._callbacks.append(callback)
+
+    def is_subscribed(self, callback):
+        return callback in self._callbacks
+
+    def unsubscribe_all(self):
+        with self._cond:
+            self._callbacks = []
+
+    def refill(self, paper=-1, ink=-1):
+        """Set the paper and ink levels and restart the printer.
+
+        :param paper: number of sheets of paper (-1 for infinite)
+        :type paper: int
+        :param ink: number of pages which can be printed (-1 for infinite)
+        :type ink: int
+        """
+        with self._cond:
+            self.paper = paper
+            self.ink = ink
+            self._stopped = False
+            self._cond.notify_all()
+
+    def wait_idle(self, timeout=None):
+        """Block until all jobs are printed or the printer is stopped.
+        Return False on timeout.
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._jobs or self._stopped, timeout)
+
+    def get_statistics(self):
+        """Return a dictionary (JSON serializable) with the number of jobs
+        and pages printed and the throughput in pages per minute.
+        """
+        with self._cond:
+            stats = dict(self._stats, queued=len(self._jobs), stopped=self._stopped)
+            elapsed = 0.0
+            if self._start_time is not None and self._end_time is not None:
+                elapsed = self._end_time - self._start_time
+            stats['elapsed'] = elapsed
+            stats['pages_per_minute'] = stats['pages'] * 60.0 / elapsed if elapsed else 0.0
+        return stats
+
+    def quit(self):
+        super(SimulatedPrinterBackend, self).quit()
+        with self._cond:
+            self._quit = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(5)
+            self._thread = None
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+"""Pibooth startup profiler.
+
+This module shall only depend on the standard library: it is started from
+the package ``__init__`` (see ``--profile-startup`` option) to measure the
+imports of all the other modules.
+"""
+
+import sys
+import time
+import builtins
+import threading
+import importlib.util
+
+
+class StartupProfiler(object):
+
+    """Measure the time spent to import each module and to run each
+    initialization phase of the application.
+
+    The imports are measured by wrapping :py:func:`builtins.__import__`, for
+    each module are recorded:
+
+    - the cumulative time: time spent to import the module and its
+      dependencies
+    - the self time: cumulative time without the time spent to import
+      the dependencies not yet loaded
+
+    :attr imports: dictionary {module name: (cumulative, self)}
+    :type imports: dict
+    :attr phases: list of (phase name, timestamp) in the order of the marks
+    :type phases: list
+    """
+
+    def __init__(self):
+        self.imports = {}
+        self.phases = []
+        self._origin = None
+        self._reported = False
+        self._import = None
+        self._local = threading.local()
+
+    @property
+    def enabled(self):
+        return self._origin is not None and not self._reported
+
+    def start(self):
+        """Start measuring the imports.
+        """
+        if self._import:
+            return
+        self._origin = time.time()
+        self._import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def stop(self):
+        """Stop measuring the imports (recorded timings are kept).
+        """
+        if self._import:
+            builtins.__import__ = self._import
+            self._import = None
+
+    def _get_module_name(self, name, globals, fromlist, level):
+        """Return the name of the module (or sub-module for 'from' imports)
+        which is not yet loaded, None if all are already loaded.
+        """
+        if level:
+            try:
+                name = importlib.util.resolve_name('.' * level + name, (globals or {}).get('__package__') or '')
+            except (ImportError, ValueError):
+                return name
+        module = sys.modules.get(name)
+        if module is None:
+            return name
+        for item in fromlist or ():
+            if item != '*' and not hasattr(module, item):
+                return name + '.' + item
+        return None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        modname = self._get_module_name(name, globals, fromlist, level)
+        if not modname:
+            return self._import(name, globals, locals, fromlist, level)
+
+        stack = self._local.__dict__.setdefault('stack', [])
+        stack.append(0.0)
+        start = time.time()
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.time() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            if modname not in self.imports:
+                self.imports[modname] = (elapsed, elapsed - children)
+
+    def mark(self, phase):
+        """Record the end of an initialization phase (ignored if the profiler
+        is not started).
+
+        :param phase: name of the phase
+        :type phase: str
+        """
+        if self.enabled:
+            self.phases.append((phase, time.time()))
+
+    def get_phases(self):
+        """Return the list of (phase name, duration) in the order of the marks.
+        """
+        durations = []
+        previous = self._origin
+        for phase, timestamp in self.phases:
+            durations.append((phase, timestamp - previous))
+            previous = timestamp
+        return durations
+
+    def report(self, top=15):
+        """Stop the profiler and log the slowest imports and the duration of
+        each initialization phase. Next marks are ignored.
+
+        :param top: number of imports to report
+        :type top: int
+        """
+        self.stop()
+        if not self.enabled:
+            return
+        from pibooth.utils import LOGGER
+
+        total = (self.phases[-1][1] if self.phases else time.time()) - self._origin
+        LOGGER.info("Startup in %.3fs (%s modules imported)", total, len(self.imports))
+        for phase, duration in self.get_phases():
+            LOGGER.info("  phase %-20s %8.1fms", phase, duration * 1000)
+        LOGGER.info("Slowest imports (cumulative / self):")
+        for modname, (cumulative, own) in sorted(self.imports.items(), key=lambda item: item[1][1],
+                                                 reverse=True)[:top]:
+            LOGGER.info("  %-45s %8.1fms %8.1fms", modname, cumulative * 1000, own * 1000)
+        self._reported = True
+
+
+PROFILER = StartupProfiler()
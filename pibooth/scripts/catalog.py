@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+"""Script to display/rebuild the sessions catalog.
+"""
+
+import sys
+import json
+from pibooth.catalog import SessionCatalog
+from pibooth.utils import configure_logging
+from pibooth.config import PiConfigParser
+from pibooth.plugins import create_plugin_manager
+
+
+def main():
+    """Application entry point.
+    """
+    configure_logging()
+    plugin_manager = create_plugin_manager()
+    config = PiConfigParser("~/.config/pibooth/pibooth.cfg", plugin_manager)
+
+    catalog = SessionCatalog(config.join_path("sessions.db"), threaded=False)
+
+    if '--rebuild' in sys.argv:
+        catalog.rebuild(config.gettuple('GENERAL', 'directory', 'path'),
+                        config.gettuple('PICTURE', 'captures', int, 2))
+
+    if '--json' in sys.argv:
+        print(json.dumps(catalog.get_sessions()))
+    else:
+        print("\nListing sessions catalog:\n")
+        for name, value in catalog.get_statistics().items():
+            print(" -> {:.<25} : {:>4}".format(name.replace('_', ' ').capitalize(),
+                                                 value if value is not None else '-'))
+        print()
+    catalog.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -33,6 +33,7 @@ def main():
                     setattr(counters, name, int(value))
         except KeyboardInterrupt:
             pass
+        counters.flush()
         print()
     else:
         print("\nListing current counters:\n")
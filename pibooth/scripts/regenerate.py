@@ -4,7 +4,14 @@
 """
 
 import os
+import io
+import json
+import time
+import hashlib
+import tempfile
 import argparse
+import collections
+import multiprocessing
 from os import path as osp
 from datetime import datetime
 
@@ -13,77 +20,252 @@ from PIL import Image
 from pibooth.utils import LOGGER, configure_logging
 from pibooth.plugins import create_plugin_manager
 from pibooth.config import PiConfigParser
-from pibooth.pictures import get_picture_factory
 from pibooth.counters import Counters
 
 
+MANIFEST_SAVE_INTERVAL = 5.0  # Seconds between two saves of the manifest
+
+
 def get_captures(images_folder):
-    """Get a list of images from the folder given in input.
+    """Get a list of images from the folder given in input (sorted by
+    filename). The images are decoded and their files closed.
     """
-    captures_paths = os.listdir(images_folder)
+    captures_paths = sorted(os.listdir(images_folder))
     captures = []
     for capture_path in captures_paths:
         try:
             image = Image.open(osp.join(images_folder, capture_path))
+            image.load()  # Read data and close the file
             captures.append(image)
         except OSError:
             LOGGER.info("File %s doesn't seem to be an image", capture_path)
     return captures
 
 
-def regenerate_all_images(plugin_manager, config, basepath):
+def get_inputs_hash(config):
+    """Return a hash of the inputs used to build the final pictures other
+    than the captures: options of the picture section, plugins and version
+    of the background/overlay files.
+    """
+    sha = hashlib.sha1()
+    for section, option in (('GENERAL', 'plugins'), ('GENERAL', 'plugins_disabled')):
+        sha.update(repr(config.get(section, option)).encode('utf-8'))
+    for option, value in sorted(config.items('PICTURE')):
+        sha.update(repr((option, value)).encode('utf-8'))
+    paths = config.gettuple('PICTURE', 'backgrounds', ('color', 'path'), 2) +\
+        config.gettuple('PICTURE', 'overlays', 'path', 2)
+    for path in paths:
+        if isinstance(path, str) and osp.isfile(path):
+            stat = os.stat(path)
+            sha.update(repr((path, stat.st_mtime_ns, stat.st_size)).encode('utf-8'))
+    return sha.hexdigest()
+
+
+def is_up_to_date(captures_folder_path, picture_file, inputs_hash, manifest):
+    """Return True if the final picture is newer than the captures and was
+    built with the same inputs.
+    """
+    if manifest.get(osp.basename(captures_folder_path)) != inputs_hash:
+        return False
+    if not osp.isfile(picture_file):
+        return False
+    picture_mtime = osp.getmtime(picture_file)
+    for name in os.listdir(captures_folder_path):
+        if osp.getmtime(osp.join(captures_folder_path, name)) >= picture_mtime:
+            return False
+    return osp.getmtime(captures_folder_path) < picture_mtime
+
+
+def save_manifest(manifest_file, manifest):
+    """Save the manifest in a temporary file, then atomically replace the
+    manifest file by it (an interrupted run never leaves a truncated file).
+    """
+    fd, tmp_filename = tempfile.mkstemp(prefix='.', suffix='.tmp', dir=osp.dirname(manifest_file))
+    try:
+        with io.open(fd, 'w', encoding='utf-8') as fp:
+            json.dump(manifest, fp, indent=2, sort_keys=True)
+        os.replace(tmp_filename, manifest_file)
+    except BaseException:
+        if osp.exists(tmp_filename):
+            os.remove(tmp_filename)
+        raise
+
+
+def regenerate_image(plugin_manager, config, basepath, captures_folder):
+    """Regenerate the final picture of one session. Return the path to the
+    picture or None if it can not be generated.
+    """
+    # Imported at first use, the pictures module loads pygame
+    from pibooth.pictures import get_picture_factory, save_thumbnails
+
+    captures_folder_path = osp.join(basepath, 'raw', captures_folder)
+    capture_choices = config.gettuple('PICTURE', 'captures', int, 2)
+    captures = get_captures(captures_folder_path)
+    LOGGER.info("Generating image from raws in folder %s", captures_folder_path)
+
+    if len(captures) == capture_choices[0]:
+        idx = 0
+    elif len(captures) == capture_choices[1]:
+        idx = 1
+    else:
+        LOGGER.warning("Folder %s doesn't contain the correct number of pictures", captures_folder_path)
+        return None
+
+    default_factory = get_picture_factory(captures, config.get('PICTURE', 'orientation'))
+    factory = plugin_manager.hook.pibooth_setup_picture_factory(cfg=config,
+                                                                opt_index=idx,
+                                                                factory=default_factory)
+
+    picture_file = osp.join(basepath, captures_folder + "_pibooth.jpg")
+    image = factory.save(picture_file)
+    thumbnails_sizes = config.gettuple('PICTURE', 'thumbnails_sizes', int)
+    if thumbnails_sizes:
+        save_thumbnails(image, picture_file, thumbnails_sizes)
+    for capture in captures:
+        capture.close()  # Release memory before the next session
+    return picture_file
+
+
+class RegenerationProgress(object):
+
+    """Log the progress of the regeneration with throughput and ETA.
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.start = time.time()
+
+    def update(self, captures_folder):
+        self.done += 1
+        elapsed = time.time() - self.start
+        rate = self.done / elapsed if elapsed else 0.0
+        eta = (self.total - self.done) / rate if rate else 0.0
+        LOGGER.info("[%s/%s] %s done - %.2f sessions/s - ETA %02d:%02d:%02d", self.done, self.total,
+                    captures_folder, rate, eta // 3600, eta % 3600 // 60, eta % 60)
+
+
+_WORKER = {}  # Plugin manager and config of a worker process
+
+
+def _init_worker(config_directory):
+    """Initialize a process of the pool.
+    """
+    _WORKER['plugin_manager'], _WORKER['config'] = setup(config_directory)
+
+
+def _regenerate_image_worker(args):
+    """Regenerate the final picture of one session in a process of the pool.
+    """
+    basepath, captures_folder = args
+    try:
+        return captures_folder, regenerate_image(_WORKER['plugin_manager'], _WORKER['config'],
+                                                 basepath, captures_folder)
+    except Exception as ex:  # pylint: disable=broad-except
+        LOGGER.error("Failed to regenerate image from folder %s: %s", captures_folder, ex)
+        return captures_folder, None
+
+
+def regenerate_all_images(plugin_manager, config, basepath, jobs=1, force=False, inflight=None):
     """Regenerate the pibboth images from the raw images and the config.
+
+    The sessions are processed in the order of their folder name, and at
+    most ``inflight`` sessions are loaded at the same time.
+
+    :param jobs: number of processes used to regenerate images
+    :type jobs: int
+    :param force: regenerate images even if they are up to date
+    :type force: bool
+    :param inflight: maximum number of sessions queued to the processes
+                     (default is twice the number of processes)
+    :type inflight: int
+
+    The manifest of the up to date sessions is saved every
+    ``MANIFEST_SAVE_INTERVAL`` seconds and at the end (even if interrupted), thus
+    an interrupted run does not regenerate again the finished sessions.
     """
     if not osp.isdir(osp.join(basepath, 'raw')):
         return
 
-    capture_choices = config.gettuple('PICTURE', 'captures', int, 2)
+    manifest_file = osp.join(basepath, 'raw', '.regenerate.json')
+    manifest = {}
+    if osp.isfile(manifest_file):
+        with io.open(manifest_file, encoding='utf-8') as fp:
+            manifest = json.load(fp)
 
-    for captures_folder in os.listdir(osp.join(basepath, 'raw')):
+    inputs_hash = get_inputs_hash(config)
+    captures_folders = []
+    skipped = 0
+    for captures_folder in sorted(os.listdir(osp.join(basepath, 'raw'))):
         captures_folder_path = osp.join(basepath, 'raw', captures_folder)
         if not osp.isdir(captures_folder_path):
             continue
-        captures = get_captures(captures_folder_path)
-        LOGGER.info("Generating image from raws in folder %s", captures_folder_path)
-
-        if len(captures) == capture_choices[0]:
-            idx = 0
-        elif len(captures) == capture_choices[1]:
-            idx = 1
-        else:
-            LOGGER.warning("Folder %s doesn't contain the correct number of pictures", captures_folder_path)
+        if not force and is_up_to_date(captures_folder_path, osp.join(basepath, captures_folder + "_pibooth.jpg"),
+                                       inputs_hash, manifest):
+            LOGGER.debug("Image from raws in folder %s is up to date", captures_folder_path)
+            skipped += 1
             continue
+        captures_folders.append(captures_folder)
 
-        default_factory = get_picture_factory(captures, config.get('PICTURE', 'orientation'))
-        factory = plugin_manager.hook.pibooth_setup_picture_factory(cfg=config,
-                                                                    opt_index=idx,
-                                                                    factory=default_factory)
+    LOGGER.info("Regenerating %s images in '%s' (%s already up to date)", len(captures_folders), basepath, skipped)
+    progress = RegenerationProgress(len(captures_folders))
+    last_save = time.time()
 
-        picture_file = osp.join(basepath, captures_folder + "_pibooth.jpg")
-        factory.save(picture_file)
+    def session_done(captures_folder, picture_file):
+        nonlocal last_save
+        if picture_file:
+            manifest[captures_folder] = inputs_hash
+        progress.update(captures_folder)
+        if time.time() - last_save > MANIFEST_SAVE_INTERVAL:
+            save_manifest(manifest_file, manifest)
+            last_save = time.time()
 
+    try:
+        _regenerate_images(plugin_manager, config, basepath, captures_folders, jobs, inflight, session_done)
+    finally:
+        save_manifest(manifest_file, manifest)
 
-def main():
-    """Application entry point.
-    """
-    parser = argparse.ArgumentParser(usage="%(prog)s [options]", description="This script lets you regenerate the final pictures from the original captures present in the raw directory.")
 
-    parser.add_argument("config_directory", nargs='?', default="~/.config/pibooth",
-                        help=u"path to configuration directory (default: %(default)s)")
+def _regenerate_images(plugin_manager, config, basepath, captures_folders, jobs, inflight, session_done):
+    """Regenerate the final pictures of the given sessions and call the
+    ``session_done`` callback for each of them in the order of the list.
+    """
+    if jobs > 1 and len(captures_folders) > 1:
+        inflight = max(inflight or 2 * jobs, 1)
+        # Restart the processes regularly to give back the memory to the system
+        pool = multiprocessing.Pool(processes=jobs, initializer=_init_worker,
+                                    initargs=(osp.dirname(config.filename),), maxtasksperchild=50)
+        pending = collections.deque()
+        folders = iter(captures_folders)
+        try:
+            while True:
+                for captures_folder in folders:
+                    pending.append(pool.apply_async(_regenerate_image_worker, ((basepath, captures_folder),)))
+                    if len(pending) >= inflight:
+                        break
+                if not pending:
+                    break
+                # Results are handled in the submission order
+                session_done(*pending.popleft().get())
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for captures_folder in captures_folders:
+            session_done(captures_folder, regenerate_image(plugin_manager, config, basepath, captures_folder))
 
-    options = parser.parse_args()
 
-    configure_logging()
+def setup(config_directory):
+    """Return the plugin manager and the configuration with the plugins
+    loaded and initialized as done by the application.
+    """
     plugin_manager = create_plugin_manager()
-    config = PiConfigParser(osp.join(options.config_directory, "pibooth.cfg"), plugin_manager)
+    config = PiConfigParser(osp.join(config_directory, "pibooth.cfg"), plugin_manager)
 
     # Register plugins
     plugin_manager.load_all_plugins(config.gettuple('GENERAL', 'plugins', 'path'),
                                     config.gettuple('GENERAL', 'plugins_disabled', str))
 
-    LOGGER.info("Installed plugins: %s", ", ".join(
-        [plugin_manager.get_friendly_name(p) for p in plugin_manager.list_external_plugins()]))
-
     # Update configuration with plugins ones
     plugin_manager.hook.pibooth_configure(cfg=config)
 
@@ -92,9 +274,37 @@ def main():
     picture_plugin.texts_vars['date'] = datetime.now()
     picture_plugin.texts_vars['count'] = Counters(config.join_path("counters.pickle"), taken=0, printed=0, forgotten=0,
                                                   remaining_duplicates=config.getint('PRINTER', 'max_duplicates'))
+    return plugin_manager, config
+
+
+def main():
+    """Application entry point.
+    """
+    parser = argparse.ArgumentParser(usage="%(prog)s [options]", description="This script lets you regenerate the final pictures from the original captures present in the raw directory.")
+
+    parser.add_argument("config_directory", nargs='?', default="~/.config/pibooth",
+                        help=u"path to configuration directory (default: %(default)s)")
+
+    parser.add_argument("-j", "--jobs", type=int, default=multiprocessing.cpu_count(),
+                        help=u"number of processes used to regenerate the pictures (default: %(default)s)")
+
+    parser.add_argument("--inflight", type=int,
+                        help=u"maximum number of sessions loaded at the same time (default: twice the jobs number)")
+
+    parser.add_argument("-f", "--force", action='store_true',
+                        help=u"regenerate all pictures, even the ones which are up to date")
+
+    options = parser.parse_args()
+
+    configure_logging()
+    plugin_manager, config = setup(osp.expanduser(options.config_directory))
+
+    LOGGER.info("Installed plugins: %s", ", ".join(
+        [plugin_manager.get_friendly_name(p) for p in plugin_manager.list_external_plugins()]))
 
     for path in config.gettuple('GENERAL', 'directory', 'path'):
-        regenerate_all_images(plugin_manager, config, path)
+        regenerate_all_images(plugin_manager, config, path, max(1, options.jobs), options.force,
+                              options.inflight)
 
 
 if __name__ == "__main__":
@@ -5,6 +5,7 @@
 
 import time
 from pibooth.utils import LOGGER, BlockConsoleHandler
+from pibooth.tracing import TRACER
 
 
 class StateMachine(object):
@@ -76,6 +77,7 @@ class StateMachine(object):
                 hook(cfg=self.cfg, app=self.app, win=self.win)
                 BlockConsoleHandler.dedent()
                 LOGGER.debug("took %0.3f seconds", time.time() - self._start_time)
+                TRACER.add_span('state_' + self.active_state, self._start_time, time.time())
         except Exception as ex:
             if self.failsafe_state and self.active_state != self.failsafe_state:
                 LOGGER.error(str(ex))
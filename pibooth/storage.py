@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+"""Pibooth saving directories usage.
+"""
+
+import os
+import shutil
+import threading
+import os.path as osp
+from collections import OrderedDict
+from pibooth.utils import LOGGER, MEGABYTE
+
+
+class StorageManager(object):
+
+    """Track the disk usage of the saving directories and remove the oldest
+    raw captures (final pictures are kept) when the quota is approached.
+
+    The directories are scanned once, then the usage is updated from the
+    saved files notifications (see :py:meth:`add_file`).
+
+    :attr max_usage: maximum size in bytes of each saving directory (0 for
+                     no quota, raw captures are never removed)
+    :type max_usage: int
+    :attr min_free: free space in bytes required to start a new session
+    :type min_free: int
+    """
+
+    rotation_threshold = 0.9  # Ratio of the quota from which raw captures are removed
+
+    def __init__(self, directories, max_usage=0, min_free=0):
+        self.directories = [osp.abspath(osp.expanduser(path)) for path in directories]
+        self.max_usage = max_usage
+        self.min_free = min_free
+        self._lock = threading.Lock()
+        self._usage = dict((path, 0) for path in self.directories)
+        self._sessions = dict((path, OrderedDict()) for path in self.directories)  # {session ID: size}
+        self._evicted = []
+        self._full = False  # Warning logged once when the space runs out
+
+    def _get_directory(self, filename):
+        """Return the saving directory containing the given file.
+        """
+        for path in self.directories:
+            if filename.startswith(path + os.sep):
+                return path
+        return None
+
+    def _get_free(self, path):
+        """Return the free space in bytes of the file system of the given
+        directory.
+        """
+        while not osp.isdir(path):
+            path = osp.dirname(path)
+        return shutil.disk_usage(path).free
+
+    def _need_rotation(self, path):
+        if not self.max_usage:
+            return False
+        return self._usage[path] > self.max_usage * self.rotation_threshold\
+            or (self.min_free and self._get_free(path) < self.min_free)
+
+    def scan(self):
+        """Compute the usage of the saving directories (walk all files).
+        """
+        with self._lock:
+            for path in self.directories:
+                self._usage[path] = 0
+                self._sessions[path] = OrderedDict()
+                for dirpath, _, filenames in os.walk(path):
+                    for name in filenames:
+                        try:
+                            self._usage[path] += osp.getsize(osp.join(dirpath, name))
+                        except OSError:
+                            pass  # Removed meanwhile
+
+                rawdir = osp.join(path, 'raw')
+                if osp.isdir(rawdir):
+                    for session_id in sorted(os.listdir(rawdir)):
+                        sessiondir = osp.join(rawdir, session_id)
+                        if osp.isdir(sessiondir):
+                            self._sessions[path][session_id] = sum(osp.getsize(osp.join(sessiondir, name))
+                                                                   for name in os.listdir(sessiondir))
+                LOGGER.debug("Saving directory '%s' uses %.1f MB (%s raw sessions)", path,
+                             self._usage[path] / MEGABYTE, len(self._sessions[path]))
+        self.rotate()
+
+    def add_file(self, filename):
+        """Account a new saved file, then remove old raw captures if needed.
+
+        :param filename: path to the saved file
+        :type filename: str
+        """
+        filename = osp.abspath(filename)
+        path = self._get_directory(filename)
+        if not path:
+            return
+        size = osp.getsize(filename)
+        with self._lock:
+            self._usage[path] += size
+            parts = osp.relpath(filename, path).split(os.sep)
+            if len(parts) == 3 and parts[0] == 'raw':
+                sessions = self._sessions[path]
+                sessions[parts[1]] = sessions.get(parts[1], 0) + size
+        self.rotate()
+
+    def rotate(self):
+        """Remove the oldest raw captures of the directories which are near
+        their quota. The captures of the last session are never removed.
+        """
+        with self._lock:
+            for path in self.directories:
+                sessions = self._sessions[path]
+                while len(sessions) > 1 and self._need_rotation(path):
+                    session_id, size = sessions.popitem(last=False)
+                    LOGGER.info("Remove raw captures '%s' from '%s' (%.1f MB used)", session_id, path,
+                                self._usage[path] / MEGABYTE)
+                    shutil.rmtree(osp.join(path, 'raw', session_id), ignore_errors=True)
+                    self._usage[path] -= size
+                    self._evicted.append(session_id)
+
+    def has_headroom(self):
+        """Return True if there is enough space to start a new session in
+        all saving directories. A warning is logged once when the space
+        runs out.
+        """
+        with self._lock:
+            reason = None
+            for path in self.directories:
+                if self.max_usage and self._usage[path] >= self.max_usage:
+                    reason = "quota of {:.1f} MB reached for saving directory '{}'".format(
+                        self.max_usage / MEGABYTE, path)
+                    break
+                if self.min_free and self._get_free(path) < self.min_free:
+                    reason = "less than {:.1f} MB free for saving directory '{}'".format(
+                        self.min_free / MEGABYTE, path)
+                    break
+            if reason and not self._full:
+                LOGGER.warning("Storage full, new sessions are refused: %s", reason)
+            elif not reason and self._full:
+                LOGGER.info("Storage available again, new sessions are accepted")
+            self._full = reason is not None
+        return not self._full
+
+    def pop_evicted(self):
+        """Return the IDs of the sessions whose raw captures have been removed
+        since the last call.
+        """
+        with self._lock:
+            evicted, self._evicted = self._evicted, []
+        return evicted
+
+    def get_statistics(self):
+        """Return a dictionary (JSON serializable) with the usage of each
+        saving directory.
+        """
+        with self._lock:
+            return dict((path, {'usage': self._usage[path], 'free': self._get_free(path),
+                                'raw_sessions': len(self._sessions[path])}) for path in self.directories)
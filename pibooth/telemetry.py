@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+"""Pibooth frames rendering telemetry.
+"""
+
+import io
+import csv
+import json
+import time
+import os.path as osp
+from collections import deque
+from pibooth.utils import LOGGER, MEGABYTE, LatencyHistogram
+
+
+class FrameTelemetry(object):
+
+    """Record the timings of each frame of the main loop in a ring buffer
+    (the memory footprint does not depend on the running time).
+
+    For each frame are recorded:
+
+    - ``time``: timestamp of the frame start
+    - ``state``: active state
+    - ``frame``: time spent in the loop iteration (without the idle wait)
+    - ``process``: time spent in :py:meth:`pibooth.states.StateMachine.process`
+      (state hooks)
+    - ``display``: time spent in :py:func:`pygame.display.update`
+    - ``interval``: time since the previous frame start (1 / fps)
+
+    :attr size: maximum number of frames kept
+    :type size: int
+    """
+
+    FIELDS = ('time', 'state', 'frame', 'process', 'display', 'interval')
+
+    def __init__(self, size=1800):
+        self.size = size
+        self.samples = deque(maxlen=size)
+        self.frame = LatencyHistogram()
+        self.process = LatencyHistogram()
+        self.display = LatencyHistogram()
+        self.states = {}  # {state name: LatencyHistogram of process time}
+        self._last_start = None
+
+    def add(self, start, state, frame, process, display):
+        """Record the timings of a frame.
+
+        :param start: timestamp (:py:func:`time.time`) of the frame start
+        :type start: float
+        :param state: name of the active state
+        :type state: str
+        :param frame: time in seconds spent in the loop iteration
+        :type frame: float
+        :param process: time in seconds spent in the state machine
+        :type process: float
+        :param display: time in seconds spent to update the display
+        :type display: float
+        """
+        interval = start - self._last_start if self._last_start is not None else 0.0
+        self._last_start = start
+        self.samples.append((start, state, frame, process, display, interval))
+        self.frame.add(frame)
+        self.process.add(process)
+        self.display.add(display)
+        histogram = self.states.get(state)
+        if histogram is None:
+            histogram = self.states[state] = LatencyHistogram()
+        histogram.add(process)
+
+    def get_fps(self, last=40):
+        """Return the frames per second measured on the last frames.
+        """
+        intervals = [sample[5] for sample in list(self.samples)[-last:] if sample[5]]
+        if not intervals:
+            return 0.0
+        return len(intervals) / sum(intervals)
+
+    def get_summary(self, memory=0, pending=None, last=40):
+        """Return a list of human readable lines describing the rendering
+        performance of the last frames.
+
+        :param memory: memory in bytes used by the held images
+        :type memory: int
+        :param pending: dictionary of the number of pending jobs per worker
+        :type pending: dict
+
+        :return: list of lines
+        :rtype: list
+        """
+        samples = list(self.samples)[-last:]
+        if not samples:
+            return []
+
+        def mean(index):
+            return sum(sample[index] for sample in samples) / len(samples) * 1000
+
+        lines = ["fps={:.1f} frame={:.1f}ms (max {:.1f}ms)".format(
+                     self.get_fps(last), mean(2), max(sample[2] for sample in samples) * 1000),
+                 "process={:.1f}ms display={:.1f}ms".format(mean(3), mean(4))]
+        state = samples[-1][1]
+        if state in self.states:
+            lines.append("state {} p95={:.1f}ms max={:.1f}ms".format(
+                state, self.states[state].percentile(95) * 1000, self.states[state].max * 1000))
+        lines.append("images memory={:.1f}MB".format(memory / MEGABYTE))
+        if pending:
+            lines.append("pending " + " ".join("{}={}".format(name, nbr) for name, nbr in sorted(pending.items())))
+        return lines
+
+    def get_statistics(self):
+        """Return a dictionary (JSON serializable) with the timings histograms.
+        """
+        return {'frame': self.frame.to_dict(),
+                'process': self.process.to_dict(),
+                'display': self.display.to_dict(),
+                'states': dict((state, histogram.to_dict()) for state, histogram in self.states.items())}
+
+    def export(self, filename):
+        """Save the recorded frames in a CSV file, or in a JSON file (with
+        the timings histograms) if the file extension is ``.json``.
+
+        :param filename: path to the file
+        :type filename: str
+        """
+        filename = osp.abspath(osp.expanduser(filename))
+        if filename.endswith('.json'):
+            with io.open(filename, 'w', encoding='utf-8') as fp:
+                json.dump({'exported': time.time(),
+                           'statistics': self.get_statistics(),
+                           'frames': [dict(zip(self.FIELDS, sample)) for sample in self.samples]}, fp)
+        else:
+            with io.open(filename, 'w', encoding='utf-8', newline='') as fp:
+                writer = csv.writer(fp)
+                writer.writerow(self.FIELDS)
+                writer.writerows(self.samples)
+        LOGGER.info("Timings of the last %s frames saved in '%s'", len(self.samples), filename)
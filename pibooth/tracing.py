@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+"""Pibooth sessions latency tracing.
+"""
+
+import io
+import os
+import json
+import time
+import threading
+import contextlib
+import os.path as osp
+from pibooth.utils import LOGGER
+
+
+class Tracer(object):
+
+    """Record the duration of the steps (spans) of the sessions to find where
+    the time of a session goes.
+
+    Each span belongs to a trace identified by the session ID. Spans are
+    written (one per line) as soon as they are finished, in the format
+    given by the file extension:
+
+    - ``.json``: Chrome trace format (to load in ``chrome://tracing`` or
+      https://ui.perfetto.dev)
+    - any other extension: JSON lines
+
+    When no file is opened, nothing is recorded (no overhead).
+
+    :attr trace_id: ID of the current trace (spans without explicit trace ID
+                    are attached to it, they are dropped if None)
+    :type trace_id: str
+    """
+
+    def __init__(self):
+        self.trace_id = None
+        self.filename = None
+        self._chrome = False
+        self._fp = None
+        self._lock = threading.Lock()
+        self._threads = set()  # Threads already named in the Chrome trace
+
+    @property
+    def enabled(self):
+        return self._fp is not None
+
+    def open(self, filename):
+        """Start writing the spans in the given file (appended if it exists).
+
+        :param filename: path to the file (None to stop tracing)
+        :type filename: str
+        """
+        self.close()
+        if not filename:
+            return
+        self.filename = osp.abspath(osp.expanduser(filename))
+        dirname = osp.dirname(self.filename)
+        if not osp.isdir(dirname):
+            os.makedirs(dirname)
+        self._chrome = self.filename.endswith('.json')
+        with self._lock:
+            self._fp = io.open(self.filename, 'a', encoding='utf-8')
+            if self._chrome and self._fp.tell() == 0:
+                self._fp.write(u'[\n')  # Closing bracket is optional in Chrome trace format
+            self._threads = set()
+        LOGGER.info("Sessions latency spans written in '%s'", self.filename)
+
+    def close(self):
+        """Stop writing the spans.
+        """
+        with self._lock:
+            if self._fp:
+                self._fp.close()
+                self._fp = None
+
+    def start_trace(self, trace_id):
+        """Attach the next spans to the given trace (None to stop the current
+        trace).
+        """
+        self.trace_id = trace_id
+
+    def _write(self, event):
+        self._fp.write(json.dumps(event, sort_keys=True))
+        self._fp.write(u',\n' if self._chrome else u'\n')
+
+    def add_span(self, name, start, end, trace_id=None, **args):
+        """Record a finished span.
+
+        :param name: name of the step
+        :type name: str
+        :param start: timestamp (:py:func:`time.time`) of the step start
+        :type start: float
+        :param end: timestamp (:py:func:`time.time`) of the step end
+        :type end: float
+        :param trace_id: ID of the trace (current trace if None)
+        :type trace_id: str
+        :param args: additional JSON serializable information
+        """
+        trace_id = trace_id or self.trace_id
+        if not self._fp or not trace_id:
+            return
+        thread = threading.current_thread()
+        with self._lock:
+            if not self._fp:
+                return
+            if self._chrome:
+                if thread.ident not in self._threads:
+                    self._threads.add(thread.ident)
+                    self._write({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': thread.ident,
+                                 'args': {'name': thread.name}})
+                self._write({'name': name, 'cat': 'session', 'ph': 'X', 'pid': os.getpid(), 'tid': thread.ident,
+                             'ts': int(start * 1000000), 'dur': int((end - start) * 1000000),
+                             'args': dict(args, trace_id=trace_id)})
+            else:
+                self._write({'trace_id': trace_id, 'name': name, 'start': start, 'end': end,
+                             'duration': end - start, 'thread': thread.name, 'args': args})
+            self._fp.flush()
+
+    @contextlib.contextmanager
+    def span(self, name, trace_id=None, **args):
+        """Context manager recording a span for the enclosed code.
+
+        :param name: name of the step
+        :type name: str
+        :param trace_id: ID of the trace (current trace if None)
+        :type trace_id: str
+        :param args: additional JSON serializable information
+        """
+        if not self._fp:
+            yield
+            return
+        trace_id = trace_id or self.trace_id
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add_span(name, start, time.time(), trace_id, **args)
+
+
+TRACER = Tracer()
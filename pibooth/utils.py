@@ -14,11 +14,12 @@ from fnmatch import fnmatchcase
 import contextlib
 import errno
 import subprocess
-import pygame
 
 
 LOGGER = logging.getLogger("pibooth")
 
+MEGABYTE = 1024 * 1024
+
 
 class BlockConsoleHandler(logging.StreamHandler):
 
@@ -146,6 +147,87 @@ class PoolingTimer(object):
         return (time.time() - self.time - self.paused()) > self.timeout
 
 
+class LatencyHistogram(object):
+
+    """
+    Fixed-size histogram of durations (in seconds). The memory footprint
+    does not depend on the number of recorded samples.
+    """
+
+    BOUNDS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1,
+              0.2, 0.5, 1.0, 2.0, 5.0, 10.0)
+
+    def __init__(self, bounds=None):
+        self.bounds = tuple(bounds or self.BOUNDS)
+        self.buckets = [0] * (len(self.bounds) + 1)  # Last one for overflow
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, duration):
+        """Record a new duration.
+
+        :param duration: duration in seconds
+        :type duration: float
+        """
+        index = 0
+        for bound in self.bounds:
+            if duration <= bound:
+                break
+            index += 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+
+    def mean(self):
+        """Return the mean duration in seconds.
+        """
+        if not self.count:
+            return 0.0
+        return self.total / self.count
+
+    def percentile(self, percent):
+        """Return an estimation of the given percentile (upper bound of the
+        bucket where it is located) in seconds.
+
+        :param percent: percentile between 0 and 100
+        :type percent: float
+        """
+        if not self.count:
+            return 0.0
+        rank = self.count * percent / 100.0
+        cumul = 0
+        for index, nbr in enumerate(self.buckets):
+            cumul += nbr
+            if cumul >= rank and nbr:
+                if index < len(self.bounds):
+                    return min(self.bounds[index], self.max)
+                break
+        return self.max
+
+    def reset(self):
+        """Drop all recorded durations.
+        """
+        self.buckets = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def to_dict(self):
+        """Return a dictionary representation (JSON serializable).
+        """
+        return {'count': self.count,
+                'total': self.total,
+                'mean': self.mean(),
+                'p50': self.percentile(50),
+                'p95': self.percentile(95),
+                'max': self.max,
+                'bounds': list(self.bounds),
+                'buckets': list(self.buckets)}
+
+
 def configure_logging(level=logging.INFO, msgfmt=logging.BASIC_FORMAT, datefmt=None, filename=None):
     """Configure root logger for console printing.
     """
@@ -290,6 +372,7 @@ def get_event_pos(display_size, event):
     :param event: pygame event object
     :return: position (x, y) in px
     """
+    import pygame  # Not imported at module level, pygame is slow to load
     if event.type in (pygame.FINGERDOWN, pygame.FINGERMOTION, pygame.FINGERUP):
         finger_pos = (event.x * display_size[0], event.y * display_size[1])
         return finger_pos
@@ -68,6 +68,8 @@ class Background(object):
         self._show_back = False
 
         self._overlay = None
+        self._flattened = None  # All static layers painted in one surface
+        self._flattened_key = None
 
         self._texts = []  # List of (surface, rect)
         self._text_border = 20  # Distance to other elements
@@ -120,6 +122,11 @@ class Background(object):
                 self._background_color = (0, 0, 0)
                 self._need_update = True
 
+    def get_rect(self):
+        """Return the rectangle of the window the background is sized for.
+        """
+        return self._rect
+
     def get_color(self):
         """Return the background color (RGB tuple).
         """
@@ -175,8 +182,30 @@ class Background(object):
         if text:
             self._write_text(text, rect, align)
 
-    def paint(self, screen):
-        """Paint and animate the surfaces on the screen.
+    def paint(self, screen, area=None):
+        """Paint the background on the screen. The layers are flattened in a
+        single surface (in the screen pixel format) which is built again only
+        when the size, the colors or the outlines change.
+
+        :param screen: surface to paint on
+        :type screen: :py:class:`pygame.Surface`
+        :param area: only paint this rectangle of the background (all if None)
+        :type area: :py:class:`pygame.Rect`
+        """
+        key = (self._rect.size, tuple(self._background_color), tuple(self._text_color), self._show_outlines)
+        if self._need_update or key != self._flattened_key:
+            self._flattened = pygame.Surface(self._rect.size, 0, screen)
+            self.paint_layers(self._flattened)
+            self._flattened_key = key
+        if area:
+            screen.blit(self._flattened, area.topleft, area)
+        else:
+            screen.blit(self._flattened, (0, 0))
+        self._need_update = False
+
+    def paint_layers(self, screen):
+        """Paint the static layers (background, overlay, texts and icons) on
+        the given surface.
         """
         if self._background:
             screen.blit(self._background, (0, 0))
@@ -197,8 +226,6 @@ class Background(object):
         if self._show_back:
             back_icon = pictures.get_pygame_image("back.png",  (self._rect.width * 0.1, self._rect.height * 0.1), vflip=False, color=self._text_color)
             screen.blit(back_icon, (int(self._rect.width * 0.01), int(self._rect.height - (self._rect.width * 0.01) - back_icon.get_rect().height)))
-            
-        self._need_update = False
 
 class IntroBackground(Background):
 
@@ -219,8 +246,8 @@ class IntroBackground(Background):
     def resize_texts(self):
         return None
 
-    def paint(self, screen):
-        Background.paint(self, screen)
+    def paint_layers(self, screen):
+        Background.paint_layers(self, screen)
         screen.blit(self.camera_icon, self.camera_icon_pos)
 
 class IntroWithPrintBackground(IntroBackground):
@@ -251,8 +278,8 @@ class IntroWithPrintBackground(IntroBackground):
     def resize_texts(self):
         return None
 
-    def paint(self, screen):
-        IntroBackground.paint(self, screen)
+    def paint_layers(self, screen):
+        IntroBackground.paint_layers(self, screen)
         screen.blit(self.print_icon, self.print_icon_pos)
 
 class ChooseBackground(Background):
@@ -281,8 +308,8 @@ class ChooseBackground(Background):
     def resize_texts(self):
         return None
 
-    def paint(self, screen):
-        Background.paint(self, screen)
+    def paint_layers(self, screen):
+        Background.paint_layers(self, screen)
         screen.blit(self.layout0, self.layout0_pos)
         screen.blit(self.layout1, self.layout1_pos)
 
@@ -318,8 +345,8 @@ class CaptureBackground(Background):
     def resize_texts(self):
         return None  
     
-    def paint(self, screen):
-        Background.paint(self, screen)
+    def paint_layers(self, screen):
+        Background.paint_layers(self, screen)
         screen.blit(self.auto_shutter_icon, self.auto_shutter_icon_pos)
         screen.blit(self.add_shutter_icon, self.add_shutter_icon_pos)
         screen.blit(self.reduce_shutter_icon, self.reduce_shutter_icon_pos)
@@ -345,8 +372,8 @@ class ConfirmBackground(Background):
             self.no_print_icon_pos = (int((self._rect.width * 0.99) - self.no_print_icon.get_rect().width),
                                     int(self._rect.height * 0.55))
 
-    def paint(self, screen):
-        Background.paint(self, screen)
+    def paint_layers(self, screen):
+        Background.paint_layers(self, screen)
         screen.blit(self.print_icon, self.print_icon_pos)
         screen.blit(self.no_print_icon, self.no_print_icon_pos)
 
@@ -382,8 +409,8 @@ class PrintBackground(Background):
             self.no_print_icon_pos = (int((self._rect.width * 0.99) - self.no_print_icon.get_rect().width),
                                       int(self._rect.height * 0.55))
 
-    def paint(self, screen):
-        Background.paint(self, screen)
+    def paint_layers(self, screen):
+        Background.paint_layers(self, screen)
         screen.blit(self.print_icon, self.print_icon_pos)
         screen.blit(self.no_print_icon, self.no_print_icon_pos)
 
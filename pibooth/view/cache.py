@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+"""Pibooth cache of the surfaces displayed on the foreground.
+"""
+
+import os
+import weakref
+from collections import OrderedDict
+from pibooth.utils import LOGGER
+
+
+def get_image_key(pil_image):
+    """Return a stable identity of the given PIL image.
+
+    Images opened from a file are identified by the path and the modification
+    time of the file. Images built in memory are identified by their ID, valid
+    as long as the image is alive (see :py:class:`SurfaceCache`).
+    """
+    filename = getattr(pil_image, 'filename', None)
+    if filename:
+        try:
+            return ('file', os.path.abspath(filename), os.stat(filename).st_mtime_ns, pil_image.size)
+        except OSError:
+            pass  # File removed, fallback on ID
+    return ('id', id(pil_image), pil_image.size)
+
+
+class SurfaceCache(object):
+
+    """Least recently used cache of the surfaces rendered from PIL images,
+    keyed by the image identity and the target size.
+
+    The entries of an image identified by its ID are removed when the image
+    is garbage collected, so a new image reusing the same ID can not get a
+    stale surface.
+
+    :attr max_entries: maximum number of surfaces kept
+    :type max_entries: int
+    """
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # {(image key, size): surface}
+        self._watched = {}  # {image key: finalizer}
+        self._dead = []  # Keys of the garbage collected images
+        self._stats = {'hits': 0, 'misses': 0, 'evicted': 0}
+
+    def _purge(self):
+        """Remove the entries of the garbage collected images.
+        """
+        while self._dead:
+            image_key = self._dead.pop()
+            self._watched.pop(image_key, None)
+            for key in [key for key in self._entries if key[0] == image_key]:
+                del self._entries[key]
+
+    def _watch(self, pil_image, image_key):
+        """Remove the entries of the image when it is garbage collected (the
+        finalizer can be called from any thread, so entries are only removed
+        at next cache access).
+        """
+        if image_key[0] == 'id' and image_key not in self._watched:
+            self._watched[image_key] = weakref.finalize(pil_image, self._dead.append, image_key)
+
+    def get(self, pil_image, size):
+        """Return the surface of the given image rendered at the given size,
+        or None if not in cache.
+        """
+        self._purge()
+        key = (get_image_key(pil_image), tuple(size))
+        surface = self._entries.get(key)
+        if surface is None:
+            self._stats['misses'] += 1
+            return None
+        self._stats['hits'] += 1
+        self._entries.move_to_end(key)
+        return surface
+
+    def put(self, pil_image, size, surface):
+        """Add the surface of the given image rendered at the given size.
+        """
+        self._purge()
+        image_key = get_image_key(pil_image)
+        self._watch(pil_image, image_key)
+        key = (image_key, tuple(size))
+        self._entries[key] = surface
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            key, _ = self._entries.popitem(last=False)
+            self._stats['evicted'] += 1
+            LOGGER.debug("Remove from buffer the image '%s'", key[0])
+
+    def discard(self, pil_image):
+        """Remove all entries of the given image.
+        """
+        image_key = get_image_key(pil_image)
+        for key in [key for key in self._entries if key[0] == image_key]:
+            del self._entries[key]
+
+    def keep_only(self, pil_image=None):
+        """Remove all entries except the ones of the given image.
+        """
+        image_key = get_image_key(pil_image) if pil_image is not None else None
+        for key in [key for key in self._entries if key[0] != image_key]:
+            del self._entries[key]
+
+    def values(self):
+        """Return the list of cached surfaces.
+        """
+        self._purge()
+        return list(self._entries.values())
+
+    def clear(self):
+        """Remove all entries.
+        """
+        self._entries.clear()
+
+    def get_statistics(self):
+        """Return a dictionary with the cache metrics.
+        """
+        return dict(self._stats, entries=len(self._entries))
+
+    def __len__(self):
+        return len(self._entries)
@@ -3,22 +3,30 @@
 """Pibooth view management.
 """
 
-from cmath import rect
-from operator import truediv
 import os
 import time
-import contextlib
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import pibooth
-from tkinter import Y
 import pygame # type: ignore
 from pygame import gfxdraw # type: ignore
 from PIL import Image # type: ignore
 from pibooth import pictures, fonts
 from pibooth.view import background
+from pibooth.view.cache import SurfaceCache, get_image_key
 from pibooth.utils import LOGGER
 from pibooth.pictures import sizing
 
 
+def render_foreground(pil_image, size):
+    """Return the buffer, size and mode of the given PIL image resized to fit
+    in the given size (called from the rendition thread).
+    """
+    image = pil_image.resize(sizing.new_size_keep_aspect_ratio(pil_image.size, size), Image.ANTIALIAS)
+    return image.tobytes(), image.size, image.mode
+
+
 class PiWindow(object):
 
     """Class to handle the window.
@@ -37,6 +45,9 @@ class PiWindow(object):
     LEFT = 'left'
     FULLSCREEN = 'fullscreen'
 
+    max_renditions = 8  # Maximum number of prepared foreground renditions
+    max_foregrounds = 8  # Maximum number of foreground surfaces kept in cache
+
     def __init__(self, title,
                  size=(800, 480),
                  color=(0, 0, 0),
@@ -69,7 +80,12 @@ class PiWindow(object):
         self.display_size = (info.current_w, info.current_h)
         self.surface = pygame.display.set_mode(self.__size, pygame.RESIZABLE)
 
-        self._buffered_images = {}
+        self._buffered_images = {}  # Backgrounds
+        self._foregrounds = SurfaceCache(self.max_foregrounds)
+        self._renditions = OrderedDict()  # {(image key, size): future}
+        self._dead_renditions = []  # Keys of the renditions of garbage collected images
+        self._renditions_executor = ThreadPoolExecutor(1, thread_name_prefix='PiWindowRendition')
+        self._placeholder_shown = False
         self._current_background = None
         self._current_foreground = None
         self._print_number = 0
@@ -79,6 +95,9 @@ class PiWindow(object):
         self._shutter_speed = 0
         self._iso = 0
         self._white_balance = 'auto'
+        self._debug_overlay = None
+        self._hud_rects = {}  # {name: rect of the label on the window}
+        self._hud_icons = {}  # {(name, size, color): surface}
 
         self._pos_map = {self.CENTER: self._center_pos,
                          self.RIGHT: self._right_pos,
@@ -93,34 +112,61 @@ class PiWindow(object):
                          128, 255, 192, 255, 224, 254, 0, 239, 0, 207, 0, 135, 128, 7, 128, 3, 0))
 
 
-    def _update_foreground(self, pil_image, pos=CENTER, resize=True, x_offset = 0, y_offset = 0, border=False):
-        """Show a PIL image on the foreground.
-        Only one is bufferized to avoid memory leak.
+    def get_foreground_size(self, pos):
+        """Return the maximum size (width, height) of a picture displayed at
+        the given position.
         """
-        image_name = id(pil_image)
+        return self._get_foreground_size(pos)
 
+    def _get_foreground_size(self, pos):
+        """Return the maximum size of a foreground image at the given position.
+        """
         if pos == self.FULLSCREEN:
-            image_size_max = (self.surface.get_size()[0] * 0.9, self.surface.get_size()[1] * 0.9)
+            return (self.surface.get_size()[0] * 0.9, self.surface.get_size()[1] * 0.9)
         elif pos == self.CENTER:
-            image_size_max = (self.surface.get_size()[0] * 0.75, self.surface.get_size()[1])
-        else:
-            image_size_max = (self.surface.get_size()[0] * 0.48, self.surface.get_size()[1])
+            return (self.surface.get_size()[0] * 0.75, self.surface.get_size()[1])
+        return (self.surface.get_size()[0] * 0.48, self.surface.get_size()[1])
 
-        buff_size, buff_image = self._buffered_images.get(image_name, (None, None))
-        if buff_image and image_size_max == buff_size:
-            image = buff_image
-        else:
-            if resize:
-                image = pil_image.resize(sizing.new_size_keep_aspect_ratio(
-                    pil_image.size, image_size_max), Image.ANTIALIAS)
+    def _to_display_format(self, image):
+        """Return a copy of the surface in the pixel format of the display
+        (fastest to blit).
+        """
+        if image.get_flags() & pygame.SRCALPHA:
+            return image.convert_alpha()
+        return image.convert()
+
+    def _update_foreground(self, pil_image, pos=CENTER, resize=True, x_offset = 0, y_offset = 0, border=False):
+        """Show a PIL image on the foreground.
+
+        The resized rendition is computed in a background thread, a cheap
+        placeholder is displayed until it is ready (see :py:meth:`update_renditions`).
+        """
+        image_size_max = self._get_foreground_size(pos)
+        cache_size = image_size_max if resize else pil_image.size
+
+        image = self._foregrounds.get(pil_image, cache_size)
+        self._placeholder_shown = False
+        if not image and resize:
+            rendition = self.prepare_foreground(pil_image, pos)
+            if rendition.done():
+                self._renditions.pop((get_image_key(pil_image), image_size_max), None)
+                try:
+                    buffer = rendition.result()
+                except Exception as ex:  # pylint: disable=broad-except
+                    LOGGER.warning("Rendition of image '%s' failed, resize it now: %s", get_image_key(pil_image), ex)
+                    buffer = render_foreground(pil_image, image_size_max)
+                image = self._to_display_format(pygame.image.frombuffer(*buffer))
+                LOGGER.debug("Add to buffer the image '%s'", get_image_key(pil_image))
+                self._foregrounds.put(pil_image, cache_size, image)
             else:
-                image = pil_image
-            image = pygame.image.frombuffer(image.tobytes(), image.size, image.mode)
-            
-            if self._current_foreground:
-                self._buffered_images.pop(id(self._current_foreground[0]), None)
-            LOGGER.debug("Add to buffer the image '%s'", image_name)
-            self._buffered_images[image_name] = (image_size_max, image)
+                image = pil_image.resize(sizing.new_size_keep_aspect_ratio(
+                    pil_image.size, image_size_max), Image.NEAREST)
+                image = pygame.image.frombuffer(image.tobytes(), image.size, image.mode)
+                self._placeholder_shown = True
+        elif not image:
+            image = self._to_display_format(pygame.image.frombuffer(pil_image.tobytes(),
+                                                                    pil_image.size, pil_image.mode))
+            self._foregrounds.put(pil_image, cache_size, image)
 
         self._current_foreground = (pil_image, pos, resize, x_offset, y_offset)
 
@@ -138,6 +184,13 @@ class PiWindow(object):
         
         return self.surface.blit(image, (self._pos_map[pos](image)[0] + x_offset, self._pos_map[pos](image)[1] + y_offset))
 
+    def _clear_foreground(self):
+        """Forget the displayed foreground image (the new view has no picture,
+        a pending rendition shall not be painted on it).
+        """
+        self._current_foreground = None
+        self._placeholder_shown = False
+
     def _update_background(self, bkgd):
         """Show image on the background.
         """
@@ -182,8 +235,8 @@ class PiWindow(object):
                 image = pictures.get_pygame_image('printer_failure.png', (side, side), color=self.text_color)
             else:
                 image = pictures.get_pygame_image('printer.png', (side, side), color=self.text_color)
-            font = pygame.font.Font(fonts.CURRENT, side)
-            label = font.render(str(self._print_number) + ' / ' + str(self._printed_number), True, self.text_color)
+            label = fonts.render_text(str(self._print_number) + ' / ' + str(self._printed_number),
+                                      fonts.CURRENT, side, self.text_color)
 
             height = max((image.get_rect().height, label.get_rect().height)) + 20
             bg = pygame.Surface((image.get_rect().width + label.get_rect().width + side + 10, height))
@@ -258,6 +311,7 @@ class PiWindow(object):
         """Show failure view in case of exception.
         """
         self._capture_number = (0, self._capture_number[1])
+        self._clear_foreground()
         self._update_background(background.OopsBackground())
 
     def show_intro(self, pil_image=None, with_print=True):
@@ -271,17 +325,28 @@ class PiWindow(object):
 
         if pil_image:
             self._update_foreground(pil_image, self.RIGHT, x_offset= -25)
-        elif self._current_foreground:
-            self._buffered_images.pop(id(self._current_foreground[0]), None)
-            self._current_foreground = None
+        else:
+            self.drop_renditions()  # No picture to display anymore
+            self._clear_foreground()
+
+    def show_animation_frame(self, pil_image):
+        """Replace the displayed foreground image by an animation frame with
+        the same aspect ratio (only the frame is blitted).
+        """
+        if not self._current_foreground:
+            return None
+        _, pos, resize, x_offset, y_offset = self._current_foreground
+        return self._update_foreground(pil_image, pos, resize, x_offset, y_offset)
 
     def show_choice(self, choices, selected=None):
         """Show the choice view.
         """
         self._capture_number = (0, self._capture_number[1])
+        self._clear_foreground()
         self._update_background(background.ChooseBackground(choices))
         
     def show_capture(self, rect):
+        self._clear_foreground()
         self._update_background(background.CaptureBackground(rect))
 
     def show_image(self, pil_image=None, pos=FULLSCREEN):
@@ -290,11 +355,12 @@ class PiWindow(object):
         if not pil_image:
             # Clear the currently displayed image
             if self._current_foreground:
-                _, image = self._buffered_images.pop(id(self._current_foreground[0]))
-                _, pos, _, _, _ = self._current_foreground
-                self._current_foreground = None
-                image.fill((0, 0, 0))
-                return self.surface.blit(image, self._pos_map[pos](image))
+                pil_image, pos, resize, _, _ = self._current_foreground
+                image = self._foregrounds.get(pil_image, self._get_foreground_size(pos) if resize else pil_image.size)
+                self._clear_foreground()
+                if image:
+                    # Don't fill the cached surface, it may be displayed again
+                    return self.surface.fill((0, 0, 0), self._pos_map[pos](image))
         else:
             return self._update_foreground(pil_image, pos, border=True)
     
@@ -305,11 +371,14 @@ class PiWindow(object):
         self._update_background(background.ConfirmBackground())
         if pil_image:
             self._update_foreground(pil_image, self.CENTER, x_offset=-40, border=True)
+        else:
+            self._clear_foreground()
 
     def show_work_in_progress(self):
         """Show wait view.
         """
         self._capture_number = (0, self._capture_number[1])
+        self._clear_foreground()
         self._update_background(background.ProcessingBackground())
 
     def show_print(self, pil_image=None):
@@ -319,6 +388,8 @@ class PiWindow(object):
         self._update_background(background.PrintBackground())
         if pil_image:
             self._update_foreground(pil_image, self.CENTER, x_offset=-40)
+        else:
+            self._clear_foreground()
 
     def set_capture_number(self, current_nbr, total_nbr):
         """Set the current number of captures taken.
@@ -332,60 +403,75 @@ class PiWindow(object):
     
     def _update_iso(self):
         width = int(self.surface.get_size()[0] * 0.03)
-        font = pygame.font.Font(fonts.CURRENT, width)
-        label = font.render('auto' if self._iso == 0 else str(self._iso), True, self.text_color)
+        label = fonts.render_text('auto' if self._iso == 0 else str(self._iso), fonts.CURRENT, width, self.text_color)
                
         x = int(self.surface.get_size()[0] * 0.97 - label.get_rect().width)
         y = int(self.surface.get_size()[1] * 0.45 - label.get_rect().height // 2)
 
-        self.surface.blit(label,(x,y))
+        return self.surface.blit(label,(x,y))
         
     def set_iso(self, iso):
         self._iso = iso
-        self._update_preview_window()
+        self._update_hud('iso', self._update_iso)
         return iso
     
     def _update_shutter_speed(self):
         width = int(self.surface.get_size()[0] * 0.03)
-        font = pygame.font.Font(fonts.CURRENT, width)
-        label = font.render('auto' if self._shutter_speed == 0 else f"1/{self._shutter_speed}", True, self.text_color)
+        label = fonts.render_text('auto' if self._shutter_speed == 0 else f"1/{self._shutter_speed}",
+                                  fonts.CURRENT, width, self.text_color)
                
         x = int(self.surface.get_size()[0] * 0.03)
         y = int(self.surface.get_size()[1] * 0.45 - label.get_rect().height // 2)
 
-        self.surface.blit(label,(x,y))
+        return self.surface.blit(label,(x,y))
         
     def set_shutter_speed(self, speed):
         self._shutter_speed = speed
-        self._update_preview_window()
+        self._update_hud('shutter_speed', self._update_shutter_speed)
         return speed
     
     def _update_white_balance(self):
         font_size = int(self.surface.get_size()[0] * 0.03)
-        font = pygame.font.Font(fonts.CURRENT, font_size)
-        label = font.render(self._white_balance, True, self.text_color)
+        label = fonts.render_text(self._white_balance, fonts.CURRENT, font_size, self.text_color)
         label_position = (int(self.surface.get_size()[0] * 0.25),
                           int(self.surface.get_size()[1] * 0.95 - label.get_rect().height//2))
         wb_mode_size = (self.surface.get_size()[0] * 0.10, self.surface.get_size()[1] * 0.10)
-        wb_mode_icon  = pictures.get_pygame_image('wb_mode.png',  wb_mode_size, vflip=False, color=self.text_color)    
+        key = ('wb_mode.png', wb_mode_size, tuple(self.text_color))
+        if key not in self._hud_icons:
+            self._hud_icons[key] = pictures.get_pygame_image('wb_mode.png', wb_mode_size, vflip=False,
+                                                             color=self.text_color)
+        wb_mode_icon = self._hud_icons[key]
         wb_mode_icon_pos = (int(label_position[0] - wb_mode_icon.get_rect().width - 10),
                             int(self.surface.get_size()[1] * 0.95 - wb_mode_icon.get_rect().height//2))
         
 
-        self.surface.blit(label, label_position)        
-        self.surface.blit(wb_mode_icon, wb_mode_icon_pos)
+        rect = self.surface.blit(label, label_position)
+        return rect.union(self.surface.blit(wb_mode_icon, wb_mode_icon_pos))
         
     def set_white_balance(self, white_balance):
         self._white_balance = white_balance
-        self._update_preview_window()
+        self._update_hud('white_balance', self._update_white_balance)
         return white_balance
+
+    def _update_hud(self, name, update):
+        """Redraw only the given label of the preview window: the previous
+        label area is restored from the background, then the new label is
+        drawn (the display is updated by the main loop).
+        """
+        previous = self._hud_rects.get(name)
+        if not previous or self._current_foreground or not self._current_background\
+                or self._current_background.get_rect() != self.surface.get_rect():
+            return self._update_preview_window()  # Can not restore only a part
+
+        self._current_background.paint(self.surface, previous)
+        self._hud_rects[name] = update()
     
     def _update_preview_window(self):
         self._update_background(self._current_background)
         self._update_capture_number()
-        self._update_shutter_speed()
-        self._update_iso()
-        self._update_white_balance()
+        self._hud_rects['shutter_speed'] = self._update_shutter_speed()
+        self._hud_rects['iso'] = self._update_iso()
+        self._hud_rects['white_balance'] = self._update_white_balance()
         if self._current_foreground:
             self._update_foreground(*self._current_foreground)
         pygame.display.update()
@@ -408,6 +494,40 @@ class PiWindow(object):
             self._update_foreground(*self._current_foreground)
         pygame.display.update()
 
+    def set_debug_overlay(self, lines=None):
+        """Set the lines of text displayed on top of the window (the surface
+        is rendered once here, then only blitted by :py:meth:`draw_debug_overlay`).
+
+        :param lines: list of lines to display (None to hide the overlay)
+        :type lines: list
+        """
+        previous = self._debug_overlay
+        if not lines:
+            self._debug_overlay = None
+            if previous:
+                self.update()  # Area covered by the overlay is dirty
+            return
+
+        font = fonts.get_font(fonts.CURRENT, max(12, int(self.surface.get_size()[1] * 0.03)))
+        labels = [font.render(line, True, (255, 255, 255)) for line in lines]
+        width = max(label.get_rect().width for label in labels) + 10
+        height = sum(label.get_rect().height for label in labels) + 10
+        self._debug_overlay = pygame.Surface((width, height))
+        self._debug_overlay.fill((0, 0, 0))
+        y = 5
+        for label in labels:
+            self._debug_overlay.blit(label, (5, y))
+            y += label.get_rect().height
+        if previous and not self._debug_overlay.get_rect().contains(previous.get_rect()):
+            self.update()  # Overlay is smaller, the uncovered area is dirty
+
+    def draw_debug_overlay(self):
+        """Draw the debug overlay (if any) on the top-right corner of the window.
+        """
+        if self._debug_overlay:
+            rect = self._debug_overlay.get_rect(topright=self.surface.get_rect().topright)
+            self.surface.blit(self._debug_overlay, rect.topleft)
+
     def toggle_fullscreen(self):
         """Set window to full screen or initial size.
         """
@@ -424,10 +544,103 @@ class PiWindow(object):
 
         self.update()
 
+    def prepare_foreground(self, pil_image, pos=CENTER):
+        """Start computing the rendition of a PIL image displayed later at the
+        given position (for instance as soon as the final picture is built).
+
+        :param pil_image: image to display
+        :type pil_image: :py:class:`PIL.Image`
+        :param pos: position where the image will be displayed
+        :type pos: str
+
+        :return: future of the rendition
+        :rtype: :py:class:`concurrent.futures.Future`
+        """
+        self._purge_renditions()
+        key = (get_image_key(pil_image), self._get_foreground_size(pos))
+        if key not in self._renditions:
+            pil_image.load()  # Not from the rendition thread (lazy loading is not thread safe)
+            # The image is referenced by the executor only until rendered, the
+            # rendition is removed when the image is garbage collected (its
+            # ID can be reused)
+            self._renditions[key] = self._renditions_executor.submit(render_foreground, pil_image, key[1])
+            if key[0][0] == 'id':
+                weakref.finalize(pil_image, self._dead_renditions.append, key)
+            while len(self._renditions) > self.max_renditions:
+                _, future = self._renditions.popitem(last=False)
+                future.cancel()
+        return self._renditions[key]
+
+    def _purge_renditions(self):
+        """Remove the renditions of the garbage collected images.
+        """
+        while self._dead_renditions:
+            self._renditions.pop(self._dead_renditions.pop(), None)
+
+    def drop_renditions(self):
+        """Drop the prepared foreground renditions (for instance when a new
+        session starts).
+        """
+        for future in self._renditions.values():
+            future.cancel()
+        self._renditions.clear()
+        self._dead_renditions = []
+
+    def get_renditions(self):
+        """Return the list of the computed foreground renditions (buffer,
+        size, mode).
+        """
+        self._purge_renditions()
+        return [future.result() for future in self._renditions.values()
+                if future.done() and not future.cancelled() and not future.exception()]
+
+    def update_renditions(self):
+        """Replace the placeholder of the foreground by its rendition if it is
+        ready. Shall be called at each loop iteration.
+
+        :return: True if the window has been repainted
+        :rtype: bool
+        """
+        if not self._placeholder_shown or not self._current_foreground:
+            return False
+        pil_image, pos = self._current_foreground[:2]
+        rendition = self._renditions.get((get_image_key(pil_image), self._get_foreground_size(pos)))
+        if rendition and not rendition.done():
+            return False
+        self._update_foreground(*self._current_foreground)
+        return True
+
+    def get_pending_renditions(self):
+        """Return the number of foreground renditions not yet computed.
+        """
+        return len([future for future in self._renditions.values() if not future.done()])
+
+    def get_buffered_images(self):
+        """Return the list of buffered foreground images and backgrounds
+        (see :py:meth:`get_renditions` for the prepared renditions).
+        """
+        return list(self._buffered_images.values()) + self._foregrounds.values()
+
+    def drop_unused_images(self):
+        """Drop the buffered images which are not currently displayed.
+        """
+        pil_image = self._current_foreground[0] if self._current_foreground else None
+        for key, value in list(self._buffered_images.items()):
+            if value is not self._current_background:
+                del self._buffered_images[key]
+        self._foregrounds.keep_only(pil_image)
+        foreground = get_image_key(pil_image) if pil_image is not None else None
+        for key in list(self._renditions):
+            if key[0] != foreground:
+                self._renditions.pop(key).cancel()
+
     def drop_cache(self):
         """Drop all cached background and foreground to force
         refreshing the view.
         """
         self._current_background = None
-        self._current_foreground = None
-        self._buffered_images = {}
\ No newline at end of file
+        self._clear_foreground()
+        self._buffered_images = {}
+        self._hud_rects = {}
+        self._foregrounds.clear()
+        self.drop_renditions()
\ No newline at end of file
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+
+"""Pibooth files writing.
+"""
+
+import io
+import os
+import time
+import queue
+import threading
+import os.path as osp
+from PIL import Image
+from pibooth.utils import LOGGER, LatencyHistogram
+from pibooth.tracing import TRACER
+
+
+class FileWriter(object):
+
+    """Write the files of the booth from a background thread to not block
+    the UI on a slow storage. Operations are done in the order they are
+    queued.
+
+    The durability policy ``sync`` can be:
+
+    - ``always``: each file (and its directory) is synchronized on disk
+    - ``idle``: all files are synchronized on disk when the queue is empty
+    - ``never``: let the system synchronize the files
+
+    :attr max_pending: maximum number of queued operations, queuing blocks
+                       when reached
+    :type max_pending: int
+    :attr latency: time to write a file (including synchronization)
+    :type latency: :py:class:`pibooth.utils.LatencyHistogram`
+    """
+
+    POLICIES = ('always', 'idle', 'never')
+
+    max_pending = 16
+
+    def __init__(self, sync='idle'):
+        self.sync = sync
+        self.latency = LatencyHistogram()
+        self._queue = queue.Queue(self.max_pending)
+        self._cond = threading.Condition()
+        self._pending = {}  # {filename: number of queued operations}
+        self._callbacks = {}  # {filename: [callbacks]}
+        self._listeners = []
+        self._unsynced = 0
+        self._stats = {'written': 0, 'renamed': 0, 'failed': 0, 'synced': 0, 'blocked': 0, 'max_depth': 0}
+        self._worker = None
+        self._trace_id = None  # Trace of the operation in progress (worker thread)
+
+    @property
+    def sync(self):
+        return self._sync
+
+    @sync.setter
+    def sync(self, value):
+        if value not in self.POLICIES:
+            raise ValueError("Invalid write synchronization policy '{}' (should be one of {})".format(
+                value, ', '.join(self.POLICIES)))
+        self._sync = value
+
+    def _fsync(self, filename):
+        """Synchronize the given file and its directory on disk.
+        """
+        for path in (filename, osp.dirname(filename)):
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except OSError:
+                continue  # Directory can not be opened on this platform
+            try:
+                os.fsync(fd)
+            except OSError:
+                pass
+            finally:
+                os.close(fd)
+
+    def _run(self):
+        """Worker thread executing the queued operations.
+        """
+        while True:
+            if self.sync == 'idle' and self._unsynced and self._queue.empty():
+                os.sync()
+                self._unsynced = 0
+                self._stats['synced'] += 1
+            item = self._queue.get()
+            if item is None:
+                break
+
+            filename, operation, args, self._trace_id = item
+            start = time.time()
+            try:
+                dirname = osp.dirname(filename)
+                if not osp.isdir(dirname):
+                    os.makedirs(dirname)
+                written = operation(*args)
+                if self.sync == 'always':
+                    with TRACER.span('fsync', self._trace_id, file=osp.basename(filename)):
+                        self._fsync(filename)
+                    self._stats['synced'] += 1
+                else:
+                    self._unsynced += 1
+            except Exception as ex:  # pylint: disable=broad-except
+                self._stats['failed'] += 1
+                LOGGER.error("Can not write '%s': %s", filename, ex)
+            else:
+                self.latency.add(time.time() - start)
+                LOGGER.debug("File '%s' written in %0.3f seconds", filename, time.time() - start)
+                if operation != self._rename:  # A renamed file is already known
+                    for path in written if isinstance(written, list) else [filename]:
+                        self._notify(path)
+            self._done(filename)
+
+        if self.sync != 'never' and self._unsynced:
+            os.sync()
+
+    def _notify(self, filename):
+        """Call the listeners for the given saved file.
+        """
+        for listener in self._listeners:
+            try:
+                listener(filename)
+            except Exception as ex:  # pylint: disable=broad-except
+                LOGGER.warning("Listener of '%s' writing failed: %s", filename, ex)
+
+    def _done(self, filename):
+        """Called when an operation on the given file is finished.
+        """
+        while True:
+            with self._cond:
+                if self._pending[filename] > 1 or not self._callbacks.get(filename):
+                    # Waiters are notified once the callbacks are done
+                    self._pending[filename] -= 1
+                    if not self._pending[filename]:
+                        del self._pending[filename]
+                        self._callbacks.pop(filename, None)
+                    self._cond.notify_all()
+                    return
+                callbacks = self._callbacks.pop(filename)
+            for callback in callbacks:
+                try:
+                    callback()
+                except Exception as ex:  # pylint: disable=broad-except
+                    LOGGER.warning("Callback after writing '%s' failed: %s", filename, ex)
+
+    def _put(self, filename, operation, *args):
+        """Queue an operation which writes the given file.
+        """
+        if not self._worker:
+            self._worker = threading.Thread(target=self._run, name='FileWriter', daemon=True)
+            self._worker.start()
+        filename = osp.abspath(filename)
+        with self._cond:
+            self._pending[filename] = self._pending.get(filename, 0) + 1
+        if self._queue.full():
+            self._stats['blocked'] += 1
+            LOGGER.warning("Files writing is too slow, wait for %s pending files", self._queue.qsize())
+        self._queue.put((filename, operation, args, TRACER.trace_id))
+        self._stats['max_depth'] = max(self._stats['max_depth'], self._queue.qsize())
+
+    def _save_image(self, image, filename, params):
+        if not TRACER.enabled:
+            image.save(filename, **params)
+        else:
+            # Encode then write to measure both steps
+            name = osp.basename(filename)
+            with TRACER.span('encode', self._trace_id, file=name):
+                data = io.BytesIO()
+                image.save(data, Image.registered_extensions()[osp.splitext(filename)[1].lower()], **params)
+            with TRACER.span('write', self._trace_id, file=name, bytes=data.tell()):
+                with io.open(filename, 'wb') as fp:
+                    fp.write(data.getbuffer())
+        self._stats['written'] += 1
+
+    def _rename(self, src, dst):
+        os.rename(src, dst)
+        self._stats['renamed'] += 1
+
+    def save_image(self, image, filename, **params):
+        """Queue the saving of a PIL image (the image shall not be modified
+        until it is written). The parent directory is created if necessary.
+
+        :param image: image to save
+        :type image: :py:class:`PIL.Image`
+        :param filename: path to the file
+        :type filename: str
+        :param params: parameters passed to :py:meth:`PIL.Image.save`
+        """
+        self._put(filename, self._save_image, image, filename, params)
+
+    def rename(self, src, dst):
+        """Queue the renaming of a file (done after the pending writing of
+        the source file). The parent directory is created if necessary.
+        """
+        self._put(dst, self._rename, src, dst)
+
+    def write(self, filename, function, *args):
+        """Queue a function writing the given file (for instance a file
+        derived from a previously queued one). The function is called with
+        the given arguments from the writer thread, it may return the list
+        of the written files (notified to the listeners instead of the given
+        file).
+        """
+        self._put(filename, function, *args)
+
+    def add_listener(self, listener):
+        """Call the given listener (with the file path as argument) after
+        each file written (but not renamed). The listener is called from
+        the writer thread.
+        """
+        self._listeners.append(listener)
+
+    def when_written(self, filename, callback):
+        """Call the given callback (without argument) when there is no more
+        pending operations on the given file. The callback is called from
+        the writer thread, or immediately if nothing is pending.
+        """
+        filename = osp.abspath(filename)
+        with self._cond:
+            if filename in self._pending:
+                self._callbacks.setdefault(filename, []).append(callback)
+                return
+        callback()
+
+    def wait(self, filename=None, timeout=None):
+        """Block until the pending operations on the given file (or all files
+        if None) are done. Return False on timeout.
+        """
+        if filename:
+            filename = osp.abspath(filename)
+        with self._cond:
+            return self._cond.wait_for(lambda: filename not in self._pending if filename else not self._pending,
+                                       timeout)
+
+    def get_queue_depth(self):
+        """Return the number of pending operations.
+        """
+        return self._queue.qsize()
+
+    def is_congested(self):
+        """Return True if the writing is late (more than 3/4 of the queue is
+        used), new sessions should not be started.
+        """
+        return self._queue.qsize() >= self.max_pending * 3 // 4
+
+    def get_statistics(self):
+        """Return a dictionary (JSON serializable) with the writing metrics.
+        """
+        stats = dict(self._stats, depth=self.get_queue_depth())
+        stats['latency'] = self.latency.to_dict()
+        return stats
+
+    def quit(self):
+        """Write the pending files and stop the writer thread.
+        """
+        if self._worker:
+            self._queue.put(None)
+            self._worker.join()
+            self._worker = None
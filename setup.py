@@ -85,6 +85,7 @@ def main():
         zip_safe=False,  # Don't install the lib as an .egg zipfile
         entry_points={'console_scripts': ["pibooth = pibooth.booth:main",
                                           "pibooth-count = pibooth.scripts.count:main",
+                                          "pibooth-catalog = pibooth.scripts.catalog:main",
                                           "pibooth-diag = pibooth.scripts.diagnostic:main",
                                           "pibooth-fonts = pibooth.scripts.fonts:main",
                                           "pibooth-regen = pibooth.scripts.regenerate:main",
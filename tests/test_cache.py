@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+
+import gc
+import pygame
+from PIL import Image
+from pibooth.view.cache import SurfaceCache, get_image_key
+
+
+def test_file_key(tmpdir):
+    filename = str(tmpdir.join('picture.jpg'))
+    Image.new('RGB', (10, 10)).save(filename)
+    assert get_image_key(Image.open(filename)) == get_image_key(Image.open(filename))
+
+
+def test_lru():
+    cache = SurfaceCache(2)
+    images = [Image.new('RGB', (10, 10)) for _ in range(3)]
+    for image in images:
+        cache.put(image, (5, 5), pygame.Surface((5, 5)))
+    assert len(cache) == 2
+    assert cache.get(images[0], (5, 5)) is None
+    assert cache.get(images[2], (5, 5)) is not None
+    assert cache.get(images[2], (6, 6)) is None
+
+
+def test_garbage_collected_image():
+    cache = SurfaceCache()
+    image = Image.new('RGB', (10, 10))
+    cache.put(image, (5, 5), pygame.Surface((5, 5)))
+    del image
+    gc.collect()
+    assert cache.values() == []
@@ -32,3 +32,109 @@ def test_hybridr_capture(camera_rpi_gp):
 def test_hybridc_capture(camera_cv_gp):
     camera_cv_gp.capture()
     assert camera_cv_gp.get_captures()
+
+
+class FakeCamera(object):
+
+    closed = []
+
+    def __init__(self, *proxies):
+        self.proxies = proxies
+
+    def quit(self):
+        self.closed.extend(self.proxies)
+
+
+@pytest.fixture
+def fake_backends(monkeypatch):
+    from pibooth.camera import rpi, gphoto, opencv, hybrid
+    probed = []
+
+    def get_proxy(backend, detected):
+        def probe(port=None):
+            probed.append((backend, port))
+            if port is None or port == detected:
+                return '{}:{}'.format(backend, detected) if detected is not None else None
+            return None
+        return probe
+
+    FakeCamera.closed = []
+    for module, name in ((rpi, 'RpiCamera'), (gphoto, 'GpCamera'), (opencv, 'CvCamera'),
+                         (hybrid, 'HybridRpiCamera'), (hybrid, 'HybridCvCamera')):
+        monkeypatch.setattr(module, name, FakeCamera)
+    monkeypatch.setattr(rpi, 'get_rpi_camera_proxy', get_proxy('rpi', None))
+    monkeypatch.setattr(gphoto, 'get_gp_camera_proxy', get_proxy('gphoto', None))
+    monkeypatch.setattr(opencv, 'get_cv_camera_proxy', get_proxy('opencv', 1))
+    return probed
+
+
+def test_find_camera_cached(tmpdir, fake_backends):
+    from pibooth import camera
+    filename = str(tmpdir.join('camera.json'))
+
+    cam = camera.find_camera(filename)
+    assert cam.proxies == ('opencv:1',)
+    assert ('opencv', 0) in fake_backends and ('rpi', None) in fake_backends
+
+    del fake_backends[:]
+    cam = camera.find_camera(filename)
+    assert cam.proxies == ('opencv:1',)
+    # Last camera found probed on its port, better cameras are searched
+    assert sorted(fake_backends) == [('gphoto', None), ('opencv', 1), ('rpi', None)]
+    assert [name for name in os.listdir(str(tmpdir)) if name.endswith('.tmp')] == []
+
+
+def test_find_camera_cached_best(tmpdir, fake_backends, monkeypatch):
+    from pibooth import camera
+    from pibooth.camera import rpi, gphoto
+    filename = str(tmpdir.join('camera.json'))
+    monkeypatch.setattr(rpi, 'get_rpi_camera_proxy', lambda port=None: fake_backends.append(('rpi', port)) or 'rpi:0')
+    monkeypatch.setattr(gphoto, 'get_gp_camera_proxy', lambda port=None: fake_backends.append(('gphoto', port)) or 'gphoto:0')
+
+    cam = camera.find_camera(filename)
+    assert cam.proxies == ('rpi:0', 'gphoto:0')
+
+    del fake_backends[:]
+    cam = camera.find_camera(filename)
+    assert cam.proxies == ('rpi:0', 'gphoto:0')
+    assert ('opencv', None) not in fake_backends  # Highest priority, only last camera found is probed
+
+
+def test_find_camera_better_connected(tmpdir, fake_backends, monkeypatch):
+    from pibooth import camera
+    from pibooth.camera import gphoto
+    filename = str(tmpdir.join('camera.json'))
+    tmpdir.join('camera.json').write('{"opencv": 1}')
+    monkeypatch.setattr(gphoto, 'get_gp_camera_proxy', lambda port=None: 'gphoto:0')
+
+    cam = camera.find_camera(filename)
+    assert cam.proxies == ('opencv:1', 'gphoto:0')
+    assert ('opencv', 0) not in fake_backends  # Cached port reused
+    assert tmpdir.join('camera.json').read() == '{"opencv": 1, "gphoto": null}'
+
+
+def test_find_camera_cache_outdated(tmpdir, fake_backends):
+    from pibooth import camera
+    filename = str(tmpdir.join('camera.json'))
+    tmpdir.join('camera.json').write('{"gphoto": "usb:001,004"}')
+
+    cam = camera.find_camera(filename)
+    assert cam.proxies == ('opencv:1',)
+    assert ('gphoto', 'usb:001,004') in fake_backends
+    assert tmpdir.join('camera.json').read() == '{"opencv": 1}'
+
+
+def test_find_camera_timeout(monkeypatch, fake_backends):
+    import time
+    from pibooth import camera
+    from pibooth.camera import rpi
+
+    def slow_probe(port=None):
+        time.sleep(0.3)
+        return 'rpi:0'
+
+    monkeypatch.setattr(rpi, 'get_rpi_camera_proxy', slow_probe)
+    cam = camera.find_camera(timeout=0.1)
+    assert cam.proxies == ('opencv:1',)
+    time.sleep(0.4)
+    assert FakeCamera.closed == ['rpi:0']  # Closed when found too late
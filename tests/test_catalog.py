@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+import os
+import pytest
+from pibooth.catalog import SessionCatalog, get_session_time
+
+
+@pytest.fixture(params=[True, False], ids=['threaded', 'synchronous'])
+def catalog(tmpdir, request):
+    catalog = SessionCatalog(str(tmpdir.join('sessions.db')), request.param)
+    yield catalog
+    catalog.close()
+
+
+def test_add_session(catalog):
+    captures = ['/tmp/raw/2026-01-01-10-00-00/pibooth{:03}.jpg'.format(i) for i in range(4)]
+    catalog.add_session('2026-01-01-10-00-00', 0, captures, ['/tmp/2026-01-01-10-00-00_pibooth.jpg'], 1.5)
+    session = catalog.get_session('2026-01-01-10-00-00')
+    assert session['captures'] == 4
+    assert session['layout'] == 0
+    assert session['captures_files'] == captures
+    assert session['start_time'] == get_session_time('2026-01-01-10-00-00')
+
+
+def test_print_and_forget(catalog):
+    catalog.add_session('2026-01-01-10-00-00', 1, ['a.jpg'], ['/tmp/2026-01-01-10-00-00_pibooth.jpg'])
+    catalog.add_session('2026-01-01-11-00-00', 1, ['b.jpg'], ['/tmp/2026-01-01-11-00-00_pibooth.jpg'])
+    catalog.add_print('/tmp/2026-01-01-10-00-00_pibooth.jpg')
+    catalog.add_print('/tmp/2026-01-01-10-00-00_pibooth.jpg')
+    catalog.set_forgotten('2026-01-01-11-00-00', ['/tmp/forget/2026-01-01-11-00-00_pibooth.jpg'])
+
+    assert [s['session_id'] for s in catalog.get_sessions(printed=True)] == ['2026-01-01-10-00-00']
+    assert [s['session_id'] for s in catalog.get_sessions(forgotten=True)] == ['2026-01-01-11-00-00']
+    assert catalog.get_sessions(start=get_session_time('2026-01-01-10-30-00'))[0]['printed'] == 0
+    assert catalog.get_statistics()['printed'] == 2
+
+
+def test_rebuild(catalog, tmpdir):
+    savedir = tmpdir.mkdir('pictures')
+    raw = savedir.mkdir('raw')
+    for session_id in ('2026-01-01-10-00-00', '2026-01-01-11-00-00'):
+        rawdir = raw.mkdir(session_id)
+        for i in range(4):
+            rawdir.join('pibooth{:03}.jpg'.format(i)).write('')
+    savedir.join('2026-01-01-10-00-00_pibooth.jpg').write('')
+    savedir.mkdir('forget').join('2026-01-01-11-00-00_pibooth.jpg').write('')
+
+    catalog.add_session('2026-01-01-10-00-00', 0, [], [str(savedir.join('2026-01-01-10-00-00_pibooth.jpg'))])
+    catalog.add_print(str(savedir.join('2026-01-01-10-00-00_pibooth.jpg')))
+
+    assert catalog.rebuild([str(savedir)]) == 2
+    sessions = catalog.get_sessions()
+    assert [s['layout'] for s in sessions] == [0, 0]
+    assert [s['printed'] for s in sessions] == [1, 0]
+    assert [s['forgotten'] for s in sessions] == [0, 1]
+    assert os.path.basename(sessions[1]['final_file']) == '2026-01-01-11-00-00_pibooth.jpg'
+
+
+def test_close_commits_queued(tmpdir):
+    catalog = SessionCatalog(str(tmpdir.join('sessions.db')))
+    for i in range(20):
+        catalog.add_session('2026-01-01-10-00-{:02}'.format(i), 1, ['a.jpg'])
+    catalog.close()
+
+    catalog = SessionCatalog(str(tmpdir.join('sessions.db')), threaded=False)
+    assert catalog.get_statistics()['sessions'] == 20
+    catalog.close()
@@ -2,6 +2,7 @@
 
 import os.path as osp
 import pytest
+from pibooth.config.parser import PiConfigParser
 
 
 def test_join_path_to_config_directory(cfg):
@@ -65,3 +66,23 @@ def test_string_list_extended(cfg):
     assert cfg.gettuple('PICTURE', 'overlays', str, 1) == ('',)
     assert cfg.gettuple('PICTURE', 'backgrounds', str) == ('fond1.jpg', 'fond2.jpg')
     assert cfg.gettuple('PICTURE', 'backgrounds', str, 3) == ('fond1.jpg', 'fond2.jpg', 'fond2.jpg')
+
+
+def test_typed_snapshot(cfg_path):
+    cfg = PiConfigParser(cfg_path, None)
+    assert cfg.gettuple('PICTURE', 'text_colors', 'color') == ((0, 0, 0), (234, 45, 2))
+    avoided = cfg.parsing_avoided
+    assert cfg.gettuple('PICTURE', 'text_colors', 'color') == ((0, 0, 0), (234, 45, 2))
+    assert cfg.parsing_avoided == avoided + 1
+
+
+def test_typed_snapshot_invalidated(cfg_path):
+    cfg = PiConfigParser(cfg_path, None)
+    assert cfg.getint('CONTROLS', 'picture_btn_pin') == 11
+    assert cfg.gettyped('WINDOW', 'text_color') == (255, 255, 255)
+    cfg.set('CONTROLS', 'picture_btn_pin', '12')
+    cfg.set('WINDOW', 'text_color', '(0, 0, 0)')
+    assert cfg.getint('CONTROLS', 'picture_btn_pin') == 12
+    assert cfg.gettyped('WINDOW', 'text_color') == (0, 0, 0)
+    cfg.load()
+    assert cfg.getint('CONTROLS', 'picture_btn_pin') == 11
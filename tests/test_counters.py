@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 
+import time
 import pytest
+from pibooth.counters import Counters
 
 
 def test_iter(counters):
@@ -44,3 +46,25 @@ def test_save(counters):
     counters.reset()
     counters.load()
     assert counters.nbr_printed == 0
+
+
+def test_write_behind(counters):
+    counters.nbr_printed = 3
+    assert Counters(counters.filename, nbr_printed=0).nbr_printed == 0
+    counters.flush()
+    assert Counters(counters.filename, nbr_printed=0).nbr_printed == 3
+
+
+def test_flush_delay(counters):
+    counters.flush_delay = 0.05
+    counters.nbr_printed = 4
+    time.sleep(0.5)
+    assert Counters(counters.filename, nbr_printed=0).nbr_printed == 4
+
+
+def test_flush_soon(counters):
+    counters.flush_delay = 60
+    counters.nbr_printed = 5
+    counters.flush_soon()
+    time.sleep(0.2)
+    assert Counters(counters.filename, nbr_printed=0).nbr_printed == 5
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+
+import pygame
+from pibooth import fonts
+
+
+def test_font_shared():
+    pygame.font.init()
+    assert fonts.get_font(fonts.CURRENT, 20) is fonts.get_font(fonts.CURRENT, 20)
+
+
+def test_text_surface_shared():
+    pygame.font.init()
+    label = fonts.render_text('auto', fonts.CURRENT, 20, [255, 255, 255])
+    assert fonts.render_text('auto', fonts.CURRENT, 20, (255, 255, 255)) is label
+    assert fonts.render_text('auto', fonts.CURRENT, 20, (0, 0, 0)) is not label
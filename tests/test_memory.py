@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+from PIL import Image
+from pibooth.memory import MemoryBudget, get_memory_size, reduce_image
+
+
+def test_memory_size():
+    image = Image.new('RGB', (100, 50))
+    assert get_memory_size(image) == 15000
+    assert get_memory_size([image, None, (image,)]) == 30000
+    assert get_memory_size({'a': b'1234'}) == 4
+
+
+def test_reduce_image():
+    image = Image.new('RGB', (1600, 1200))
+    assert reduce_image(image, (800, 480)).size == (640, 480)
+    small = Image.new('RGB', (80, 40))
+    assert reduce_image(small, (800, 480)) is small
+
+
+def test_check_downgrade_order():
+    holders = {'first': Image.new('RGB', (1000, 1000)), 'second': Image.new('RGB', (1000, 1000))}
+
+    def downgrade(name):
+        def func(size):
+            holders[name] = reduce_image(holders[name], size)
+        return func
+
+    memory = MemoryBudget(0, (100, 100))
+    memory.register('first', lambda: holders['first'], downgrade('first'))
+    memory.register('second', lambda: holders['second'], downgrade('second'))
+    assert memory.check() == 6000000
+
+    memory.budget = 5 * 1000 * 1000
+    assert memory.check() == 3000000 + 30000
+    assert holders['first'].size == (100, 100)
+    assert holders['second'].size == (1000, 1000)
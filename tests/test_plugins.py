@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import pibooth
+from pibooth.plugins import monitor, create_plugin_manager
+
+
+class FakeClock(object):
+
+    """Clock advanced by the plugins instead of sleeping (the measures
+    do not depend on the load of the machine).
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def perf_counter(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+CLOCK = FakeClock()
+
+
+class SlowPlugin(object):
+
+    name = 'slow'
+
+    @pibooth.hookimpl
+    def state_wait_do(self, cfg, app, win, events):
+        CLOCK.sleep(0.01)
+
+    @pibooth.hookimpl(hookwrapper=True)
+    def pibooth_setup_picture_factory(self, cfg, opt_index, factory):
+        CLOCK.sleep(0.01)
+        outcome = yield
+        outcome.force_result(factory * 2)
+
+
+class FastPlugin(object):
+
+    name = 'fast'
+
+    @pibooth.hookimpl
+    def state_wait_do(self, cfg, app, win, events):
+        pass
+
+    @pibooth.hookimpl
+    def pibooth_setup_picture_factory(self, cfg, opt_index, factory):
+        CLOCK.sleep(0.02)
+        return factory
+
+
+@pytest.fixture
+def plugin_manager(monkeypatch):
+    monkeypatch.setattr(monitor, 'time', CLOCK)
+    pm = create_plugin_manager()
+    pm.register(SlowPlugin(), 'slow')
+    pm.enable_monitoring()
+    pm.register(FastPlugin(), 'fast')  # Registered after monitoring enabled
+    return pm
+
+
+def test_monitoring_per_plugin(plugin_manager):
+    plugin_manager.hook.state_wait_do(cfg=None, app=None, win=None, events=[])
+    stats = plugin_manager.monitor.get_statistics()
+    assert stats['state_wait_do']['count'] == 1
+    assert stats['state_wait_do']['plugins']['slow']['max'] == pytest.approx(0.01)
+    assert stats['state_wait_do']['plugins']['fast']['max'] == 0
+
+
+def test_monitoring_hookwrapper(plugin_manager):
+    result = plugin_manager.hook.pibooth_setup_picture_factory(cfg=None, opt_index=0, factory=3)
+    assert result == 6
+    slowest = plugin_manager.monitor.get_slowest(1)
+    assert slowest[0][:2] == ('pibooth_setup_picture_factory', 'fast')
+    wrapper = plugin_manager.monitor.impls[('pibooth_setup_picture_factory', 'slow')]
+    assert wrapper.max == pytest.approx(0.01)  # Time spent in 'fast' is excluded
+
+
+def test_monitoring_disabled(plugin_manager):
+    plugin_manager.enable_monitoring(False)
+    plugin_manager.hook.state_wait_do(cfg=None, app=None, win=None, events=[])
+    assert plugin_manager.monitor.get_statistics() == {}
+    for _, hookimpl in plugin_manager._iter_hookimpls():
+        assert not getattr(hookimpl.function, 'monitored', False)
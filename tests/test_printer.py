@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import threading
+import pytest
+from PIL import Image
+from pibooth.counters import Counters
+from pibooth.printer import Printer, PrintJob, PrinterEvent, SimulatedPrinterBackend
+
+
+def wait_for(predicate, timeout=2):
+    end = time.time() + timeout
+    while not predicate() and time.time() < end:
+        time.sleep(0.005)
+    return predicate()
+
+
+@pytest.fixture
+def picture(tmpdir):
+    filename = str(tmpdir.join('picture.jpg'))
+    Image.new('RGB', (200, 300), (255, 0, 0)).save(filename)
+    return filename
+
+
+@pytest.fixture
+def picture2(tmpdir):
+    filename = str(tmpdir.join('picture2.jpg'))
+    Image.new('RGB', (200, 300), (0, 0, 255)).save(filename)
+    return filename
+
+
+@pytest.fixture
+def simulator():
+    backend = SimulatedPrinterBackend(page_time=0.01)
+    yield backend
+    backend.quit()
+
+
+@pytest.fixture
+def sending(simulator, monkeypatch):
+    """Event to set to let the simulator accept the files.
+    """
+    event = threading.Event()
+    print_file = simulator.print_file
+
+    def blocked_print_file(*args):
+        event.wait(2)
+        return print_file(*args)
+
+    monkeypatch.setattr(simulator, 'print_file', blocked_print_file)
+    yield event
+    event.set()
+
+
+@pytest.fixture
+def printer(simulator, tmpdir):
+    counters = Counters(str(tmpdir.join('counters.pickle')), printed=0)
+    printer = Printer('simulator', -1, {}, counters, backend=simulator)
+    printer.cache_dir = str(tmpdir.join('sheets'))
+    printer.retry_delay = 0.01
+    yield printer
+    printer.quit()
+
+
+def test_print_file(printer, simulator, picture):
+    jobs = [printer.print_file(picture) for _ in range(3)]
+    for job in jobs:
+        assert job.wait(2)
+        assert job.status == PrintJob.SENT
+    assert simulator.wait_idle(2)
+    assert simulator.get_statistics()['completed'] == 3
+    assert printer.get_tasks_number() == 0
+
+
+def test_print_file_retry(printer, simulator, picture):
+    simulator.submit_failures = 2
+    job = printer.print_file(picture)
+    assert job.wait(2)
+    assert job.status == PrintJob.SENT
+    assert job.attempts == 3
+    assert printer.get_statistics()['retries'] == 2
+
+
+def test_print_file_failed(printer, simulator, picture):
+    simulator.submit_failures = printer.max_retries + 1
+    job = printer.print_file(picture)
+    assert job.wait(2)
+    assert job.status == PrintJob.FAILED
+    assert isinstance(job.error, IOError)
+    assert job.attempts == printer.max_retries + 1
+    stats = printer.get_statistics()
+    assert stats['failed'] == 1 and stats['sent'] == 0
+
+
+def test_print_file_not_blocking(printer, sending, picture):
+    job = printer.print_file(picture)  # Returns while the file is being sent
+    assert not job.is_done()
+    sending.set()
+    assert job.wait(2)
+    assert job.status == PrintJob.SENT
+
+
+def test_printer_out_of_paper(printer, simulator, picture):
+    simulator.paper = 2
+    for _ in range(3):
+        printer.print_file(picture).wait(2)
+    assert simulator.wait_idle(2)
+    assert simulator.get_statistics()['stopped']
+    time.sleep(0.05)  # Let the event callbacks finish
+    assert printer.get_tasks_number() == 1
+
+    simulator.refill()
+    assert simulator.wait_idle(2)
+    assert simulator.get_statistics()['completed'] == 3
+
+
+def test_tasks_from_events(printer, simulator, picture, monkeypatch):
+    def get_jobs(*args):
+        raise AssertionError("CUPS server requested")
+
+    monkeypatch.setattr(simulator, 'get_jobs', get_jobs)
+    simulator.paper = 0  # Keep the job in the queue
+    assert printer.print_file(picture).wait(2)
+    assert wait_for(lambda: printer.get_tasks_number() == 1)
+    simulator.refill()
+    assert simulator.wait_idle(2)
+    assert wait_for(lambda: printer.get_tasks_number() == 0)
+
+
+def test_tasks_resync_on_events_gap(printer, simulator, picture):
+    simulator.paper = 0  # Keep the job in the queue
+    assert printer.print_file(picture).wait(2)
+    assert wait_for(lambda: printer.get_tasks_number() == 1)
+    # Event of an unknown job received after lost events
+    printer._on_event(PrinterEvent(simulator._last_guid + 5, "simulator-99 processing"))
+    assert wait_for(lambda: printer.get_tasks_number() == 1)  # Table rebuilt from the server
+
+
+def test_ganging(printer, simulator, picture, picture2):
+    printer.ganging_delay = 1
+    job1 = printer.print_file(picture)
+    job2 = printer.print_file(picture2)
+    assert job1.wait(2) and job2.wait(2)
+    assert job1.job_id == job2.job_id
+    assert simulator.get_statistics()['submitted'] == 1
+    assert printer.count.printed == 1
+
+
+def test_ganging_same_file(printer, simulator, picture):
+    printer.ganging_delay = 1
+    start = time.time()
+    job1 = printer.print_file(picture)
+    job2 = printer.print_file(picture)
+    assert job1.wait(2) and job2.wait(2)
+    assert time.time() - start < 0.5  # First copy not held
+    assert job1.job_id != job2.job_id
+    assert simulator.get_statistics()['submitted'] == 2
+    assert printer.count.printed == 2
+
+
+def test_ganging_timeout(printer, simulator, picture):
+    printer.ganging_delay = 0.3
+    job = printer.print_file(picture)
+    assert wait_for(lambda: printer._held)
+    assert not job.is_done()  # Waiting for a picture to share the page
+    assert job.wait(2)
+    assert job.status == PrintJob.SENT
+    assert simulator.get_statistics()['submitted'] == 1
+    assert printer.get_statistics()['ganged'] == 0
+
+
+def test_ganging_several_copies(printer, simulator, picture):
+    printer.ganging_delay = 5
+    job = printer.print_file(picture, 2)
+    assert job.wait(2)  # Not held, the page is already full
+    assert job.status == PrintJob.SENT
+    assert not job.ganged
+
+
+def test_sheet_cache(printer, picture):
+    for _ in range(2):
+        printer.print_file(picture, 4).wait(2)
+    stats = printer.get_statistics()
+    assert stats['sheets_built'] == 1
+    assert stats['sheets_reused'] == 1
+
+
+def test_cancel_queued_jobs(printer, simulator, picture):
+    printer.retry_delay = 0.2
+    simulator.submit_failures = 1  # Keep the worker busy with the first job
+    first = printer.print_file(picture)
+    assert wait_for(lambda: first.attempts > 0)
+    jobs = [printer.print_file(picture) for _ in range(2)]
+    printer.cancel_all_tasks()
+    for job in jobs:
+        assert job.wait(2)
+        assert job.status == PrintJob.CANCELED
+    assert first.wait(2)
+    assert first.status == PrintJob.SENT
+    assert simulator.get_statistics()['submitted'] == 1
+    assert printer.get_statistics()['canceled'] == 2
+
+
+def test_cancel_held_job(printer, simulator, picture):
+    printer.ganging_delay = 5
+    job = printer.print_file(picture)
+    assert wait_for(lambda: printer._held)
+    printer.cancel_all_tasks()
+    assert job.wait(1)
+    assert job.status == PrintJob.CANCELED
+    assert simulator.get_statistics()['submitted'] == 0
+
+
+def test_sheet_prepared(printer, picture):
+    printer.prepare_file(picture, 4)
+    printer.print_file(picture, 4).wait(2)
+    stats = printer.get_statistics()
+    assert stats['sheets_built'] == 1
+    assert stats['sheets_reused'] == 1
+
+
+def test_sheet_cache_outdated(printer, picture):
+    printer.print_file(picture, 2).wait(2)
+    stat = os.stat(picture)
+    os.utime(picture, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))  # File modified
+    printer.print_file(picture, 2).wait(2)
+    assert printer.get_statistics()['sheets_built'] == 2
+    assert len(os.listdir(printer.cache_dir)) == 1  # Previous version removed
+
+
+def test_sheet_cache_bounded(printer, tmpdir):
+    printer.max_cached_sheets = 2
+    for index in range(4):
+        filename = str(tmpdir.join('picture{}.jpg'.format(index)))
+        Image.new('RGB', (200, 300), (index * 50, 0, 0)).save(filename)
+        printer.print_file(filename, 2).wait(2)
+    assert len(os.listdir(printer.cache_dir)) == 2
+
+
+def test_max_pages_with_queued_jobs(printer, sending, picture):
+    printer.max_pages = 2
+    jobs = []
+    while printer.is_ready() and len(jobs) < 5:
+        jobs.append(printer.print_file(picture))
+    assert len(jobs) == 2  # Pages counted before being sent
+    assert printer.count.printed == 2
+    sending.set()
+    for job in jobs:
+        assert job.wait(2)
+    assert printer.count.printed == 2
+
+
+def test_reserved_page_released(printer, simulator, picture):
+    printer.reserve_page()
+    assert printer.count.printed == 1
+    with pytest.raises(IOError):
+        printer.print_file(picture + '.missing', reserved=True)
+    assert printer.count.printed == 0
+
+    printer.reserve_page()
+    simulator.submit_failures = printer.max_retries + 1
+    assert printer.print_file(picture, reserved=True).wait(2)
+    assert printer.count.printed == 0
+
+
+def test_print_file_after_quit(printer, simulator, picture):
+    printer.quit()
+    printer.reserve_page()
+    job = printer.print_file(picture, reserved=True)
+    assert job.status == PrintJob.CANCELED
+    assert printer.count.printed == 0
+    assert printer._worker is None  # Not restarted
+    assert simulator.get_statistics()['submitted'] == 0
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import subprocess
+from pibooth.profiler import StartupProfiler
+
+
+def test_profile_imports_and_phases():
+    profiler = StartupProfiler()
+    profiler.mark('ignored')
+    assert not profiler.enabled
+
+    sys.modules.pop('colorsys', None)
+    profiler.start()
+    import colorsys  # noqa: F401
+    import os  # noqa: F401 (already loaded, not recorded)
+    profiler.mark('imports')
+    profiler.mark('phase')
+    profiler.report()
+
+    assert 'colorsys' in profiler.imports
+    assert 'os' not in profiler.imports
+    cumulative, own = profiler.imports['colorsys']
+    assert cumulative >= own >= 0
+    assert [phase for phase, _ in profiler.get_phases()] == ['imports', 'phase']
+
+    profiler.mark('after_report')
+    assert not profiler.enabled
+    assert len(profiler.phases) == 2
+
+
+def test_scripts_imports():
+    code = "import sys, pibooth.scripts.count, pibooth.scripts.regenerate;"\
+        "print(' '.join(name for name in ('cv2', 'numpy') if name in sys.modules))"
+    output = subprocess.check_output([sys.executable, '-c', code])
+    assert output.strip() == b''  # Camera and OpenCV factory modules not loaded
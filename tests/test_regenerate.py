@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import pytest
+from PIL import Image
+from pibooth.scripts import regenerate
+from pibooth.scripts.regenerate import setup, get_inputs_hash, regenerate_all_images
+
+
+SESSIONS = ('2023-01-01-10-00-00', '2023-01-01-10-05-00', '2023-01-01-10-10-00')
+
+
+@pytest.fixture
+def config_dir(tmpdir, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmpdir))  # Don't touch the user autostart file
+    config_dir = str(tmpdir.mkdir('config'))
+    _, config = setup(config_dir)
+    config.set('PICTURE', 'footer_text1', '')  # Fonts may not be installed
+    config.set('PICTURE', 'footer_text2', '')
+    config.save()
+    return config_dir
+
+
+@pytest.fixture
+def basepath(tmpdir):
+    basepath = tmpdir.mkdir('pictures')
+    raw = basepath.mkdir('raw')
+    for index, session in enumerate(SESSIONS):
+        Image.new('RGB', (400, 300), (index * 100, 0, 0)).save(str(raw.mkdir(session).join('capture.jpg')))
+    return str(basepath)
+
+
+@pytest.fixture
+def regenerated(monkeypatch):
+    """List of the sessions regenerated (in the order of the calls).
+    """
+    sessions = []
+    regenerate_image = regenerate.regenerate_image
+
+    def spy(plugin_manager, config, basepath, captures_folder):
+        sessions.append(captures_folder)
+        return regenerate_image(plugin_manager, config, basepath, captures_folder)
+
+    monkeypatch.setattr(regenerate, 'regenerate_image', spy)
+    return sessions
+
+
+def touch(filename, delta=10):
+    stat = os.stat(filename)
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + delta * 10 ** 9))
+
+
+def test_inputs_hash(config_dir, tmpdir):
+    _, config = setup(config_dir)
+    assert get_inputs_hash(config) == get_inputs_hash(setup(config_dir)[1])
+
+    overlay = str(tmpdir.join('overlay.png'))
+    Image.new('RGBA', (400, 300)).save(overlay)
+    config.set('PICTURE', 'overlays', overlay)
+    inputs_hash = get_inputs_hash(config)
+    touch(overlay)  # Overlay modified
+    assert get_inputs_hash(config) != inputs_hash
+
+
+def test_regenerate_skip_up_to_date(config_dir, basepath, regenerated):
+    plugin_manager, config = setup(config_dir)
+    regenerate_all_images(plugin_manager, config, basepath)
+    assert regenerated == list(SESSIONS)
+    with open(os.path.join(basepath, 'raw', '.regenerate.json')) as fp:
+        assert sorted(json.load(fp)) == list(SESSIONS)
+
+    del regenerated[:]
+    regenerate_all_images(plugin_manager, config, basepath)
+    assert regenerated == []
+    assert [name for name in os.listdir(os.path.join(basepath, 'raw')) if name.endswith('.tmp')] == []
+
+
+def test_regenerate_changed_capture(config_dir, basepath, regenerated):
+    plugin_manager, config = setup(config_dir)
+    regenerate_all_images(plugin_manager, config, basepath)
+    del regenerated[:]
+    touch(os.path.join(basepath, 'raw', SESSIONS[1], 'capture.jpg'))
+    regenerate_all_images(plugin_manager, config, basepath)
+    assert regenerated == [SESSIONS[1]]
+
+
+def test_regenerate_changed_config(config_dir, basepath, regenerated):
+    plugin_manager, config = setup(config_dir)
+    regenerate_all_images(plugin_manager, config, basepath)
+    del regenerated[:]
+    config.set('PICTURE', 'margin_thick', '50')
+    regenerate_all_images(plugin_manager, config, basepath)
+    assert regenerated == list(SESSIONS)
+
+
+def test_regenerate_force(config_dir, basepath, regenerated):
+    plugin_manager, config = setup(config_dir)
+    regenerate_all_images(plugin_manager, config, basepath)
+    del regenerated[:]
+    regenerate_all_images(plugin_manager, config, basepath, force=True)
+    assert regenerated == list(SESSIONS)
+
+
+@pytest.fixture
+def done(monkeypatch):
+    """List of the sessions handled by the main process (in the order).
+    """
+    sessions = []
+    monkeypatch.setattr(regenerate.RegenerationProgress, 'update',
+                        lambda self, captures_folder: sessions.append(captures_folder))
+    return sessions
+
+
+@pytest.mark.parametrize('inflight', [None, 1])
+def test_regenerate_parallel_order(config_dir, basepath, done, inflight):
+    # Longer first session, its result is ready after the next ones
+    Image.new('RGB', (4000, 3000), (0, 0, 255)).save(os.path.join(basepath, 'raw', SESSIONS[0], 'capture.jpg'))
+    os.makedirs(os.path.join(basepath, 'raw', '2023-01-01-10-15-00'))  # No capture, not regenerated
+    plugin_manager, config = setup(config_dir)
+    regenerate_all_images(plugin_manager, config, basepath, jobs=2, inflight=inflight)
+    assert done == list(SESSIONS) + ['2023-01-01-10-15-00']
+    for session in SESSIONS:
+        assert os.path.isfile(os.path.join(basepath, session + '_pibooth.jpg'))
+    with open(os.path.join(basepath, 'raw', '.regenerate.json')) as fp:
+        assert sorted(json.load(fp)) == list(SESSIONS)
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+import os
+import pytest
+from pibooth.storage import StorageManager
+
+
+def write_session(savedir, session_id, size=1000):
+    rawdir = savedir.join('raw', session_id)
+    rawdir.ensure(dir=True)
+    for i in range(2):
+        rawdir.join('pibooth{:03}.jpg'.format(i)).write('x' * size)
+    savedir.join(session_id + '_pibooth.jpg').write('x' * size)
+    return [str(rawdir.join('pibooth{:03}.jpg'.format(i))) for i in range(2)] +\
+        [str(savedir.join(session_id + '_pibooth.jpg'))]
+
+
+@pytest.fixture
+def savedir(tmpdir):
+    savedir = tmpdir.mkdir('pictures')
+    write_session(savedir, '2026-01-01-10-00-00')
+    write_session(savedir, '2026-01-01-11-00-00')
+    return savedir
+
+
+def test_scan(savedir):
+    storage = StorageManager([str(savedir)])
+    storage.scan()
+    stats = storage.get_statistics()[str(savedir)]
+    assert stats['usage'] == 6000
+    assert stats['raw_sessions'] == 2
+
+
+def test_add_file_rotation(savedir):
+    storage = StorageManager([str(savedir)], max_usage=8000)
+    storage.scan()
+    assert storage.has_headroom()
+    for filename in write_session(savedir, '2026-01-01-12-00-00'):
+        storage.add_file(filename)
+    # Oldest raw captures removed, final pictures kept
+    assert not savedir.join('raw', '2026-01-01-10-00-00').check()
+    assert savedir.join('2026-01-01-10-00-00_pibooth.jpg').check()
+    assert storage.pop_evicted() == ['2026-01-01-10-00-00']
+    assert storage.pop_evicted() == []
+    assert storage.get_statistics()[str(savedir)]['usage'] == 7000
+
+
+def test_no_headroom(savedir):
+    storage = StorageManager([str(savedir)], max_usage=3000)
+    storage.scan()
+    # The raw captures of the last session are never removed
+    assert storage.get_statistics()[str(savedir)]['raw_sessions'] == 1
+    assert not storage.has_headroom()
+    storage.max_usage = 0
+    storage.min_free = os.statvfs(str(savedir)).f_bavail * os.statvfs(str(savedir)).f_frsize * 2
+    assert not storage.has_headroom()
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+import io
+import csv
+import json
+from pibooth.telemetry import FrameTelemetry
+
+
+def test_ring_buffer():
+    telemetry = FrameTelemetry(10)
+    for i in range(25):
+        telemetry.add(i * 0.025, 'wait', 0.01, 0.005, 0.002)
+    assert len(telemetry.samples) == 10
+    assert telemetry.frame.count == 25
+    assert round(telemetry.get_fps()) == 40
+    lines = telemetry.get_summary(1024 * 1024, {'writer': 2})
+    assert lines[0].startswith('fps=40.0')
+    assert lines[-1] == 'pending writer=2'
+
+
+def test_export(tmpdir):
+    telemetry = FrameTelemetry()
+    telemetry.add(0, 'wait', 0.01, 0.005, 0.002)
+    telemetry.add(0.1, 'preview', 0.02, 0.015, 0.002)
+
+    telemetry.export(str(tmpdir.join('frames.csv')))
+    with io.open(str(tmpdir.join('frames.csv'))) as fp:
+        rows = list(csv.reader(fp))
+    assert rows[0] == list(FrameTelemetry.FIELDS)
+    assert rows[2][1] == 'preview'
+
+    telemetry.export(str(tmpdir.join('frames.json')))
+    with io.open(str(tmpdir.join('frames.json'))) as fp:
+        data = json.load(fp)
+    assert data['frames'][1]['interval'] == 0.1
+    assert set(data['statistics']['states']) == {'wait', 'preview'}
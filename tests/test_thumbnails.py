@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+import os
+from PIL import Image
+from pibooth.pictures import get_thumbnail, load_thumbnail, save_thumbnails, move_thumbnails
+from pibooth.pictures.thumbnails import get_manifest
+
+
+def test_save_thumbnails(tmpdir):
+    filename = str(tmpdir.join('picture_pibooth.jpg'))
+    image = Image.new('RGB', (1200, 1800), (255, 0, 0))
+    image.save(filename)
+    save_thumbnails(image, filename, (1024, 256, 2000))
+
+    manifest = get_manifest(filename)
+    assert [thumb['size'] for thumb in manifest['thumbnails']] == [[171, 256], [683, 1024]]
+
+    assert get_thumbnail(filename, (100, 100)).endswith('picture_pibooth_256.jpg')
+    assert get_thumbnail(filename, (800, 480)).endswith('picture_pibooth_1024.jpg')
+    assert get_thumbnail(filename, (1600, 1600)) == filename
+
+
+def test_outdated_thumbnails(tmpdir):
+    filename = str(tmpdir.join('picture_pibooth.jpg'))
+    image = Image.new('RGB', (1200, 1800), (255, 0, 0))
+    image.save(filename)
+    save_thumbnails(image, filename, (256,))
+    stat = os.stat(filename)
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))  # Picture regenerated
+    assert get_manifest(filename) is None
+    assert get_thumbnail(filename, (100, 100)) == filename
+
+
+def test_move_thumbnails(tmpdir):
+    filename = str(tmpdir.join('picture_pibooth.jpg'))
+    forgotten = str(tmpdir.mkdir('forget').join('picture_pibooth.jpg'))
+    image = Image.new('RGB', (1200, 1800), (255, 0, 0))
+    image.save(filename)
+    written = save_thumbnails(image, filename, (256,))
+    assert len(written) == 2 and all(os.path.isfile(path) for path in written)
+
+    os.rename(filename, forgotten)
+    assert move_thumbnails(filename, forgotten) == []
+    assert os.listdir(str(tmpdir.join('.thumbnails'))) == []
+    assert get_thumbnail(forgotten, (100, 100)).endswith(os.path.join('forget', '.thumbnails',
+                                                                      'picture_pibooth_256.jpg'))
+
+
+def test_load_thumbnail(tmpdir):
+    filename = str(tmpdir.join('picture_pibooth.jpg'))
+    image = Image.new('RGB', (1200, 1800), (255, 0, 0))
+    image.save(filename)
+
+    picture = load_thumbnail(filename, (400, 400))  # No thumbnail, picture reduced
+    assert picture.filename == filename
+    assert picture.size == (267, 400)
+
+    save_thumbnails(image, filename, (256, 1024))
+    picture = load_thumbnail(filename, (400.5, 400))
+    assert picture.filename.endswith('picture_pibooth_1024.jpg')
+    assert picture.size == (267, 400)
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+import io
+import json
+from pibooth.tracing import Tracer
+
+
+def test_disabled():
+    tracer = Tracer()
+    tracer.start_trace('session')
+    with tracer.span('capture'):
+        pass
+    assert not tracer.enabled
+
+
+def test_json_lines(tmpdir):
+    tracer = Tracer()
+    tracer.open(str(tmpdir.join('trace.jsonl')))
+    with tracer.span('capture', index=0):
+        pass  # No trace, dropped
+    tracer.start_trace('2026-01-01-10-00-00')
+    with tracer.span('capture', index=0):
+        pass
+    tracer.add_span('print_complete', 10, 12, 'other', job_id=3)
+    tracer.close()
+
+    with io.open(str(tmpdir.join('trace.jsonl'))) as fp:
+        spans = [json.loads(line) for line in fp]
+    assert [span['name'] for span in spans] == ['capture', 'print_complete']
+    assert spans[0]['trace_id'] == '2026-01-01-10-00-00'
+    assert spans[0]['args'] == {'index': 0}
+    assert spans[1]['duration'] == 2
+
+
+def test_chrome_trace(tmpdir):
+    tracer = Tracer()
+    tracer.open(str(tmpdir.join('trace.json')))
+    tracer.add_span('compose', 1, 1.5, 'session')
+    tracer.close()
+    tracer.open(str(tmpdir.join('trace.json')))  # Appended
+    tracer.add_span('compose', 2, 2.5, 'session')
+    tracer.close()
+
+    with io.open(str(tmpdir.join('trace.json'))) as fp:
+        events = json.loads(fp.read().rstrip(',\n') + ']')
+    spans = [event for event in events if event['ph'] == 'X']
+    assert [span['ts'] for span in spans] == [1000000, 2000000]
+    assert spans[0]['dur'] == 500000
+    assert spans[0]['args']['trace_id'] == 'session'
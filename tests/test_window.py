@@ -2,8 +2,12 @@
 
 import os
 import pytest
+import threading
 import pygame
-from pibooth.view.window import PiWindow
+from PIL import Image
+from pibooth.view import window
+from pibooth.view.window import PiWindow, render_foreground
+from pibooth.view import background
 
 
 WIN = PiWindow("Test", debug=True)
@@ -87,3 +91,96 @@ def test_finished_portrait(init, captures_portrait):
 
 def test_finished_landscape(init, captures_landscape):
     loop(WIN.show_finished, captures_landscape[0])
+
+
+def test_foreground_rendition(captures_portrait):
+    rendition = WIN.prepare_foreground(captures_portrait[0], WIN.CENTER)
+    rendition.result(timeout=10)
+    WIN._update_foreground(captures_portrait[0], WIN.CENTER)
+    assert not WIN.update_renditions()  # Already ready, no placeholder
+    WIN.drop_cache()
+
+
+def test_foreground_rendition_released():
+    image = Image.new('RGB', (1200, 1800), (255, 0, 0))
+    WIN.prepare_foreground(image, WIN.RIGHT).result(timeout=10)
+    assert len(WIN.get_renditions()) == 1
+    del image  # Rendition of a garbage collected image is removed
+    assert WIN.get_renditions() == []
+
+    image = Image.new('RGB', (1200, 1800), (0, 255, 0))
+    WIN.prepare_foreground(image, WIN.RIGHT).result(timeout=10)
+    WIN.show_intro(None)
+    assert WIN.get_renditions() == []
+    WIN.drop_cache()
+
+
+def test_foreground_rendition_not_painted_on_other_view(init, monkeypatch):
+    rendering = threading.Event()
+
+    def render_blocked(pil_image, size):
+        rendering.wait(10)
+        return render_foreground(pil_image, size)
+
+    monkeypatch.setattr(window, 'render_foreground', render_blocked)
+    image = Image.new('RGB', (1200, 1800), (255, 0, 0))
+    WIN.show_intro(image)
+    assert WIN._placeholder_shown
+    WIN.show_work_in_progress()
+    assert WIN.get_image() is None
+    rendering.set()
+    WIN.prepare_foreground(image, WIN.RIGHT).result(timeout=10)
+    assert not WIN.update_renditions()
+    WIN.drop_cache()
+
+
+def test_foreground_rendition_failed(monkeypatch):
+    calls = []
+
+    def render_once(pil_image, size):
+        calls.append(size)
+        if len(calls) == 1:
+            raise ValueError("Rendition failed")
+        return render_foreground(pil_image, size)
+
+    monkeypatch.setattr(window, 'render_foreground', render_once)
+    image = Image.new('RGB', (1200, 1800), (255, 0, 0))
+    assert isinstance(WIN.prepare_foreground(image, WIN.CENTER).exception(timeout=10), ValueError)
+    WIN._update_foreground(image, WIN.CENTER)  # Resized synchronously
+    assert not WIN._placeholder_shown
+    assert len(calls) == 2
+    WIN.drop_cache()
+
+
+def test_background_flattened(init):
+    bkgd = background.ConfirmBackground()
+    bkgd.resize(WIN.surface)
+    bkgd.paint(WIN.surface)
+    flattened = bkgd._flattened
+    bkgd.resize(WIN.surface)
+    bkgd.paint(WIN.surface)
+    assert bkgd._flattened is flattened
+    bkgd.set_text_color((0, 255, 0))
+    bkgd.paint(WIN.surface)
+    assert bkgd._flattened is not flattened
+
+
+def test_preview_hud(init):
+    WIN.show_capture((100, 100, 400, 300))
+    WIN.set_capture_number(1, 4)
+    rect = WIN._hud_rects['iso']
+    WIN.set_iso(800)
+    assert WIN._hud_rects['iso'].right == rect.right
+    WIN.drop_cache()
+
+
+def test_debug_overlay_hidden(init, monkeypatch):
+    repaints = []
+    monkeypatch.setattr(WIN, 'update', lambda: repaints.append(True))
+    WIN.set_debug_overlay(["fps=40.0", "pending printer=1"])
+    WIN.set_debug_overlay(["fps=40.0 and more text", "pending printer=1"])
+    assert not repaints  # Bigger overlay covers the previous one
+    WIN.set_debug_overlay(["fps=40.0"])
+    assert len(repaints) == 1
+    WIN.set_debug_overlay(None)
+    assert len(repaints) == 2
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+import os
+import pytest
+from PIL import Image
+from pibooth.writer import FileWriter
+
+
+@pytest.fixture
+def writer():
+    writer = FileWriter('always')
+    yield writer
+    writer.quit()
+
+
+def test_save_and_rename(writer, tmpdir):
+    image = Image.new('RGB', (100, 100), (255, 0, 0))
+    filename = str(tmpdir.join('raw', 'session', 'pibooth000.jpg'))
+    forgotten = str(tmpdir.join('forget', 'pibooth000.jpg'))
+    writer.save_image(image, filename)
+    writer.rename(filename, forgotten)
+    assert writer.wait(timeout=5)
+    assert not os.path.exists(filename)
+    assert os.path.isfile(forgotten)
+    stats = writer.get_statistics()
+    assert stats['written'] == 1
+    assert stats['renamed'] == 1
+    assert stats['latency']['count'] == 2
+
+
+def test_when_written(writer, tmpdir):
+    image = Image.new('RGB', (100, 100), (255, 0, 0))
+    filename = str(tmpdir.join('picture.jpg'))
+    written = []
+    writer.save_image(image, filename)
+    writer.when_written(filename, lambda: written.append(os.path.isfile(filename)))
+    assert writer.wait(filename, 5)
+    assert written == [True]
+
+
+def test_failure(writer, tmpdir):
+    tmpdir.join('file').write('')
+    writer.save_image(Image.new('RGB', (10, 10)), str(tmpdir.join('file', 'picture.jpg')))
+    assert writer.wait(timeout=5)
+    assert writer.get_statistics()['failed'] == 1
+
+
+def test_invalid_policy():
+    with pytest.raises(ValueError):
+        FileWriter('sometimes')
+
+
+def test_listeners(writer, tmpdir):
+    image = Image.new('RGB', (100, 100), (255, 0, 0))
+    filename = str(tmpdir.join('picture.jpg'))
+    derived = [str(tmpdir.join('derived_{}.txt'.format(i))) for i in range(2)]
+    notified = []
+
+    def write_derived():
+        for path in derived:
+            with open(path, 'w') as fp:
+                fp.write('derived')
+        return derived
+
+    writer.add_listener(notified.append)
+    writer.save_image(image, filename)
+    writer.write(filename, write_derived)
+    writer.rename(filename, str(tmpdir.join('renamed.jpg')))
+    assert writer.wait(timeout=5)
+    assert notified == [filename] + derived